@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'CEVProject.settings')
+# Perfil ASGI: vistas async para el dashboard, el listado y el detalle.
+# Con CEV_VISTAS_ASYNC=0 se sirven las vistas sync también bajo ASGI.
+os.environ.setdefault('CEV_VISTAS_ASYNC', '1')
 
 application = get_asgi_application()
@@ -2,8 +2,11 @@
 Configuración para el proyecto SAAS CEV.
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,17 +44,28 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 
 MIDDLEWARE = [
+    # Primero: mide la petición completa (ver gestion/middleware.py y /metrics)
+    'gestion.middleware.MetricasMiddleware',
+    # Revisión por petición del caché de datos de referencia (gestion/referencias.py)
+    'gestion.middleware.ReferenciasMiddleware',
+    # Base de lectura por petición y lecturas en la primaria tras escribir (gestion/replicas.py)
+    'gestion.middleware.ReplicasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     # 🚨 CORRECCIÓN CLAVE: Agregando la 'r' faltante para CSRF 🚨
     'django.middleware.csrf.CsrfViewMiddleware', 
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Organización (tenant) de la petición; necesita el usuario (gestion/organizaciones.py)
+    'gestion.middleware.OrganizacionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'CEVProject.urls'
+# Perfil ASGI: asgi.py define CEV_VISTAS_ASYNC=1 y el dashboard, el listado y
+# el detalle se sirven con las vistas async (gestion/views_async.py).
+CEV_VISTAS_ASYNC = os.environ.get('CEV_VISTAS_ASYNC') == '1'
+ROOT_URLCONF = 'CEVProject.urls_asgi' if CEV_VISTAS_ASYNC else 'CEVProject.urls'
 
 TEMPLATES = [
     {
@@ -64,6 +78,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'gestion.fragmentos.contexto',
             ],
         },
     },
@@ -80,6 +95,58 @@ DATABASES = {
     }
 }
 
+# Perfil de producción para SQLite (CEV_BD_PERFIL=produccion). Cada conexión
+# nueva aplica los PRAGMA de init_command:
+# * WAL: las lecturas no esperan a las escrituras ni al revés (queda guardado
+#   en el archivo; crea db.sqlite3-wal y db.sqlite3-shm junto a la base).
+# * synchronous=NORMAL: con WAL no corrompe la base; un corte de luz puede
+#   perder solo las últimas transacciones.
+# * mmap de 256 MB, 64 MB de caché de páginas por conexión y tablas
+#   temporales en memoria.
+# * busy_timeout: una escritura espera hasta 5 s el bloqueo en vez de fallar
+#   con "database is locked"; con transaction_mode=IMMEDIATE las transacciones
+#   toman ese bloqueo al empezar, donde la espera sí sirve.
+# Las conexiones se reutilizan (CONN_MAX_AGE) salvo con las vistas async, donde
+# Django recomienda no usar conexiones persistentes.
+# Ver manage.py benchmark_sqlite para comparar ambos perfiles.
+CEV_BD_PERFIL = os.environ.get('CEV_BD_PERFIL', 'desarrollo')
+CEV_SQLITE_PRODUCCION = {
+    'CONN_MAX_AGE': 0 if CEV_VISTAS_ASYNC else 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            'PRAGMA mmap_size=268435456;'
+            'PRAGMA cache_size=-65536;'
+            'PRAGMA temp_store=MEMORY;'
+            'PRAGMA busy_timeout=5000;'
+        ),
+        'transaction_mode': 'IMMEDIATE',
+    },
+}
+if CEV_BD_PERFIL == 'produccion':
+    DATABASES['default'].update(CEV_SQLITE_PRODUCCION)
+elif CEV_BD_PERFIL != 'desarrollo':
+    raise ImproperlyConfigured(f"CEV_BD_PERFIL debe ser 'desarrollo' o 'produccion', no {CEV_BD_PERFIL!r}")
+
+# Réplicas de lectura (gestion/replicas.py) para el dashboard, el listado, la
+# exportación y los PDF. CEV_BD_REPLICAS: rutas de archivos SQLite separadas por
+# comas, copias de la base que mantiene al día manage.py sync_replicas (o
+# litestream, etc.). Con PostgreSQL, agregar los alias a DATABASES y a
+# CEV_REPLICAS. En los tests las réplicas son espejo de 'default'.
+CEV_REPLICAS = []
+for numero, ruta in enumerate(filter(None, os.environ.get('CEV_BD_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{numero}'] = {**DATABASES['default'], 'NAME': ruta.strip(), 'TEST': {'MIRROR': 'default'}}
+    CEV_REPLICAS.append(f'replica{numero}')
+DATABASE_ROUTERS = ['gestion.replicas.RouterReplicas']
+# Segundos que un navegador lee de la primaria después de escribir.
+CEV_REPLICAS_PEGAJOSIDAD_SEGUNDOS = 10
+# Cada cuántos segundos se escribe el latido y se mide el retraso de las réplicas,
+# y desde cuántos segundos de retraso se deja de leer de una réplica.
+CEV_REPLICAS_REVISION_SEGUNDOS = 2
+CEV_REPLICAS_RETRASO_MAXIMO_SEGUNDOS = 5
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -116,4 +183,86 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-LOGIN_REDIRECT_URL = '/'
\ No newline at end of file
+LOGIN_REDIRECT_URL = '/'
+
+# Máximo de reportes PDF que la acción del admin genera dentro de la petición
+# (uno tras otro, en el proceso web); una selección mayor se encola como tarea.
+CEV_REPORTES_MAXIMO_ADMIN = 50
+
+# Caché en disco de reportes PDF (se desalojan los menos usados al superar el límite)
+CEV_REPORTES_CACHE_DIR = BASE_DIR / 'cache' / 'reportes'
+CEV_REPORTES_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Segundos que se guarda el dashboard en caché; las señales lo invalidan al
+# guardar o borrar. Con varios procesos conviene un CACHES compartido
+# (Redis/Memcached): el LocMemCache por defecto es por proceso.
+CEV_DASHBOARD_CACHE_TIMEOUT = 300
+
+# Segundos que se guardan los fragmentos de plantilla por versión de proyecto
+# y los desplegables de filtros (ver gestion/fragmentos.py). Las claves
+# cambian con cada modificación, así que solo limita la memoria usada.
+CEV_FRAGMENTOS_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Máximo de consultas SQL por escenario de manage.py benchmark_cev; el comando
+# falla si alguno se excede (--presupuesto ESCENARIO=N los reemplaza). Las
+# vistas cuentan una consulta para la versión de los datos de referencia y
+# otra para leer la sesión (organización del usuario, ver gestion/organizaciones.py).
+CEV_BENCHMARK_PRESUPUESTOS = {
+    'home': 4,
+    'home_cache': 1,
+    'proyecto_list': 5,
+    'proyecto_list_profunda': 5,
+    'proyecto_list_offset': 6,
+    'proyecto_detalle': 5,
+    'proyecto_pdf': 4,
+    'admin_proyecto': 10,
+    'admin_cliente': 5,
+    'admin_tipoproyecto': 5,
+    'admin_material': 6,
+    'admin_sistemaclimatizacion': 6,
+    'admin_resultadocev': 7,
+    'admin_muro': 7,
+    'calificacion_python': 3,
+    'calificacion_sql_100': 1,
+    'calificacion_numpy_10000': 4,
+}
+
+# Caché en memoria de Material, TipoProyecto y SistemaClimatizacion
+# (gestion/referencias.py): fuera de una petición, cada cuántos segundos se
+# compara la copia del proceso con la versión guardada en la base de datos.
+CEV_REFERENCIAS_REVISION_SEGUNDOS = 5
+
+# Organizaciones (tenants, gestion/organizaciones.py). Con un dominio, la
+# organización sale del subdominio (<slug>.<dominio>), solo para sus miembros;
+# si no, de la primera a la que pertenece el usuario. Sin organización se
+# responde 403, salvo a superusuarios y a anónimos en las rutas libres.
+# CEV_ORGANIZACION_OBLIGATORIA=0 es para instalaciones de una sola
+# organización: fuera de un subdominio, sin organización no se filtra.
+CEV_ORGANIZACION_DOMINIO = os.environ.get('CEV_ORGANIZACION_DOMINIO', '')
+CEV_ORGANIZACION_OBLIGATORIA = os.environ.get('CEV_ORGANIZACION_OBLIGATORIA', '1') == '1'
+CEV_ORGANIZACION_RUTAS_LIBRES = ('/admin/',)
+
+# Máximo de copias por clonación desde la vista del proyecto
+# (gestion/clonacion.py; manage.py clone_project no tiene límite).
+CEV_CLONACION_MAX_COPIAS = 1000
+
+# Tareas en segundo plano (gestion/tareas.py, manage.py run_workers): directorio
+# de archivos de resultado, espera base entre reintentos (se duplica en cada
+# intento), segundos sin latido tras los que una tarea en curso vuelve a la
+# cola y días que se conservan las tareas terminadas.
+CEV_TAREAS_DIR = BASE_DIR / 'cache' / 'tareas'
+CEV_TAREAS_REINTENTO_SEGUNDOS = 30
+CEV_TAREAS_ABANDONO_SEGUNDOS = 10 * 60
+CEV_TAREAS_RETENCION_DIAS = 7
+
+# Métricas por vista en /metrics (formato Prometheus). Una petición cuenta como
+# posible N+1 si repite la misma sentencia SQL al menos este número de veces.
+CEV_METRICAS_UMBRAL_REPETIDAS = 5
+
+# /metrics lo lee el staff con sesión o quien envíe "Authorization: Bearer
+# <token>" (la configuración de Prometheus). Sin token, solo el staff.
+CEV_METRICAS_TOKEN = os.environ.get('CEV_METRICAS_TOKEN', '')
+
+# Agrega la cabecera X-CEV-SQL y una línea en el logger 'gestion.metricas' con
+# las sentencias más repetidas de cada petición. Desactivado por defecto.
+CEV_METRICAS_DETALLE_SQL = os.environ.get('CEV_METRICAS_DETALLE_SQL') == '1'
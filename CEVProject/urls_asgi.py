@@ -0,0 +1,10 @@
+# CEVProject/urls_asgi.py (Perfil ASGI)
+
+from django.contrib import admin
+from django.urls import path, include 
+
+# Igual que urls.py, pero con las vistas async de 'gestion' (ver settings.CEV_VISTAS_ASYNC)
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include('gestion.urls_async')), 
+]
@@ -1,16 +1,77 @@
 # gestion/admin.py
-from django.contrib import admin
+import io
+import tempfile
+import zipfile
+from decimal import Decimal
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, HttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
 from django.utils.html import format_html
+from .busqueda import buscar_proyectos
+from .certificacion import CertificadorCEV
+from .clonacion import clonar_proyectos
+from .importacion import COLUMNAS_CSV, ImportadorCEV
+from .organizaciones import organizacion_actual
+from .reportes import datos_reportes, generar_reportes
+from .tareas import encolar, guardar_entrada
 from .models import (
+    CapaMuro,
     Proyecto, 
     Cliente, 
     TipoProyecto, 
     SistemaClimatizacion, 
     Material, 
     Muro, 
-    ResultadoCEV
+    Organizacion,
+    ResultadoCEV,
+    Tarea,
 )
 
+# ----------------------------------------
+# ORGANIZACIÓN EN LOS FORMULARIOS
+# ----------------------------------------
+
+class OrganizacionAdminMixin:
+    """
+    Con una organización en curso las filas nuevas quedan en ella (ver
+    ConOrganizacion.save) y el campo no se muestra; sin ella (superusuarios de
+    la plataforma) se elige en el formulario.
+    """
+    
+    def get_exclude(self, request, obj=None):
+        excluidos = super().get_exclude(request, obj) or ()
+        if organizacion_actual() is None:
+            return excluidos
+        return (*excluidos, 'organizacion')
+
+
+class CatalogoComunAdminMixin:
+    """
+    Materiales y sistemas del catálogo común (sin organización): los usan
+    proyectos de todas las organizaciones, así que solo los superusuarios los
+    modifican o borran; los demás los ven en modo de solo lectura.
+    """
+    
+    def es_comun_ajeno(self, request, obj):
+        return obj is not None and obj.organizacion_id is None and not request.user.is_superuser
+    
+    def has_change_permission(self, request, obj=None):
+        return not self.es_comun_ajeno(request, obj) and super().has_change_permission(request, obj)
+    
+    def has_delete_permission(self, request, obj=None):
+        return not self.es_comun_ajeno(request, obj) and super().has_delete_permission(request, obj)
+
+
 # ----------------------------------------
 # INLINES (Para gestionar las relaciones dentro del Proyecto)
 # ----------------------------------------
@@ -19,10 +80,19 @@ class MuroInline(admin.TabularInline):
     """Permite editar los Muros de un Proyecto directamente en el formulario de Proyecto."""
     model = Muro
     extra = 1
-    fields = ('ubicacion', 'superficie', 'material_aislante')
+    fields = ('ubicacion', 'superficie', 'material_aislante', 'transmitancia')
+    readonly_fields = ('transmitancia',)
     autocomplete_fields = ['material_aislante']
 
 
+class CapaMuroInline(admin.TabularInline):
+    """Capas del muro, de interior a exterior; con ellas se calcula su transmitancia U."""
+    model = CapaMuro
+    extra = 1
+    fields = ('orden', 'material', 'espesor')
+    autocomplete_fields = ['material']
+
+
 class ResultadoCEVInline(admin.StackedInline):
     """Permite ver/crear el Resultado CEV (1:1) de un Proyecto."""
     model = ResultadoCEV
@@ -32,14 +102,27 @@ class ResultadoCEVInline(admin.StackedInline):
     fields = ('calificacion', 'consumo_energia_anual', 'fecha_calificacion')
 
 
+# ----------------------------------------
+# FORMULARIOS
+# ----------------------------------------
+
+class ImportarCEVForm(forms.Form):
+    """Subida de un archivo CSV/JSONL para la importación masiva."""
+    archivo = forms.FileField(help_text=f"CSV (columnas: {', '.join(COLUMNAS_CSV)}) o JSONL.")
+    segundo_plano = forms.BooleanField(
+        required=False, label="En segundo plano",
+        help_text="Para archivos grandes: la importación la ejecuta manage.py run_workers.",
+    )
+
+
 # ----------------------------------------
 # ADMIN: PROYECTO (Principal)
 # ----------------------------------------
 
 @admin.register(Proyecto)
-class ProyectoAdmin(admin.ModelAdmin):
+class ProyectoAdmin(OrganizacionAdminMixin, admin.ModelAdmin):
     list_display = ('nombre', 'cliente', 'tipo', 'fecha_inicio', 'estado_badge', 'calificacion_estimada')
-    list_filter = ('tipo', 'fecha_inicio', 'cliente')
+    list_filter = ('tipo', 'calificacion_estimada', 'fecha_inicio', 'cliente')
     search_fields = ('nombre', 'cliente__nombre', 'descripcion')
     date_hierarchy = 'fecha_inicio'
     filter_horizontal = ('sistemas',)
@@ -61,27 +144,225 @@ class ProyectoAdmin(admin.ModelAdmin):
     # Autocomplete para mejorar la búsqueda
     autocomplete_fields = ['cliente']
     
+    def get_fieldsets(self, request, obj=None):
+        fieldsets = super().get_fieldsets(request, obj)
+        if organizacion_actual() is None:
+            return (*fieldsets, ('Organización', {'fields': ('organizacion',)}))
+        return fieldsets
+    
+    # Máximo de motivos de rechazo que se muestran tras una importación
+    max_errores_importacion = 20
+    
+    actions = [
+        'generar_reportes_pdf', 'generar_reportes_pdf_segundo_plano', 'certificar', 'certificar_segundo_plano',
+        'clonar',
+    ]
+    
+    @admin.action(description="Clonar (con muros y sistemas)", permissions=['add'])
+    def clonar(self, request, queryset):
+        """Una copia de cada seleccionado; para N copias usar manage.py clone_project o la vista del proyecto."""
+        copias = clonar_proyectos(queryset)
+        self.message_user(request, f"{len(copias)} proyectos clonados.", messages.SUCCESS)
+    
+    @admin.action(description="Certificar (crear/actualizar Resultado CEV)", permissions=['certificar'])
+    def certificar(self, request, queryset):
+        """Crea o actualiza en bloque el resultado de los seleccionados (misma lógica que manage.py certify)."""
+        certificador = CertificadorCEV()
+        estadisticas = certificador.certificar(Proyecto.objects.filter(pk__in=queryset.values('pk')))
+        self.message_user(request, (
+            f"{estadisticas['nuevos']} resultados creados, {estadisticas['actualizados']} actualizados "
+            f"y {estadisticas['sin_cambios']} sin cambios."
+        ), messages.SUCCESS)
+        if estadisticas['sin_datos']:
+            self.message_user(
+                request,
+                f"{estadisticas['sin_datos']} proyectos sin muros no se certificaron.",
+                messages.WARNING,
+            )
+    
+    @admin.action(description="Descargar reportes PDF (ZIP) en segundo plano", permissions=['view'])
+    def generar_reportes_pdf_segundo_plano(self, request, queryset):
+        self.avisar_tarea(request, encolar('reportes_pdf', request.user, ids=self.ids_seleccionados(queryset)))
+    
+    @admin.action(description="Certificar en segundo plano", permissions=['certificar'])
+    def certificar_segundo_plano(self, request, queryset):
+        self.avisar_tarea(request, encolar('certificar', request.user, ids=self.ids_seleccionados(queryset)))
+    
+    def ids_seleccionados(self, queryset):
+        return list(queryset.order_by('pk').values_list('pk', flat=True))
+    
+    def avisar_tarea(self, request, tarea):
+        """Mensaje con el enlace a la tarea encolada en el admin."""
+        self.message_user(request, format_html(
+            'Tarea encolada: <a href="{}">{}</a>. La ejecuta manage.py run_workers.',
+            reverse('admin:gestion_tarea_change', args=[tarea.pk]), tarea,
+        ), messages.INFO)
+    
+    def has_certificar_permission(self, request):
+        return request.user.has_perms(['gestion.add_resultadocev', 'gestion.change_resultadocev'])
+    
+    @admin.action(description="Descargar reportes PDF (ZIP)", permissions=['view'])
+    def generar_reportes_pdf(self, request, queryset):
+        """
+        Renderiza los PDF seleccionados uno tras otro y los entrega en un ZIP.
+        Una selección de más de CEV_REPORTES_MAXIMO_ADMIN se encola como tarea:
+        la petición no ocupa el proceso web ni crea procesos hijos.
+        """
+        ids = self.ids_seleccionados(queryset)
+        if len(ids) > settings.CEV_REPORTES_MAXIMO_ADMIN:
+            self.message_user(request, (
+                f"{len(ids)} reportes superan el máximo de {settings.CEV_REPORTES_MAXIMO_ADMIN} "
+                "para descargar directamente; se generan en segundo plano."
+            ), messages.WARNING)
+            return self.generar_reportes_pdf_segundo_plano(request, queryset)
+        try:
+            import reportlab  # noqa: F401
+        except ImportError:
+            return HttpResponse("Instala reportlab: pip install reportlab", status=500)
+        
+        archivo = tempfile.TemporaryFile()
+        with zipfile.ZipFile(archivo, 'w', compression=zipfile.ZIP_DEFLATED) as zip_reportes:
+            # Sin las anotaciones del changelist: datos_reportes elige sus columnas.
+            generar_reportes(datos_reportes(Proyecto.objects.filter(pk__in=ids)), zip_reportes.writestr, workers=1)
+        archivo.seek(0)
+        return FileResponse(archivo, as_attachment=True, filename="reportes_cev.zip")
+    
+    def get_urls(self):
+        urls = [
+            path(
+                'importar/',
+                self.admin_site.admin_view(self.importar_view),
+                name='gestion_proyecto_importar',
+            ),
+        ]
+        return urls + super().get_urls()
+    
+    def importar_view(self, request):
+        """Importación masiva desde CSV/JSONL (misma lógica que manage.py import_cev)."""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        
+        form = ImportarCEVForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            formato = 'jsonl' if archivo.name.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+            if form.cleaned_data['segundo_plano']:
+                tarea = encolar(
+                    'importar', request.user, archivo=guardar_entrada(archivo, f'.{formato}'), formato=formato,
+                    # Un reintento podría importar dos veces lo que ya se escribió.
+                    max_intentos=1,
+                )
+                self.avisar_tarea(request, tarea)
+                return redirect('admin:gestion_proyecto_changelist')
+            errores = []
+            
+            def rechazos(filas, error):
+                if len(errores) < self.max_errores_importacion:
+                    errores.append(error)
+            
+            importador = ImportadorCEV()
+            texto = io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
+            try:
+                estadisticas = importador.importar(texto, formato, rechazos=rechazos)
+            except ValueError as error:
+                form.add_error('archivo', str(error))
+            else:
+                self.message_user(request, (
+                    f"{estadisticas['proyectos']} proyectos, {estadisticas['muros']} muros y "
+                    f"{estadisticas['resultados']} resultados importados "
+                    f"({importador.filas_por_segundo:.0f} filas/s)."
+                ), messages.SUCCESS)
+                if estadisticas['rechazados']:
+                    self.message_user(
+                        request,
+                        f"{estadisticas['rechazados']} proyectos rechazados. Use manage.py import_cev "
+                        f"para obtener el archivo de errores completo.",
+                        messages.WARNING,
+                    )
+                    for error in errores:
+                        self.message_user(request, error, messages.WARNING)
+                return redirect('admin:gestion_proyecto_changelist')
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar proyectos (CSV/JSONL)',
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/gestion/proyecto/importar.html', context)
+    
+    def get_queryset(self, request):
+        """Precarga el resultado oficial; la calificación estimada ya está almacenada en el proyecto."""
+        return super().get_queryset(request).with_resultado().select_related('cliente', 'tipo')
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Usa el índice de texto completo (nombre, cliente, descripción) en vez de icontains."""
+        if not search_term:
+            return queryset, False
+        queryset = buscar_proyectos(queryset, search_term)
+        # Sin orden elegido por columna, primero los más relevantes.
+        if ORDER_VAR not in request.GET:
+            queryset = queryset.order_by('relevancia', '-pk')
+        return queryset, False
+    
     def estado_badge(self, obj):
-        """Muestra un badge colorido del estado."""
-        estado = obj.get_estado_display()
-        badge_class = obj.get_badge_class()
+        """Muestra un badge colorido del estado (lee solo las anotaciones)."""
         return format_html(
             '<span class="badge badge-{}">{}</span>',
-            badge_class,
-            estado
+            obj.get_badge_class(),
+            obj.get_estado_display()
         )
     estado_badge.short_description = 'Estado'
+    estado_badge.admin_order_field = 'resultados__calificacion'
     
     def calificacion_estimada(self, obj):
-        """Muestra la calificación energética estimada."""
-        calificacion = obj.calcular_calificacion_energetica()
-        badge_class = obj.get_badge_class()
+        """Muestra la calificación energética estimada (columna almacenada)."""
         return format_html(
             '<span class="badge badge-{}">{}</span>',
-            badge_class,
-            calificacion
+            obj.get_badge_class(),
+            obj.calificacion_estimada
         )
     calificacion_estimada.short_description = 'Calificación Estimada'
+    calificacion_estimada.admin_order_field = 'rango_calificacion'
+
+
+# ----------------------------------------
+# COLUMNAS AGREGADAS EN LOS CHANGELISTS
+# ----------------------------------------
+
+def agregado_relacionado(queryset, campo, agregado, vacio=0, output_field=None):
+    """
+    Subconsulta correlacionada con ``agregado`` sobre las filas de ``queryset``
+    cuyo ``campo`` apunta a la fila exterior; ``vacio`` si no hay ninguna.
+    """
+    filas = queryset.filter(**{campo: OuterRef('pk')}).order_by().values(campo).annotate(valor=agregado)
+    return Coalesce(Subquery(filas.values('valor')), Value(vacio), output_field=output_field or IntegerField())
+
+
+def columna_anotada(nombre, descripcion, plantilla=None):
+    """Columna de ``list_display`` que muestra (y ordena por) la anotación ``nombre``."""
+    def columna(self, obj):
+        valor = getattr(obj, nombre)
+        return format_html(plantilla, valor) if plantilla else valor
+    columna.short_description = descripcion
+    columna.admin_order_field = nombre
+    return columna
+
+
+class ConteosAnotadosMixin:
+    """
+    Resuelve en ``get_queryset`` las columnas que devuelve ``anotaciones()``
+    (nombre → expresión) como subconsultas correlacionadas: la página completa
+    sale en una consulta, sin una por fila, y el COUNT del paginador no cambia.
+    Las expresiones se arman en cada petición, con los managers de la
+    organización en curso: los conteos no incluyen filas de otras.
+    """
+    
+    def anotaciones(self):
+        return {}
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(**self.anotaciones())
 
 
 # ----------------------------------------
@@ -89,19 +370,18 @@ class ProyectoAdmin(admin.ModelAdmin):
 # ----------------------------------------
 
 @admin.register(Cliente)
-class ClienteAdmin(admin.ModelAdmin):
+class ClienteAdmin(OrganizacionAdminMixin, ConteosAnotadosMixin, admin.ModelAdmin):
     list_display = ('nombre', 'contacto', 'total_proyectos_display')
     search_fields = ('nombre', 'contacto')
     ordering = ('nombre',)
     
-    def total_proyectos_display(self, obj):
-        """Muestra el total de proyectos del cliente."""
-        total = obj.total_proyectos()
-        return format_html(
-            '<span style="font-weight: bold; color: #007bff;">{}</span>',
-            total
-        )
-    total_proyectos_display.short_description = 'Total Proyectos'
+    def anotaciones(self):
+        return {'num_proyectos': agregado_relacionado(Proyecto.objects.all(), 'cliente', Count('pk'))}
+    
+    # Muestra el total de proyectos del cliente
+    total_proyectos_display = columna_anotada(
+        'num_proyectos', 'Total Proyectos', '<span style="font-weight: bold; color: #007bff;">{}</span>'
+    )
 
 
 # ----------------------------------------
@@ -109,14 +389,14 @@ class ClienteAdmin(admin.ModelAdmin):
 # ----------------------------------------
 
 @admin.register(TipoProyecto)
-class TipoProyectoAdmin(admin.ModelAdmin):
+class TipoProyectoAdmin(ConteosAnotadosMixin, admin.ModelAdmin):
     list_display = ('nombre', 'total_proyectos')
     search_fields = ('nombre',)
     
-    def total_proyectos(self, obj):
-        """Cuenta cuántos proyectos tienen este tipo."""
-        return obj.proyecto_set.count()
-    total_proyectos.short_description = 'Proyectos con este tipo'
+    def anotaciones(self):
+        return {'num_proyectos': agregado_relacionado(Proyecto.objects.all(), 'tipo', Count('pk'))}
+    
+    total_proyectos = columna_anotada('num_proyectos', 'Proyectos con este tipo')
 
 
 # ----------------------------------------
@@ -124,16 +404,29 @@ class TipoProyectoAdmin(admin.ModelAdmin):
 # ----------------------------------------
 
 @admin.register(Material)
-class MaterialAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'conductividad', 'total_muros')
+class MaterialAdmin(CatalogoComunAdminMixin, OrganizacionAdminMixin, ConteosAnotadosMixin, admin.ModelAdmin):
+    list_display = ('nombre', 'conductividad', 'total_muros', 'superficie_cubierta', 'total_proyectos')
     list_filter = ('conductividad',)
     search_fields = ('nombre',)
     ordering = ('conductividad',)
     
-    def total_muros(self, obj):
-        """Muestra cuántos muros usan este material."""
-        return obj.muros.count()
-    total_muros.short_description = 'Muros que lo usan'
+    def anotaciones(self):
+        # Un material del catálogo común cuenta solo los muros de la organización.
+        muros = Muro.objects.all()
+        return {
+            'num_muros': agregado_relacionado(muros, 'material_aislante', Count('pk')),
+            'superficie_muros': agregado_relacionado(
+                muros, 'material_aislante', Sum('superficie'),
+                vacio=Decimal('0'), output_field=DecimalField(),
+            ),
+            'num_proyectos': agregado_relacionado(
+                muros, 'material_aislante', Count('proyecto', distinct=True)
+            ),
+        }
+    
+    total_muros = columna_anotada('num_muros', 'Muros que lo usan')
+    superficie_cubierta = columna_anotada('superficie_muros', 'Superficie cubierta (m²)')
+    total_proyectos = columna_anotada('num_proyectos', 'Proyectos que lo usan')
 
 
 # ----------------------------------------
@@ -141,15 +434,19 @@ class MaterialAdmin(admin.ModelAdmin):
 # ----------------------------------------
 
 @admin.register(SistemaClimatizacion)
-class SistemaClimatizacionAdmin(admin.ModelAdmin):
+class SistemaClimatizacionAdmin(CatalogoComunAdminMixin, OrganizacionAdminMixin, ConteosAnotadosMixin, admin.ModelAdmin):
     list_display = ('tipo', 'eficiencia_nominal', 'total_proyectos')
     list_filter = ('eficiencia_nominal',)
     search_fields = ('tipo',)
     
-    def total_proyectos(self, obj):
-        """Cuenta en cuántos proyectos está este sistema."""
-        return obj.proyectos.count()
-    total_proyectos.short_description = 'Proyectos que lo usan'
+    def anotaciones(self):
+        # La tabla intermedia no tiene manager propio: se filtra por la organización del proyecto.
+        sistemas = Proyecto.sistemas.through.objects.all()
+        if organizacion_actual() is not None:
+            sistemas = sistemas.filter(proyecto__organizacion=organizacion_actual())
+        return {'num_proyectos': agregado_relacionado(sistemas, 'sistemaclimatizacion', Count('pk'))}
+    
+    total_proyectos = columna_anotada('num_proyectos', 'Proyectos que lo usan')
 
 
 # ----------------------------------------
@@ -180,10 +477,72 @@ class ResultadoCEVAdmin(admin.ModelAdmin):
 
 @admin.register(Muro)
 class MuroAdmin(admin.ModelAdmin):
-    list_display = ('proyecto', 'ubicacion', 'superficie', 'material_aislante')
+    list_display = ('proyecto', 'ubicacion', 'superficie', 'material_aislante', 'transmitancia')
+    # str(proyecto) muestra el estado, que lee su ResultadoCEV
+    list_select_related = ('proyecto__resultados', 'material_aislante')
     list_filter = ('material_aislante', 'ubicacion')
     search_fields = ('proyecto__nombre', 'ubicacion')
     autocomplete_fields = ['proyecto', 'material_aislante']
+    readonly_fields = ('transmitancia',)
+    inlines = [CapaMuroInline]
+
+
+# ----------------------------------------
+# ADMIN: TAREAS EN SEGUNDO PLANO
+# ----------------------------------------
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    """Seguimiento de la cola de run_workers; las tareas se crean desde las acciones."""
+    list_display = ('__str__', 'estado', 'progreso', 'mensaje', 'intentos', 'usuario', 'creada', 'resultado')
+    list_filter = ('estado', 'tipo')
+    list_select_related = ('usuario',)
+    readonly_fields = [campo.name for campo in Tarea._meta.fields] + ['resultado']
+    actions = ['reintentar']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    @admin.display(description='Resultado')
+    def resultado(self, obj):
+        if obj.estado != Tarea.COMPLETADA or not obj.archivo:
+            return '-'
+        return format_html('<a href="{}">Descargar</a>', reverse('tarea-resultado', args=[obj.uuid]))
+    
+    @admin.action(description="Reintentar tareas fallidas")
+    def reintentar(self, request, queryset):
+        reencoladas = queryset.filter(estado=Tarea.FALLIDA).update(
+            estado=Tarea.PENDIENTE, intentos=0, error='', disponible_desde=timezone.now()
+        )
+        self.message_user(request, f"{reencoladas} tareas vueltas a encolar.", messages.SUCCESS)
+
+
+# ----------------------------------------
+# ADMIN: ORGANIZACIONES (TENANTS)
+# ----------------------------------------
+
+@admin.register(Organizacion)
+class OrganizacionAdmin(admin.ModelAdmin):
+    """Organizaciones y sus miembros; solo para superusuarios de la plataforma."""
+    list_display = ('nombre', 'slug')
+    search_fields = ('nombre', 'slug')
+    prepopulated_fields = {'slug': ('nombre',)}
+    filter_horizontal = ('miembros',)
+    
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+    
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser
+    
+    def has_add_permission(self, request):
+        return request.user.is_superuser
+    
+    def has_change_permission(self, request, obj=None):
+        return request.user.is_superuser
+    
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
 
 
 # ----------------------------------------
@@ -0,0 +1,232 @@
+# gestion/api.py
+"""
+API JSON de solo lectura, versión 1 (``/api/v1/...``).
+
+Cada recurso declara sus campos públicos como nombre → ruta del ORM y se lee
+con ``.values()``: no se construyen instancias de modelo. Parámetros comunes:
+
+* ``fields=a,b``: solo esas columnas (``id`` siempre va incluido).
+* ``limite=N``: filas por página (por defecto 100, máximo 1000).
+* ``cursor=…``: token opaco de ``siguiente``/``anterior`` (paginación por clave).
+* ``include=muros`` (proyectos): agrega los muros de la página en una sola consulta.
+
+Todas las respuestas llevan ``ETag`` y responden 304 a ``If-None-Match``.
+"""
+import hashlib
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views.generic import View
+
+from .models import Cliente, Material, Muro, Proyecto, ResultadoCEV, SistemaClimatizacion, TipoProyecto
+from .paginacion import CursorInvalido, PaginadorKeyset
+from .views import ProyectoFiltrosMixin, ValorFiltroMixin
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+
+CAMPOS_MURO = {
+    'id': 'id',
+    'proyecto': 'proyecto',
+    'ubicacion': 'ubicacion',
+    'superficie': 'superficie',
+    'material': 'material_aislante_id',
+    'material_nombre': 'material_aislante__nombre',
+    'conductividad': 'material_aislante__conductividad',
+    'transmitancia': 'transmitancia',
+}
+
+
+def valores(queryset, campos):
+    """
+    ``queryset.values()`` con los nombres públicos: los que coinciden con la
+    ruta van tal cual (values('cliente') ya da el id) y el resto como alias.
+    """
+    propios = [nombre for nombre, ruta in campos.items() if nombre == ruta]
+    alias = {nombre: F(ruta) for nombre, ruta in campos.items() if nombre != ruta}
+    return queryset.values(*propios, **alias)
+
+
+class ErrorAPI(Exception):
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.status = status
+
+
+def respuesta_json(request, datos, status=200):
+    """JsonResponse con ETag del contenido; 304 si el cliente ya lo tiene."""
+    respuesta = JsonResponse(datos, status=status, encoder=DjangoJSONEncoder, json_dumps_params={'ensure_ascii': False})
+    if status != 200:
+        return respuesta
+    etag = f'"{hashlib.sha1(respuesta.content).hexdigest()}"'
+    condicional = get_conditional_response(request, etag=etag)
+    if condicional is not None:
+        return condicional
+    respuesta['ETag'] = etag
+    return respuesta
+
+
+class RecursoAPIView(ValorFiltroMixin, View):
+    """
+    Listado paginado de un recurso. Las subclases definen ``model``,
+    ``campos`` (nombre público → ruta del ORM) y, si quieren, ``filtros``
+    (parámetro de la URL → campo del modelo; un valor inválido responde 400).
+    """
+    http_method_names = ['get', 'head', 'options']
+    model = None
+    campos = {}
+    filtros = {}
+    incluibles = ()
+
+    def get(self, request, *args, **kwargs):
+        try:
+            campos = self.campos_pedidos()
+            incluir = self.incluidos()
+            queryset = self.get_queryset()
+            if 'pk' in kwargs:
+                fila = valores(queryset.filter(pk=kwargs['pk']), campos).first()
+                if fila is None:
+                    raise ErrorAPI("No encontrado.", status=404)
+                filas = [fila]
+            else:
+                pagina = self.paginar(valores(queryset, campos))
+                filas = pagina.object_list
+        except ErrorAPI as error:
+            return respuesta_json(request, {'error': str(error)}, status=error.status)
+
+        for relacion in incluir:
+            getattr(self, f'incluir_{relacion}')(filas)
+        if 'pk' in kwargs:
+            return respuesta_json(request, filas[0])
+        return respuesta_json(request, {
+            'resultados': filas,
+            'siguiente': self.url_cursor(pagina.siguiente),
+            'anterior': self.url_cursor(pagina.anterior),
+        })
+
+    def get_queryset(self):
+        queryset = self.model._default_manager.all()
+        for parametro, campo in self.filtros.items():
+            valor = self.valor_filtro(parametro, self.model, campo)
+            if valor is not None:
+                queryset = queryset.filter(**{campo: valor})
+        return queryset
+
+    def filtro_invalido(self, parametro, valor):
+        raise ErrorAPI(f"Valor inválido para {parametro}: {valor!r}")
+
+    def campos_pedidos(self):
+        """Nombre público → ruta del ORM de las columnas pedidas en ``?fields=``."""
+        pedidos = self.request.GET.get('fields')
+        nombres = list(self.campos) if not pedidos else ['id'] + [
+            nombre.strip() for nombre in pedidos.split(',') if nombre.strip() and nombre.strip() != 'id'
+        ]
+        desconocidos = [nombre for nombre in nombres if nombre not in self.campos]
+        if desconocidos:
+            raise ErrorAPI(f"Campos desconocidos: {', '.join(desconocidos)}")
+        return {nombre: self.campos[nombre] for nombre in nombres}
+
+    def incluidos(self):
+        pedidos = [nombre for nombre in self.request.GET.get('include', '').split(',') if nombre]
+        desconocidos = [nombre for nombre in pedidos if nombre not in self.incluibles]
+        if desconocidos:
+            raise ErrorAPI(f"No se puede incluir: {', '.join(desconocidos)}")
+        return pedidos
+
+    def paginar(self, queryset):
+        try:
+            limite = min(int(self.request.GET.get('limite', LIMITE_POR_DEFECTO)), LIMITE_MAXIMO)
+        except ValueError:
+            raise ErrorAPI("limite debe ser un número entero.")
+        if limite < 1:
+            raise ErrorAPI("limite debe ser al menos 1.")
+        paginador = PaginadorKeyset(queryset, [('id', False)], limite, f'api-{self.model._meta.model_name}')
+        try:
+            return paginador.pagina(self.request.GET.get('cursor'))
+        except CursorInvalido:
+            raise ErrorAPI("cursor inválido.")
+
+    def url_cursor(self, token):
+        if token is None:
+            return None
+        parametros = self.request.GET.copy()
+        parametros['cursor'] = token
+        return self.request.build_absolute_uri(f"{self.request.path}?{parametros.urlencode()}")
+
+
+# ----------------------------------------
+# RECURSOS
+# ----------------------------------------
+
+class ProyectoAPIView(ProyectoFiltrosMixin, RecursoAPIView):
+    """Proyectos; acepta los filtros del listado (search, cliente, tipo, calificacion)."""
+    model = Proyecto
+    campos = {
+        'id': 'id',
+        'nombre': 'nombre',
+        'descripcion': 'descripcion',
+        'fecha_inicio': 'fecha_inicio',
+        'cliente': 'cliente',
+        'cliente_nombre': 'cliente__nombre',
+        'tipo': 'tipo',
+        'tipo_nombre': 'tipo__nombre',
+        'superficie_total': 'superficie_total',
+        'conductividad_ponderada': 'conductividad_ponderada',
+        'calificacion_estimada': 'calificacion_estimada',
+        'consumo_estimado': 'consumo_estimado',
+        'calificacion': 'resultados__calificacion',
+    }
+    incluibles = ('muros',)
+
+    def get_queryset(self):
+        return self.filtrar_proyectos(Proyecto.objects.all())
+
+    def incluir_muros(self, filas):
+        """Muros de todos los proyectos de la página en una consulta."""
+        muros = defaultdict(list)
+        consulta = Muro.objects.filter(proyecto_id__in=[fila['id'] for fila in filas]).order_by('id')
+        for muro in valores(consulta, CAMPOS_MURO):
+            muros[muro['proyecto']].append(muro)
+        for fila in filas:
+            fila['muros'] = muros[fila['id']]
+
+
+class MuroAPIView(RecursoAPIView):
+    model = Muro
+    campos = CAMPOS_MURO
+    filtros = {'proyecto': 'proyecto_id', 'material': 'material_aislante_id'}
+
+
+class ResultadoAPIView(RecursoAPIView):
+    model = ResultadoCEV
+    campos = {
+        'id': 'id',
+        'proyecto': 'proyecto',
+        'calificacion': 'calificacion',
+        'consumo_energia_anual': 'consumo_energia_anual',
+        'fecha_calificacion': 'fecha_calificacion',
+    }
+    filtros = {'proyecto': 'proyecto_id', 'calificacion': 'calificacion'}
+
+
+class ClienteAPIView(RecursoAPIView):
+    model = Cliente
+    campos = {'id': 'id', 'nombre': 'nombre', 'contacto': 'contacto'}
+
+
+class MaterialAPIView(RecursoAPIView):
+    model = Material
+    campos = {'id': 'id', 'nombre': 'nombre', 'conductividad': 'conductividad'}
+
+
+class TipoProyectoAPIView(RecursoAPIView):
+    model = TipoProyecto
+    campos = {'id': 'id', 'nombre': 'nombre'}
+
+
+class SistemaClimatizacionAPIView(RecursoAPIView):
+    model = SistemaClimatizacion
+    campos = {'id': 'id', 'tipo': 'tipo', 'eficiencia_nominal': 'eficiencia_nominal'}
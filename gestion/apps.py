@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class GestionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestion'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .metricas import instalar_en_conexion
+
+        # Conteo de consultas por petición (ver metricas.py)
+        connection_created.connect(instalar_en_conexion, dispatch_uid='gestion.metricas')
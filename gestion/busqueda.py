@@ -0,0 +1,152 @@
+# gestion/busqueda.py
+"""
+Índice de búsqueda de texto completo de proyectos (nombre, cliente y descripción).
+
+* SQLite: tabla virtual FTS5 ``gestion_proyecto_busqueda`` cuyo rowid es el
+  id del proyecto; la relevancia es ``bm25``.
+* PostgreSQL: tabla ``gestion_proyecto_busqueda(rowid, documento tsvector)``
+  con índice GIN; la relevancia es ``ts_rank_cd``.
+
+En ambos casos la tabla se lee a través del modelo no administrado
+``ProyectoBusqueda`` (relación ``Proyecto.busqueda``) y se mantiene al día con
+las señales de gestion/signals.py. En otros motores la búsqueda vuelve a
+``icontains``. La tabla la crea la migración 0007, que lleva su propio DDL.
+Este módulo no importa modelos.
+"""
+import re
+
+from django.db import NotSupportedError, connection
+from django.db.models import BooleanField, F, FloatField, Func, Q, Value
+
+TABLA_BUSQUEDA = 'gestion_proyecto_busqueda'
+
+# Configuración de texto de PostgreSQL (stemming en español).
+CONFIGURACION_PG = 'spanish'
+
+# Pesos de las columnas (nombre, cliente, descripción).
+PESOS_BM25 = (10.0, 5.0, 1.0)
+
+
+def soporta_busqueda(conexion=connection):
+    return conexion.vendor in ('sqlite', 'postgresql')
+
+
+def terminos(texto):
+    """Palabras de la búsqueda; cualquier otro carácter (comillas, operadores) se descarta."""
+    return re.findall(r'\w+', texto or '')
+
+
+# ----------------------------------------
+# EXPRESIONES DE CONSULTA
+# ----------------------------------------
+
+class _ExpresionBusqueda(Func):
+    """
+    Recibe la búsqueda y referencia la fila de ``Proyecto.busqueda``; el SQL
+    usa el alias de esa tabla dentro de la consulta.
+    """
+
+    def __init__(self, texto, **extra):
+        self.texto = texto
+        super().__init__(F('busqueda'), **extra)
+
+    def _alias(self, compiler):
+        return compiler.quote_name_unless_alias(self.get_source_expressions()[0].alias)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError("La búsqueda de texto completo requiere SQLite o PostgreSQL.")
+
+
+class CoincideBusqueda(_ExpresionBusqueda):
+    """Condición: el proyecto contiene todas las palabras (por prefijo)."""
+    output_field = BooleanField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        consulta = ' '.join(f'"{termino}"*' for termino in terminos(self.texto))
+        return f"{self._alias(compiler)} MATCH %s", [consulta]
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        consulta = ' & '.join(f'{termino}:*' for termino in terminos(self.texto))
+        return f"{self._alias(compiler)}.documento @@ to_tsquery(%s::regconfig, %s)", [CONFIGURACION_PG, consulta]
+
+
+class RelevanciaBusqueda(_ExpresionBusqueda):
+    """Relevancia del proyecto para la búsqueda; menor es mejor (se ordena ascendente)."""
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        pesos = ', '.join(str(peso) for peso in PESOS_BM25)
+        return f"bm25({self._alias(compiler)}, {pesos})", []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        consulta = ' & '.join(f'{termino}:*' for termino in terminos(self.texto))
+        return (
+            f"-ts_rank_cd({self._alias(compiler)}.documento, to_tsquery(%s::regconfig, %s))",
+            [CONFIGURACION_PG, consulta],
+        )
+
+
+def buscar_proyectos(queryset, texto):
+    """
+    Filtra ``queryset`` (de Proyecto) por ``texto`` y anota ``relevancia``.
+    Sin índice disponible, filtra con ``icontains`` y la relevancia es 0.
+    """
+    if not terminos(texto):
+        return queryset.annotate(relevancia=Value(0.0, output_field=FloatField())).none()
+    if not soporta_busqueda(connection):
+        return queryset.filter(
+            Q(nombre__icontains=texto) | Q(cliente__nombre__icontains=texto) | Q(descripcion__icontains=texto)
+        ).annotate(relevancia=Value(0.0, output_field=FloatField()))
+    # El filtro busqueda__isnull=False fuerza un INNER JOIN con la tabla del índice.
+    return queryset.filter(busqueda__isnull=False).filter(
+        CoincideBusqueda(texto)
+    ).annotate(relevancia=RelevanciaBusqueda(texto))
+
+
+# ----------------------------------------
+# MANTENIMIENTO DEL ÍNDICE
+# ----------------------------------------
+
+def indexar_proyectos(queryset):
+    """
+    (Re)indexa en SQL, sin cargar filas en Python, los proyectos de
+    ``queryset``. Sirve tanto para un proyecto como para la tabla completa.
+    """
+    conexion = connection
+    if not soporta_busqueda(conexion):
+        return
+    proyectos = queryset.model._meta.db_table
+    clientes = queryset.model._meta.get_field('cliente').related_model._meta.db_table
+    subconsulta, parametros = queryset.order_by().values('pk').query.sql_with_params()
+    seleccion = (
+        f"FROM {proyectos} p INNER JOIN {clientes} c ON c.id = p.cliente_id "
+        f"WHERE p.id IN ({subconsulta})"
+    )
+    with conexion.cursor() as cursor:
+        if conexion.vendor == 'sqlite':
+            cursor.execute(f"DELETE FROM {TABLA_BUSQUEDA} WHERE rowid IN ({subconsulta})", parametros)
+            cursor.execute(
+                f"INSERT INTO {TABLA_BUSQUEDA} (rowid, nombre, cliente, descripcion) "
+                f"SELECT p.id, p.nombre, c.nombre, COALESCE(p.descripcion, '') {seleccion}",
+                parametros,
+            )
+        else:
+            cursor.execute(
+                f"INSERT INTO {TABLA_BUSQUEDA} (rowid, documento) "
+                "SELECT p.id, "
+                "setweight(to_tsvector(%s::regconfig, p.nombre), 'A') || "
+                "setweight(to_tsvector(%s::regconfig, c.nombre), 'B') || "
+                "setweight(to_tsvector(%s::regconfig, COALESCE(p.descripcion, '')), 'C') "
+                f"{seleccion} "
+                "ON CONFLICT (rowid) DO UPDATE SET documento = EXCLUDED.documento",
+                [CONFIGURACION_PG] * 3 + list(parametros),
+            )
+
+
+def desindexar_proyectos(pks):
+    """Quita del índice los proyectos borrados."""
+    if not soporta_busqueda(connection) or not pks:
+        return
+    marcadores = ', '.join(['%s'] * len(pks))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_BUSQUEDA} WHERE rowid IN ({marcadores})", list(pks))
@@ -0,0 +1,112 @@
+# gestion/certificacion.py
+"""
+Certificación masiva: crea o actualiza el ResultadoCEV de muchos proyectos a
+partir de su calificación calculada en SQL (ProyectoQuerySet.with_rating).
+
+Cada lote es una sola consulta de lectura (calificación calculada y resultado
+actual juntos) y, si hay cambios, un ``bulk_create(update_conflicts=True)``
+sobre la clave 1:1 ``proyecto``. Los resultados que no cambian no se
+reescriben, así conservan su fecha de calificación.
+"""
+import time
+from decimal import Decimal
+
+from django.db import transaction
+
+from .dashboard import invalidar_dashboard
+from .models import SIN_DATOS, Proyecto, ResultadoCEV
+
+# Columnas del resultado que se reescriben cuando cambia la calificación.
+CAMPOS_RESULTADO = ('calificacion', 'consumo_energia_anual', 'fecha_calificacion')
+
+
+class CertificadorCEV:
+    """
+    Certifica proyectos por lotes recorridos por pk (keyset). Con
+    ``simular=True`` no escribe nada y solo informa lo que cambiaría.
+    """
+
+    def __init__(self, lote=2000, simular=False, fecha=None):
+        self.lote = lote
+        self.simular = simular
+        self.fecha = fecha
+        self.estadisticas = {
+            'proyectos': 0,
+            'nuevos': 0,
+            'actualizados': 0,
+            'sin_cambios': 0,
+            'sin_datos': 0,
+            'segundos': 0.0,
+        }
+
+    @property
+    def proyectos_por_segundo(self):
+        segundos = self.estadisticas['segundos']
+        return self.estadisticas['proyectos'] / segundos if segundos else 0.0
+
+    def certificar(self, proyectos, cambios=None, progreso=None):
+        """
+        Certifica los proyectos del queryset ``proyectos``.
+
+        ``cambios(proyecto_id, anterior, nuevo)`` recibe cada resultado que se
+        crea (``anterior`` es None) o cambia, como tuplas (calificación,
+        consumo); ``progreso(estadisticas)`` se llama tras cada lote.
+        """
+        inicio = time.monotonic()
+        ultimo = 0
+        while True:
+            filas = list(
+                proyectos.filter(pk__gt=ultimo)
+                .order_by('pk')
+                .with_rating()
+                .values_list(
+                    'pk', 'calificacion_calculada', 'consumo_calculado',
+                    'resultados__calificacion', 'resultados__consumo_energia_anual',
+                )[:self.lote]
+            )
+            if not filas:
+                break
+            self._certificar_lote(filas, cambios)
+            ultimo = filas[-1][0]
+            self.estadisticas['segundos'] = time.monotonic() - inicio
+            if progreso:
+                progreso(self.estadisticas)
+
+        if not self.simular and (self.estadisticas['nuevos'] or self.estadisticas['actualizados']):
+            invalidar_dashboard()
+        self.estadisticas['segundos'] = time.monotonic() - inicio
+        return self.estadisticas
+
+    def _certificar_lote(self, filas, cambios):
+        resultados = []
+        for pk, calificacion, consumo, calificacion_actual, consumo_actual in filas:
+            self.estadisticas['proyectos'] += 1
+            if calificacion == SIN_DATOS:
+                # Sin superficie de muros no hay calificación que certificar.
+                self.estadisticas['sin_datos'] += 1
+                continue
+            nuevo = (calificacion, Decimal(consumo))
+            anterior = (calificacion_actual, consumo_actual) if calificacion_actual is not None else None
+            if anterior == nuevo:
+                self.estadisticas['sin_cambios'] += 1
+                continue
+            self.estadisticas['nuevos' if anterior is None else 'actualizados'] += 1
+            if cambios:
+                cambios(pk, anterior, nuevo)
+            resultado = ResultadoCEV(proyecto_id=pk, calificacion=calificacion, consumo_energia_anual=nuevo[1])
+            if self.fecha:
+                resultado.fecha_calificacion = self.fecha
+            resultados.append(resultado)
+
+        if self.simular or not resultados:
+            return
+        with transaction.atomic():
+            ResultadoCEV.objects.bulk_create(
+                resultados,
+                update_conflicts=True,
+                unique_fields=['proyecto'],
+                update_fields=list(CAMPOS_RESULTADO),
+            )
+            # bulk_create no dispara señales: los fragmentos en caché de estos
+            # proyectos muestran el resultado.
+            Proyecto.objects.filter(pk__in=[r.proyecto_id for r in resultados]).tocar()
@@ -0,0 +1,162 @@
+# gestion/clonacion.py
+"""
+Clonación profunda de proyectos: el proyecto, sus muros (con sus capas) y sus
+sistemas de climatización.
+
+Muchas viviendas son diseños repetidos. Copiar N veces un proyecto de M muros
+(``clonar_proyecto``), o una vez cada uno de N proyectos (``clonar_proyectos``),
+no hace N × M INSERT ni carga los muros en Python: por cada lote de copias
+los proyectos se crean con ``bulk_create`` y los muros, las capas y la tabla
+intermedia de sistemas se copian con un ``INSERT ... SELECT`` cada uno, dentro
+de la base de datos. La calificación estimada almacenada se copia tal cual
+(los muros son los mismos); el ResultadoCEV no se copia, porque certifica una
+vivienda concreta.
+"""
+from datetime import date
+
+from django.db import connection, transaction
+
+from .busqueda import indexar_proyectos
+from .dashboard import invalidar_dashboard
+from .models import CapaMuro, Cliente, Muro, Proyecto
+
+# Proyectos por lote de copias (acota los parámetros de cada IN).
+PROYECTOS_POR_LOTE = 1000
+
+CAMPOS_PROYECTO = (
+    'tipo_id', 'descripcion', 'superficie_total', 'conductividad_ponderada',
+    'calificacion_estimada', 'consumo_estimado', 'organizacion_id',
+)
+
+
+def nombre_copia(nombre, numero=None):
+    """``"Casa (copia)"`` o ``"Casa (copia 3)"``, recortado al largo del campo."""
+    sufijo = " (copia)" if numero is None else f" (copia {numero})"
+    maximo = Proyecto._meta.get_field('nombre').max_length
+    return nombre[:maximo - len(sufijo)] + sufijo
+
+
+def _columnas(modelo, excluir):
+    """Columnas de ``modelo`` que se copian tal cual (todas menos el pk y ``excluir``)."""
+    return [
+        campo.column for campo in modelo._meta.concrete_fields
+        if not campo.primary_key and campo.name != excluir
+    ]
+
+
+def _copiar_relaciones(cursor, pares):
+    """
+    Copia muros, capas y sistemas de cada proyecto original en su copia;
+    ``pares`` es una lista de (pk original, pk copia). Un original puede
+    aparecer varias veces (varias copias del mismo proyecto).
+    """
+    q = connection.ops.quote_name
+    # Tabla (origen, copia) en la propia consulta: un INSERT ... SELECT por tabla para todo el lote.
+    mapa = f"WITH mapa (origen, copia) AS (VALUES {', '.join(['(%s, %s)'] * len(pares))}) "
+    parametros = [pk for par in pares for pk in par]
+    muros = q(Muro._meta.db_table)
+    capas = q(CapaMuro._meta.db_table)
+    SistemasProyecto = Proyecto.sistemas.through
+    sistemas = q(SistemasProyecto._meta.db_table)
+
+    columnas = _columnas(Muro, 'proyecto')
+    # ORDER BY: los muros de cada copia reciben id en el mismo orden que los
+    # del original, y así se emparejan más abajo para copiar las capas.
+    cursor.execute(
+        f"{mapa}INSERT INTO {muros} (proyecto_id, {', '.join(q(c) for c in columnas)}) "
+        f"SELECT mapa.copia, {', '.join(f'm.{q(c)}' for c in columnas)} "
+        f"FROM mapa INNER JOIN {muros} m ON m.proyecto_id = mapa.origen ORDER BY mapa.copia, m.id",
+        parametros,
+    )
+
+    columnas = _columnas(CapaMuro, 'muro')
+    cursor.execute(
+        f"{mapa}INSERT INTO {capas} (muro_id, {', '.join(q(c) for c in columnas)}) "
+        f"SELECT nuevo.id, {', '.join(f'c.{q(c)}' for c in columnas)} FROM mapa "
+        f"INNER JOIN (SELECT id, proyecto_id, ROW_NUMBER() OVER (PARTITION BY proyecto_id ORDER BY id) AS n "
+        f"            FROM {muros} WHERE proyecto_id IN (SELECT copia FROM mapa)) nuevo "
+        f"        ON nuevo.proyecto_id = mapa.copia "
+        f"INNER JOIN (SELECT id, proyecto_id, ROW_NUMBER() OVER (PARTITION BY proyecto_id ORDER BY id) AS n "
+        f"            FROM {muros} WHERE proyecto_id IN (SELECT origen FROM mapa)) original "
+        f"        ON original.proyecto_id = mapa.origen AND original.n = nuevo.n "
+        f"INNER JOIN {capas} c ON c.muro_id = original.id",
+        parametros,
+    )
+
+    cursor.execute(
+        f"{mapa}INSERT INTO {sistemas} (proyecto_id, sistemaclimatizacion_id) "
+        f"SELECT mapa.copia, s.sistemaclimatizacion_id "
+        f"FROM mapa INNER JOIN {sistemas} s ON s.proyecto_id = mapa.origen",
+        parametros,
+    )
+
+
+def clonar_proyecto(proyecto, copias=1, cliente=None, nombre=None):
+    """
+    Crea ``copias`` proyectos iguales a ``proyecto``, para ``cliente`` (una
+    instancia o un pk; por defecto el mismo) y con fecha de inicio de hoy.
+    Con ``nombre`` se reemplaza el nombre base de las copias. Devuelve los
+    proyectos nuevos, con su pk.
+    """
+    if copias < 1:
+        raise ValueError("copias debe ser al menos 1.")
+    base = nombre or proyecto.nombre
+    cliente_id = proyecto.cliente_id if cliente is None else getattr(cliente, 'pk', cliente)
+    datos = {campo: getattr(proyecto, campo) for campo in CAMPOS_PROYECTO}
+    if cliente is not None:
+        # Las copias quedan en la organización de su cliente.
+        if not isinstance(cliente, Cliente):
+            cliente = Cliente._base_manager.get(pk=cliente)
+        datos['organizacion_id'] = cliente.organizacion_id
+    hoy = date.today()
+
+    nuevos = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for inicio in range(0, copias, PROYECTOS_POR_LOTE):
+            lote = Proyecto.objects.bulk_create([
+                Proyecto(
+                    cliente_id=cliente_id,
+                    nombre=nombre_copia(base, None if copias == 1 else numero),
+                    fecha_inicio=hoy,
+                    **datos,
+                )
+                for numero in range(inicio + 1, min(copias, inicio + PROYECTOS_POR_LOTE) + 1)
+            ])
+            pks = [copia.pk for copia in lote]
+            _copiar_relaciones(cursor, [(proyecto.pk, pk) for pk in pks])
+            # bulk_create y el SQL directo no disparan señales: índice de búsqueda a mano.
+            indexar_proyectos(Proyecto.objects.filter(pk__in=pks))
+            nuevos.extend(lote)
+    invalidar_dashboard()
+    return nuevos
+
+
+def clonar_proyectos(queryset):
+    """
+    Una copia de cada proyecto de ``queryset``, para su mismo cliente y con
+    fecha de inicio de hoy (la acción del admin). Por cada lote, un
+    ``bulk_create`` y un ``INSERT ... SELECT`` por tabla relacionada, sin
+    importar cuántos proyectos se eligieron. Devuelve los proyectos nuevos.
+    """
+    originales = list(queryset.order_by('pk').values('pk', 'nombre', 'cliente_id', *CAMPOS_PROYECTO))
+    hoy = date.today()
+
+    nuevos = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for inicio in range(0, len(originales), PROYECTOS_POR_LOTE):
+            datos = originales[inicio:inicio + PROYECTOS_POR_LOTE]
+            lote = Proyecto.objects.bulk_create([
+                Proyecto(
+                    cliente_id=original['cliente_id'],
+                    nombre=nombre_copia(original['nombre']),
+                    fecha_inicio=hoy,
+                    **{campo: original[campo] for campo in CAMPOS_PROYECTO},
+                )
+                for original in datos
+            ])
+            _copiar_relaciones(cursor, [(original['pk'], copia.pk) for original, copia in zip(datos, lote)])
+            indexar_proyectos(Proyecto.objects.filter(pk__in=[copia.pk for copia in lote]))
+            nuevos.extend(lote)
+    if nuevos:
+        invalidar_dashboard()
+    return nuevos
@@ -0,0 +1,146 @@
+# gestion/dashboard.py
+"""
+Datos del dashboard (HomeView) con caché.
+
+Los conteos de proyectos salen de un único aggregate con filtros condicionales
+(COUNT ... FILTER / CASE). El resultado completo se guarda en el caché de
+Django, uno por organización (``gestion:dashboard:org:<pk>``, o ``...:todas``
+sin organización en curso), y las señales de gestion/signals.py lo invalidan
+cuando cambia cualquier modelo que aparezca en él.
+"""
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Q
+
+from .models import (
+    CALIFICACION_MAXIMA,
+    SIN_DATOS,
+    UMBRALES_CALIFICACION,
+    Cliente,
+    Proyecto,
+    ResultadoCEV,
+)
+from .organizaciones import clave_organizacion, organizacion_actual
+from .replicas import REPLICAS
+
+CLAVE_CACHE = 'gestion:dashboard'
+CLAVE_GENERACION = 'gestion:dashboard:generacion'
+
+CALIFICACIONES_OFICIALES = [calificacion for calificacion, _ in ResultadoCEV.CALIFICACIONES]
+CALIFICACIONES_ESTIMADAS = [calificacion for _, calificacion in UMBRALES_CALIFICACION] + [
+    CALIFICACION_MAXIMA, SIN_DATOS
+]
+
+
+def _consultas_dashboard():
+    """Las tres consultas independientes del dashboard, sin ejecutar."""
+    agregados = {
+        'total_proyectos': Count('pk'),
+        'proyectos_calificados': Count('pk', filter=Q(resultados__isnull=False)),
+    }
+    for i, calificacion in enumerate(CALIFICACIONES_OFICIALES):
+        agregados[f'oficial_{i}'] = Count('pk', filter=Q(resultados__calificacion=calificacion))
+    for i, calificacion in enumerate(CALIFICACIONES_ESTIMADAS):
+        agregados[f'estimada_{i}'] = Count('pk', filter=Q(calificacion_estimada=calificacion))
+    # Con el resultado precargado, badge y estado no consultan nada más
+    recientes = Proyecto.objects.select_related('cliente', 'tipo', 'resultados').order_by('-fecha_inicio')[:5]
+    return Proyecto.objects.order_by(), agregados, Cliente.objects.all(), recientes
+
+
+def _armar_dashboard(conteos, total_clientes, proyectos_recientes):
+    return {
+        'total_proyectos': conteos['total_proyectos'],
+        'total_clientes': total_clientes,
+        'proyectos_calificados': conteos['proyectos_calificados'],
+        'proyectos_en_curso': conteos['total_proyectos'] - conteos['proyectos_calificados'],
+        # Distribución de calificaciones (solo las que tienen proyectos)
+        'calificaciones': [
+            {'calificacion': calificacion, 'count': conteos[f'oficial_{i}']}
+            for i, calificacion in enumerate(CALIFICACIONES_OFICIALES)
+            if conteos[f'oficial_{i}']
+        ],
+        'calificaciones_estimadas': [
+            {'calificacion_estimada': calificacion, 'count': conteos[f'estimada_{i}']}
+            for i, calificacion in enumerate(CALIFICACIONES_ESTIMADAS)
+            if conteos[f'estimada_{i}']
+        ],
+        'proyectos_recientes': proyectos_recientes,
+    }
+
+
+def calcular_dashboard():
+    """Arma el contexto del dashboard: un aggregate de proyectos, un COUNT de clientes y los 5 recientes."""
+    proyectos, agregados, clientes, recientes = _consultas_dashboard()
+    return _armar_dashboard(proyectos.aggregate(**agregados), clientes.count(), list(recientes))
+
+
+async def calcular_dashboard_async():
+    """Como ``calcular_dashboard``, lanzando las tres consultas a la vez con el ORM async."""
+    proyectos, agregados, clientes, recientes = _consultas_dashboard()
+
+    async def listar(queryset):
+        return [fila async for fila in queryset]
+
+    return _armar_dashboard(*await asyncio.gather(
+        proyectos.aaggregate(**agregados), clientes.acount(), listar(recientes),
+    ))
+
+
+def _timeout():
+    """
+    Duración en caché del dashboard recién calculado. Si se leyó de una réplica
+    le puede faltar lo último escrito (ya invalidado): se guarda como mucho
+    CEV_REPLICAS_RETRASO_MAXIMO_SEGUNDOS.
+    """
+    if REPLICAS.base_de_lectura() in (None, DEFAULT_DB_ALIAS):
+        return settings.CEV_DASHBOARD_CACHE_TIMEOUT
+    return min(settings.CEV_DASHBOARD_CACHE_TIMEOUT, settings.CEV_REPLICAS_RETRASO_MAXIMO_SEGUNDOS)
+
+
+def _clave(generacion, organizacion=None):
+    return f"{clave_organizacion(CLAVE_CACHE, organizacion)}:{generacion or 0}"
+
+
+def obtener_dashboard():
+    """Contexto del dashboard de la organización en curso desde el caché, calculándolo si no está."""
+    clave = _clave(cache.get(CLAVE_GENERACION))
+    datos = cache.get(clave)
+    if datos is None:
+        datos = calcular_dashboard()
+        cache.set(clave, datos, _timeout())
+    return datos
+
+
+async def obtener_dashboard_async():
+    clave = _clave(await cache.aget(CLAVE_GENERACION))
+    datos = await cache.aget(clave)
+    if datos is None:
+        datos = await calcular_dashboard_async()
+        await cache.aset(clave, datos, _timeout())
+    return datos
+
+
+def invalidar_dashboard(instance=None, **kwargs):
+    """
+    Descarta el dashboard en caché (se usa también como receptor de señales):
+    el de la organización de ``instance`` o la en curso y el de la plataforma
+    completa. Las filas comunes a todas (tipos, catálogo común) o de
+    organización desconocida descartan todos.
+    """
+    campo = None if instance is None else getattr(type(instance)._default_manager, 'campo_organizacion', None)
+    if instance is not None and campo in (None, 'organizacion'):
+        # None si la fila es común a todas (tipos, catálogo común) o anterior a las organizaciones.
+        organizacion = getattr(instance, 'organizacion_id', None)
+    else:
+        # Sin instancia, o una fila de un proyecto (muro, capa, resultado): la organización en curso.
+        organizacion = organizacion_actual()
+    if organizacion is None:
+        # Todas las claves cambian de generación; las anteriores expiran solas.
+        cache.set(CLAVE_GENERACION, time.time_ns(), None)
+        return
+    generacion = cache.get(CLAVE_GENERACION)
+    cache.delete_many([_clave(generacion, organizacion), _clave(generacion, 'todas')])
@@ -0,0 +1,35 @@
+# gestion/forms.py
+
+from django import forms
+from django.conf import settings
+
+from .models import Cliente, Proyecto
+
+
+class ClonarProyectoForm(forms.Form):
+    """Número de copias de un proyecto (con muros y sistemas) y cliente al que se asignan."""
+    copias = forms.IntegerField(
+        min_value=1, initial=1,
+        help_text="Proyectos nuevos, iguales al original.",
+    )
+    cliente = forms.ModelChoiceField(
+        queryset=Cliente.objects.order_by('nombre'), required=False,
+        help_text="Por defecto, el mismo cliente del proyecto original.",
+    )
+    nombre = forms.CharField(
+        required=False, max_length=Proyecto._meta.get_field('nombre').max_length,
+        help_text="Nombre base de las copias; por defecto, el del original.",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Se arma en cada formulario: solo los clientes de la organización en curso.
+        self.fields['cliente'].queryset = Cliente.objects.order_by('nombre')
+
+    def clean_copias(self):
+        copias = self.cleaned_data['copias']
+        if copias > settings.CEV_CLONACION_MAX_COPIAS:
+            raise forms.ValidationError(
+                f"Como máximo {settings.CEV_CLONACION_MAX_COPIAS} copias por vez."
+            )
+        return copias
@@ -0,0 +1,72 @@
+# gestion/fragmentos.py
+"""
+Caché de fragmentos de plantilla y de los desplegables de filtros.
+
+* Las filas del listado, los recientes del dashboard y el detalle se guardan
+  con ``{% cache tiempo_fragmentos ... proyecto.clave_cache version_catalogo %}``:
+  cualquier cambio del proyecto sube su versión (ver Proyecto.version), y uno
+  en tipos, materiales o sistemas (comunes a todas las organizaciones) la del
+  catálogo, otro número en el caché, sin reescribir proyectos. Una entrada
+  nunca queda desactualizada; las viejas dejan de leerse y expiran.
+* Los clientes de los filtros se guardan bajo la versión de los datos de
+  referencia, un número en el caché que cambia al guardar o borrar un Cliente
+  (señales en gestion/signals.py), y por organización (cada una ve solo sus
+  clientes). Los tipos salen del caché en memoria de gestion/referencias.py.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Cliente, TipoProyecto
+from .organizaciones import clave_organizacion
+from .referencias import REFERENCIAS
+
+CLAVE_VERSION_REFERENCIAS = 'gestion:referencias:version'
+CLAVE_VERSION_CATALOGO = 'gestion:catalogo:version'
+
+
+def _version(clave):
+    version = cache.get(clave)
+    if version is None:
+        # Un número que no se repite aunque el caché se haya vaciado: nunca se
+        # vuelve a leer un fragmento guardado con una versión anterior.
+        cache.add(clave, time.time_ns(), None)
+        version = cache.get(clave)
+    return version
+
+
+def version_referencias():
+    return _version(CLAVE_VERSION_REFERENCIAS)
+
+
+def version_catalogo():
+    return _version(CLAVE_VERSION_CATALOGO)
+
+
+def invalidar_filtros(**kwargs):
+    """Cambia la versión de los datos de referencia (se usa también como receptor de señales)."""
+    cache.set(CLAVE_VERSION_REFERENCIAS, time.time_ns(), None)
+
+
+def invalidar_catalogo(**kwargs):
+    """Cambia la versión del catálogo en los fragmentos (receptor de señales)."""
+    cache.set(CLAVE_VERSION_CATALOGO, time.time_ns(), None)
+
+
+def opciones_filtros():
+    """Clientes y tipos para los desplegables del listado."""
+    clientes = cache.get_or_set(
+        clave_organizacion(f'gestion:filtros:clientes:{version_referencias()}'),
+        lambda: list(Cliente.objects.all()),
+        settings.CEV_FRAGMENTOS_CACHE_TIMEOUT,
+    )
+    return {'clientes': clientes, 'tipos': REFERENCIAS.todos(TipoProyecto)}
+
+
+def contexto(request):
+    """Context processor: duración de los fragmentos y versión del catálogo para ``{% cache %}``."""
+    return {
+        'tiempo_fragmentos': settings.CEV_FRAGMENTOS_CACHE_TIMEOUT,
+        'version_catalogo': version_catalogo(),
+    }
@@ -0,0 +1,370 @@
+# gestion/importacion.py
+"""
+Importación masiva de clientes, proyectos, muros y resultados CEV.
+
+Formatos aceptados (se leen en streaming, un proyecto a la vez):
+
+* CSV: una fila por muro. Las filas de un mismo proyecto comparten
+  ``proyecto_ref`` y deben ir seguidas; los datos del cliente, del proyecto y
+  del resultado se toman de la primera fila del grupo. Una fila sin
+  ``muro_ubicacion`` representa un proyecto sin muros.
+* JSONL: una línea por proyecto con la forma
+  ``{"ref", "cliente": {...}, "proyecto": {...}, "muros": [...], "resultado": {...}}``.
+
+Materiales, tipos de proyecto y sistemas se resuelven por nombre contra tablas
+cargadas en memoria al comenzar; una referencia desconocida rechaza el proyecto.
+
+Con una organización en curso todo se crea en ella (ver
+gestion/organizaciones.py) y se rechazan los proyectos cuyo contacto es un
+cliente de otra organización: el contacto es único en toda la plataforma.
+"""
+import csv
+import itertools
+import json
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from .busqueda import indexar_proyectos
+from .dashboard import invalidar_dashboard
+from .fragmentos import invalidar_filtros
+from .models import (
+    Cliente,
+    Material,
+    Muro,
+    Proyecto,
+    ResultadoCEV,
+    SistemaClimatizacion,
+    TipoProyecto,
+)
+from .organizaciones import organizacion_actual
+
+COLUMNAS_CSV = (
+    'proyecto_ref',
+    'cliente_contacto',
+    'cliente_nombre',
+    'proyecto_nombre',
+    'proyecto_descripcion',
+    'fecha_inicio',
+    'tipo',
+    'sistemas',
+    'muro_ubicacion',
+    'muro_superficie',
+    'muro_material',
+    'calificacion',
+    'consumo_energia_anual',
+    'fecha_calificacion',
+)
+
+# Separador de la lista de sistemas en la columna CSV ``sistemas``.
+SEPARADOR_SISTEMAS = '|'
+
+
+class RegistroInvalido(Exception):
+    """Un proyecto del archivo no se puede importar."""
+
+
+def _limpiar(modelo, campo, valor):
+    """Valida y convierte ``valor`` con las reglas del campo del modelo."""
+    field = modelo._meta.get_field(campo)
+    if valor in ('', None) and (field.null or field.blank or field.has_default()):
+        return field.get_default() if field.has_default() else None
+    try:
+        return field.clean(valor, None)
+    except ValidationError as error:
+        raise RegistroInvalido(f"{modelo.__name__}.{campo}: {'; '.join(error.messages)}")
+
+
+def leer_csv(archivo):
+    """Agrupa las filas CSV consecutivas de cada proyecto en un registro."""
+    lector = csv.DictReader(archivo)
+    faltantes = {'proyecto_ref', 'cliente_contacto', 'proyecto_nombre', 'tipo'} - set(lector.fieldnames or ())
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el CSV: {', '.join(sorted(faltantes))}")
+
+    for ref, filas in itertools.groupby(lector, key=lambda fila: fila.get('proyecto_ref')):
+        filas = list(filas)
+        primera = filas[0]
+        registro = {
+            'ref': ref,
+            'cliente': {
+                'contacto': primera.get('cliente_contacto'),
+                'nombre': primera.get('cliente_nombre'),
+            },
+            'proyecto': {
+                'nombre': primera.get('proyecto_nombre'),
+                'descripcion': primera.get('proyecto_descripcion'),
+                'fecha_inicio': primera.get('fecha_inicio'),
+                'tipo': primera.get('tipo'),
+                'sistemas': [s.strip() for s in (primera.get('sistemas') or '').split(SEPARADOR_SISTEMAS) if s.strip()],
+            },
+            'muros': [
+                {
+                    'ubicacion': fila.get('muro_ubicacion'),
+                    'superficie': fila.get('muro_superficie'),
+                    'material': fila.get('muro_material'),
+                }
+                for fila in filas if fila.get('muro_ubicacion')
+            ],
+            'resultado': None,
+        }
+        if primera.get('calificacion'):
+            registro['resultado'] = {
+                'calificacion': primera.get('calificacion'),
+                'consumo_energia_anual': primera.get('consumo_energia_anual'),
+                'fecha_calificacion': primera.get('fecha_calificacion'),
+            }
+        yield registro, filas
+
+
+def leer_jsonl(archivo):
+    """Un registro por línea; las líneas vacías se ignoran."""
+    for numero, linea in enumerate(archivo, start=1):
+        if not linea.strip():
+            continue
+        try:
+            registro = json.loads(linea)
+        except json.JSONDecodeError as error:
+            yield None, [{'linea': numero, 'error': f"JSON inválido: {error}", 'original': linea.rstrip('\n')}]
+            continue
+        yield registro, [registro]
+
+
+class ImportadorCEV:
+    """
+    Importa registros por lotes: cada lote es una transacción y se escribe con
+    ``bulk_create``. Los clientes se insertan o actualizan (upsert) por
+    ``contacto``. La memoria usada depende del tamaño de lote, no del archivo.
+    """
+
+    def __init__(self, lote=500, batch_size=1000):
+        self.lote = lote
+        self.batch_size = batch_size
+        self.materiales = dict(Material.objects.values_list('nombre', 'pk'))
+        self.tipos = dict(TipoProyecto.objects.values_list('nombre', 'pk'))
+        self.sistemas = dict(SistemaClimatizacion.objects.values_list('tipo', 'pk'))
+        self.estadisticas = {
+            'filas': 0,
+            'proyectos': 0,
+            'muros': 0,
+            'resultados': 0,
+            'rechazados': 0,
+            'segundos': 0.0,
+        }
+
+    @property
+    def filas_por_segundo(self):
+        segundos = self.estadisticas['segundos']
+        return self.estadisticas['filas'] / segundos if segundos else 0.0
+
+    def importar(self, archivo, formato, rechazos=None, progreso=None):
+        """
+        Importa ``archivo`` (texto) en formato 'csv' o 'jsonl'.
+
+        ``rechazos(filas, error)`` recibe las filas originales de cada proyecto
+        rechazado; ``progreso(estadisticas)`` se llama tras cada lote.
+        """
+        lector = leer_csv if formato == 'csv' else leer_jsonl
+        inicio = time.monotonic()
+        pendientes = []
+
+        for registro, filas in lector(archivo):
+            self.estadisticas['filas'] += len(filas)
+            if registro is None:
+                self._rechazar(filas, filas[0]['error'], rechazos)
+                continue
+            try:
+                pendientes.append((self._preparar(registro), filas))
+            except (RegistroInvalido, AttributeError, TypeError) as error:
+                self._rechazar(filas, str(error), rechazos)
+                continue
+
+            if len(pendientes) >= self.lote:
+                self._guardar(pendientes, rechazos)
+                pendientes = []
+                self.estadisticas['segundos'] = time.monotonic() - inicio
+                if progreso:
+                    progreso(self.estadisticas)
+
+        if pendientes:
+            self._guardar(pendientes, rechazos)
+        self.estadisticas['segundos'] = time.monotonic() - inicio
+        return self.estadisticas
+
+    def _rechazar(self, filas, error, rechazos):
+        self.estadisticas['rechazados'] += 1
+        if rechazos:
+            rechazos(filas, error)
+
+    def _referencia(self, tabla, nombre, etiqueta):
+        try:
+            return tabla[nombre]
+        except KeyError:
+            raise RegistroInvalido(f"{etiqueta} desconocido: {nombre!r}")
+
+    def _preparar(self, registro):
+        """Valida un registro y resuelve sus referencias sin tocar la base de datos."""
+        cliente = registro.get('cliente') or {}
+        datos = registro.get('proyecto') or {}
+
+        contacto = _limpiar(Cliente, 'contacto', cliente.get('contacto'))
+        preparado = {
+            'cliente': {
+                'contacto': contacto,
+                'nombre': _limpiar(Cliente, 'nombre', cliente.get('nombre') or contacto),
+            },
+            'proyecto': {
+                'nombre': _limpiar(Proyecto, 'nombre', datos.get('nombre')),
+                'descripcion': _limpiar(Proyecto, 'descripcion', datos.get('descripcion')),
+                'fecha_inicio': _limpiar(Proyecto, 'fecha_inicio', datos.get('fecha_inicio')),
+                'tipo_id': self._referencia(self.tipos, datos.get('tipo'), "Tipo de proyecto"),
+            },
+            'sistemas': [
+                self._referencia(self.sistemas, sistema, "Sistema de climatización")
+                for sistema in datos.get('sistemas') or ()
+            ],
+            'muros': [
+                {
+                    'ubicacion': _limpiar(Muro, 'ubicacion', muro.get('ubicacion')),
+                    'superficie': _limpiar(Muro, 'superficie', muro.get('superficie')),
+                    'material_aislante_id': self._referencia(self.materiales, muro.get('material'), "Material"),
+                }
+                for muro in registro.get('muros') or ()
+            ],
+            'resultado': None,
+        }
+        resultado = registro.get('resultado')
+        if resultado:
+            preparado['resultado'] = {
+                'calificacion': _limpiar(ResultadoCEV, 'calificacion', resultado.get('calificacion')),
+                'consumo_energia_anual': _limpiar(
+                    ResultadoCEV, 'consumo_energia_anual', resultado.get('consumo_energia_anual')
+                ),
+                'fecha_calificacion': _limpiar(
+                    ResultadoCEV, 'fecha_calificacion', resultado.get('fecha_calificacion')
+                ),
+            }
+        return preparado
+
+    def _guardar(self, pendientes, rechazos):
+        """Escribe un lote completo en una transacción; si falla, se rechaza el lote entero."""
+        pendientes = self._de_la_organizacion(pendientes, rechazos)
+        if not pendientes:
+            return
+        try:
+            with transaction.atomic():
+                conteo = self._escribir([preparado for preparado, _ in pendientes])
+        except DatabaseError as error:
+            for _, filas in pendientes:
+                self._rechazar(filas, f"Error de base de datos en el lote: {error}", rechazos)
+            return
+        invalidar_dashboard()
+        invalidar_filtros()
+        for clave, cantidad in conteo.items():
+            self.estadisticas[clave] += cantidad
+
+    def _de_la_organizacion(self, pendientes, rechazos):
+        """Rechaza los proyectos cuyo cliente pertenece a otra organización (o a ninguna)."""
+        organizacion = organizacion_actual()
+        if organizacion is None:
+            return pendientes
+        # _base_manager: el manager por defecto no ve los clientes ajenos.
+        ajenos = set(Cliente._base_manager.filter(
+            contacto__in={preparado['cliente']['contacto'] for preparado, _ in pendientes}
+        ).exclude(organizacion_id=organizacion).values_list('contacto', flat=True))
+        if not ajenos:
+            return pendientes
+        propios = []
+        for preparado, filas in pendientes:
+            contacto = preparado['cliente']['contacto']
+            if contacto in ajenos:
+                self._rechazar(filas, f"El contacto {contacto!r} es de otra organización.", rechazos)
+            else:
+                propios.append((preparado, filas))
+        return propios
+
+    def _escribir(self, registros):
+        clientes = {r['cliente']['contacto']: r['cliente']['nombre'] for r in registros}
+        renombrados = [
+            contacto
+            for contacto, nombre in Cliente.objects.filter(contacto__in=clientes).values_list('contacto', 'nombre')
+            if clientes[contacto] != nombre
+        ]
+        Cliente.objects.bulk_create(
+            [Cliente(contacto=contacto, nombre=nombre) for contacto, nombre in clientes.items()],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=['contacto'],
+            update_fields=['nombre'],
+        )
+        clientes_pk = dict(
+            Cliente.objects.filter(contacto__in=clientes).values_list('contacto', 'pk')
+        )
+
+        proyectos = Proyecto.objects.bulk_create(
+            [
+                Proyecto(cliente_id=clientes_pk[r['cliente']['contacto']], **r['proyecto'])
+                for r in registros
+            ],
+            batch_size=self.batch_size,
+        )
+
+        SistemasProyecto = Proyecto.sistemas.through
+        SistemasProyecto.objects.bulk_create(
+            [
+                SistemasProyecto(proyecto_id=proyecto.pk, sistemaclimatizacion_id=sistema_id)
+                for proyecto, r in zip(proyectos, registros)
+                for sistema_id in dict.fromkeys(r['sistemas'])
+            ],
+            batch_size=self.batch_size,
+        )
+        muros = Muro.objects.bulk_create(
+            [
+                Muro(proyecto_id=proyecto.pk, **muro)
+                for proyecto, r in zip(proyectos, registros)
+                for muro in r['muros']
+            ],
+            batch_size=self.batch_size,
+        )
+        resultados = ResultadoCEV.objects.bulk_create(
+            [
+                ResultadoCEV(proyecto_id=proyecto.pk, **r['resultado'])
+                for proyecto, r in zip(proyectos, registros)
+                if r['resultado']
+            ],
+            batch_size=self.batch_size,
+        )
+
+        # bulk_create no dispara señales: calificación almacenada, versión e
+        # índice de búsqueda se actualizan aquí (también los proyectos previos
+        # de los clientes que el upsert renombró).
+        nuevos = Proyecto.objects.filter(pk__in=[p.pk for p in proyectos])
+        nuevos.actualizar_calificacion()
+        de_renombrados = Proyecto.objects.filter(cliente__contacto__in=renombrados).exclude(pk__in=nuevos)
+        de_renombrados.tocar()
+        indexar_proyectos(nuevos | de_renombrados)
+
+        return {'proyectos': len(proyectos), 'muros': len(muros), 'resultados': len(resultados)}
+
+
+class EscritorRechazos:
+    """Escribe las filas rechazadas con su motivo, en el mismo formato de entrada."""
+
+    def __init__(self, archivo, formato):
+        self.archivo = archivo
+        self.formato = formato
+        self.csv = None
+
+    def __call__(self, filas, error):
+        if self.formato == 'csv':
+            if self.csv is None:
+                # DictReader guarda los valores sobrantes bajo la clave None.
+                columnas = [columna for columna in filas[0] if columna is not None]
+                self.csv = csv.DictWriter(self.archivo, fieldnames=columnas + ['error'], extrasaction='ignore')
+                self.csv.writeheader()
+            for fila in filas:
+                self.csv.writerow({**fila, 'error': error})
+        else:
+            for fila in filas:
+                self.archivo.write(json.dumps({**fila, 'error': error}, ensure_ascii=False, default=str) + '\n')
@@ -0,0 +1,106 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+
+from gestion.models import Proyecto
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara las vistas sync (WSGI, un hilo por petición concurrente) con las "
+        "async (ASGI, un event loop) bajo carga concurrente: peticiones/s y "
+        "latencias p50/p99. Las peticiones pasan por todo el stack de Django "
+        "(middleware, vistas, plantillas) sin servidor HTTP."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrencia', type=int, default=16, help="Peticiones simultáneas (por defecto 16).")
+        parser.add_argument('--peticiones', type=int, default=400, help="Peticiones por URL y modo (por defecto 400).")
+        parser.add_argument(
+            '--urls', nargs='+',
+            help="Rutas a medir (por defecto el dashboard, el listado y el detalle del último proyecto).",
+        )
+
+    def handle(self, *args, concurrencia, peticiones, urls, **options):
+        if concurrencia < 1 or peticiones < 1:
+            raise CommandError("--concurrencia y --peticiones deben ser al menos 1")
+        if not urls:
+            ultimo = Proyecto.objects.order_by('-pk').values_list('pk', flat=True).first()
+            urls = ['/', '/proyectos/'] + ([f'/proyectos/{ultimo}/'] if ultimo else [])
+
+        self.stdout.write(f"{peticiones} peticiones por URL, {concurrencia} concurrentes")
+        self.stdout.write(f"{'url':<24} {'modo':<6} {'pet/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        # Sin sesión el middleware de organizaciones responde 403. Los hilos usan
+        # otras conexiones, así que el usuario se guarda (no basta una
+        # transacción como en benchmark_cev) y se borra al terminar.
+        User.objects.filter(username='benchmark_asgi').delete()
+        usuario = User.objects.create_superuser('benchmark_asgi', 'benchmark@ejemplo.cl', None)
+        try:
+            sesion = Client()
+            sesion.force_login(usuario)
+            self.cookies = sesion.cookies
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for url in urls:
+                    with override_settings(ROOT_URLCONF='CEVProject.urls'):
+                        self.informar(url, 'wsgi', *self.medir_wsgi(url, concurrencia, peticiones))
+                    with override_settings(ROOT_URLCONF='CEVProject.urls_asgi'):
+                        self.informar(url, 'asgi', *asyncio.run(self.medir_asgi(url, concurrencia, peticiones)))
+        finally:
+            sesion.logout()
+            usuario.delete()
+
+    def informar(self, url, modo, segundos, latencias):
+        percentiles = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+        self.stdout.write(
+            f"{url:<24} {modo:<6} {len(latencias) / segundos:>8.0f} "
+            f"{percentiles[49] * 1000:>8.1f} {percentiles[98] * 1000:>8.1f}"
+        )
+
+    def medir_wsgi(self, url, concurrencia, peticiones):
+        def peticion(_):
+            cliente = Client()
+            cliente.cookies = self.cookies
+            inicio = time.perf_counter()
+            respuesta = cliente.get(url)
+            latencia = time.perf_counter() - inicio
+            if respuesta.status_code != 200:
+                raise CommandError(f"{url} respondió {respuesta.status_code}")
+            return latencia
+
+        def trabajador(cantidad):
+            try:
+                return [peticion(i) for i in range(cantidad)]
+            finally:
+                connections.close_all()
+
+        # Se reparte el total entre los hilos, como un servidor WSGI con N hilos.
+        partes = [peticiones // concurrencia + (i < peticiones % concurrencia) for i in range(concurrencia)]
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            latencias = [latencia for lote in pool.map(trabajador, partes) for latencia in lote]
+        return time.perf_counter() - inicio, latencias
+
+    async def medir_asgi(self, url, concurrencia, peticiones):
+        cliente = AsyncClient()
+        cliente.cookies = self.cookies
+        limite = asyncio.Semaphore(concurrencia)
+
+        async def peticion():
+            async with limite:
+                inicio = time.perf_counter()
+                respuesta = await cliente.get(url)
+                latencia = time.perf_counter() - inicio
+            if respuesta.status_code != 200:
+                raise CommandError(f"{url} respondió {respuesta.status_code}")
+            return latencia
+
+        inicio = time.perf_counter()
+        latencias = await asyncio.gather(*(peticion() for _ in range(peticiones)))
+        return time.perf_counter() - inicio, list(latencias)
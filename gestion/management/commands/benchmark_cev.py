@@ -0,0 +1,269 @@
+import importlib.util
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from gestion.dashboard import invalidar_dashboard
+from gestion.models import Cliente, Muro, Organizacion, Proyecto
+from gestion.paginacion import PaginadorKeyset
+from gestion.referencias import REFERENCIAS
+from gestion.views import ProyectoListView
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide tiempo, consultas SQL y memoria pico de las vistas principales, "
+        "los listados del admin y el cálculo de calificación sobre los datos "
+        "actuales (ver seed_cev). Escribe los resultados en JSON para comparar "
+        "entre commits y falla si algún escenario supera su presupuesto de "
+        "consultas (settings.CEV_BENCHMARK_PRESUPUESTOS o --presupuesto)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeticiones', type=int, default=5,
+            help="Mediciones de tiempo por escenario, tras una de calentamiento (por defecto 5).",
+        )
+        parser.add_argument('--salida', help="Archivo JSON donde guardar los resultados.")
+        parser.add_argument('--comparar', help="JSON de una corrida anterior para mostrar la diferencia de tiempos.")
+        parser.add_argument('--escenarios', nargs='+', help="Solo estos escenarios.")
+        parser.add_argument(
+            '--presupuesto', action='append', default=[], metavar='ESCENARIO=N',
+            help="Máximo de consultas de un escenario; reemplaza el de settings (se puede repetir).",
+        )
+
+    def handle(self, *args, repeticiones, salida, comparar, escenarios, presupuesto, **options):
+        if repeticiones < 1:
+            raise CommandError("--repeticiones debe ser al menos 1")
+        if not Proyecto.objects.exists():
+            raise CommandError("No hay proyectos; genera datos con manage.py seed_cev.")
+        presupuestos = {**settings.CEV_BENCHMARK_PRESUPUESTOS, **self.leer_presupuestos(presupuesto)}
+        anterior = self.leer_json(comparar)['escenarios'] if comparar else {}
+
+        resultados = {}
+        self.stdout.write(
+            f"{'escenario':<28} {'mediana ms':>10} {'mín ms':>8} {'consultas':>9} {'presup.':>7} {'memoria KB':>10}"
+        )
+        with tempfile.TemporaryDirectory() as cache_pdf, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ROOT_URLCONF='CEVProject.urls',
+            # Sin caché de PDF: cada descarga renderiza.
+            CEV_REPORTES_CACHE_DIR=Path(cache_pdf),
+            CEV_REPORTES_CACHE_MAX_BYTES=0,
+        ), transaction.atomic():
+            # El usuario y la sesión del admin se descartan al terminar.
+            cliente = Client()
+            cliente.force_login(User.objects.create_superuser('benchmark_cev', 'benchmark@ejemplo.cl', None))
+            miembro = self.miembro()
+            # Como en un proceso ya en marcha: tablas de referencia cargadas en
+            # memoria y las organizaciones de los usuarios en caché.
+            for modelo in REFERENCIAS.modelos:
+                REFERENCIAS.tabla(modelo)
+            for navegador in filter(None, (cliente, miembro)):
+                navegador.get(reverse('metricas'))
+            for nombre, funcion in self.escenarios(cliente, miembro):
+                if escenarios and nombre not in escenarios:
+                    continue
+                resultado = self.medir(funcion, repeticiones)
+                resultado['presupuesto'] = presupuestos.get(nombre)
+                resultados[nombre] = resultado
+                self.informar(nombre, resultado, anterior.get(nombre))
+            transaction.set_rollback(True)
+
+        informe = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'commit': self.commit(),
+            'entorno': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'base_de_datos': connection.vendor,
+            },
+            'datos': {
+                'clientes': Cliente.objects.count(),
+                'proyectos': Proyecto.objects.count(),
+                'muros': Muro.objects.count(),
+            },
+            'repeticiones': repeticiones,
+            'escenarios': resultados,
+        }
+        if salida:
+            Path(salida).write_text(json.dumps(informe, indent=2, ensure_ascii=False), encoding='utf-8')
+            self.stdout.write(f"Resultados guardados en {salida}")
+
+        excedidos = [
+            f"{nombre} ({resultado['consultas']} > {resultado['presupuesto']})"
+            for nombre, resultado in resultados.items()
+            if resultado['presupuesto'] is not None and resultado['consultas'] > resultado['presupuesto']
+        ]
+        if excedidos:
+            raise CommandError(f"Presupuesto de consultas excedido: {', '.join(excedidos)}")
+        self.stdout.write(self.style.SUCCESS(f"{len(resultados)} escenarios dentro del presupuesto."))
+
+    # ----------------------------------------
+    # ESCENARIOS
+    # ----------------------------------------
+
+    def miembro(self):
+        """Navegador de un miembro de la primera organización, o None si no hay organizaciones."""
+        organizacion = Organizacion.objects.order_by('pk').first()
+        if organizacion is None:
+            return None
+        # Staff para poder leer /metrics al calentar.
+        usuario = User.objects.create_user('benchmark_cev_miembro', is_staff=True)
+        organizacion.miembros.add(usuario)
+        miembro = Client()
+        miembro.force_login(usuario)
+        return miembro
+
+    def escenarios(self, cliente, miembro=None):
+        """Pares (nombre, función sin argumentos) en el orden en que se miden."""
+        total = Proyecto.objects.count()
+        proyecto = Proyecto.objects.order_by('-pk').first()
+        listado = reverse('proyecto-list')
+
+        def get(url, navegador=cliente):
+            def peticion():
+                respuesta = navegador.get(url)
+                if respuesta.status_code != 200:
+                    raise CommandError(f"{url} respondió {respuesta.status_code}")
+                # Consumir las respuestas en streaming para medir todo el trabajo.
+                if respuesta.streaming:
+                    b''.join(respuesta.streaming_content)
+            return peticion
+
+        def home_sin_cache():
+            invalidar_dashboard()
+            get(reverse('home'))()
+
+        def home_organizacion():
+            invalidar_dashboard()
+            get(reverse('home'), miembro)()
+
+        def calificacion_python():
+            Proyecto.objects.get(pk=proyecto.pk).calcular_calificacion_energetica()
+
+        def calificacion_sql():
+            for proyecto_calificado in Proyecto.objects.with_rating()[:100]:
+                proyecto_calificado.calcular_calificacion_energetica()
+
+        def calificacion_numpy():
+            # Los primeros 10000 proyectos, en un solo lote del motor NumPy.
+            from gestion.transmitancia import calificaciones
+            tope = Proyecto.objects.order_by('pk').values_list('pk', flat=True)[min(total, 10000) - 1]
+            for _ in calificaciones(Proyecto.objects.filter(pk__lte=tope), lote=10000):
+                pass
+
+        yield 'home', home_sin_cache
+        yield 'home_cache', get(reverse('home'))
+        yield 'proyecto_list', get(listado)
+        yield 'proyecto_list_profunda', get(f"{listado}?cursor={self.cursor_profundo(total)}")
+        yield 'proyecto_list_offset', get(f"{listado}?page={max(1, int(total / ProyectoListView.paginate_by * 0.9))}")
+        yield 'proyecto_detalle', get(reverse('proyecto-detalle', args=[proyecto.pk]))
+        if miembro is not None:
+            # Solo ve (y recorre) los proyectos de su organización.
+            yield 'home_organizacion', home_organizacion
+            yield 'proyecto_list_organizacion', get(listado, miembro)
+        if importlib.util.find_spec('reportlab'):
+            yield 'proyecto_pdf', get(reverse('proyecto-pdf', args=[proyecto.pk]))
+        for modelo in admin.site._registry:
+            if modelo._meta.app_label == 'gestion':
+                opciones = modelo._meta
+                yield f'admin_{opciones.model_name}', get(
+                    reverse(f'admin:{opciones.app_label}_{opciones.model_name}_changelist')
+                )
+        yield 'calificacion_python', calificacion_python
+        yield 'calificacion_sql_100', calificacion_sql
+        if importlib.util.find_spec('numpy') and total:
+            yield 'calificacion_numpy_10000', calificacion_numpy
+
+    def cursor_profundo(self, total):
+        """Token del listado por fecha que apunta al 90 % de la tabla."""
+        orden = ProyectoListView.ORDENES_KEYSET['fecha']
+        fila = Proyecto.objects.order_by('-fecha_inicio', '-id').values('fecha_inicio', 'id')[int(total * 0.9)]
+        return PaginadorKeyset(Proyecto.objects.all(), orden, ProyectoListView.paginate_by, 'fecha').token(fila, '>')
+
+    # ----------------------------------------
+    # MEDICIÓN
+    # ----------------------------------------
+
+    def medir(self, funcion, repeticiones):
+        # Calentamiento: consultas y memoria pico se miden aquí, fuera del cronómetro.
+        # Con DEBUG el registro de consultas tiene un máximo: se vacía antes de contar.
+        reset_queries()
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as consultas:
+            funcion()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        total_consultas = len(consultas)
+
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        return {
+            'segundos_mediana': round(statistics.median(tiempos), 6),
+            'segundos_min': round(min(tiempos), 6),
+            'consultas': total_consultas,
+            'memoria_pico_kb': round(pico / 1024, 1),
+        }
+
+    def informar(self, nombre, resultado, anterior=None):
+        presupuesto = resultado['presupuesto']
+        linea = (
+            f"{nombre:<28} {resultado['segundos_mediana'] * 1000:>10.1f} {resultado['segundos_min'] * 1000:>8.1f} "
+            f"{resultado['consultas']:>9} {'-' if presupuesto is None else presupuesto:>7} "
+            f"{resultado['memoria_pico_kb']:>10.0f}"
+        )
+        if anterior and anterior.get('segundos_mediana'):
+            linea += f" {resultado['segundos_mediana'] / anterior['segundos_mediana'] - 1:>+8.0%}"
+        if presupuesto is not None and resultado['consultas'] > presupuesto:
+            linea = self.style.ERROR(linea)
+        self.stdout.write(linea)
+
+    # ----------------------------------------
+    # AUXILIARES
+    # ----------------------------------------
+
+    def leer_presupuestos(self, valores):
+        presupuestos = {}
+        for valor in valores:
+            nombre, _, maximo = valor.partition('=')
+            try:
+                presupuestos[nombre] = int(maximo)
+            except ValueError:
+                raise CommandError(f"--presupuesto espera ESCENARIO=N, no {valor!r}")
+        return presupuestos
+
+    def leer_json(self, ruta):
+        try:
+            return json.loads(Path(ruta).read_text(encoding='utf-8'))
+        except (OSError, ValueError) as error:
+            raise CommandError(f"No se pudo leer {ruta}: {error}")
+
+    def commit(self):
+        """Commit de git actual, si el proyecto está en un repositorio."""
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,166 @@
+import multiprocessing
+import queue
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, connections, transaction
+from django.db.models import F
+from django.db.utils import load_backend
+
+from gestion.models import Muro, Proyecto
+
+PERFILES = ('desarrollo', 'produccion')
+
+
+def trabajador(ajustes, pks, segundos, fraccion_escrituras, semilla, barrera, cola):
+    """
+    Un proceso trabajador (como los de gunicorn, creado con fork): repite
+    ciclos de petición (abre o reutiliza la conexión, lee o escribe, cierra
+    según CONN_MAX_AGE) durante ``segundos``.
+    """
+    # La conexión heredada del padre no se usa ni se cierra aquí.
+    connections['default'] = load_backend(ajustes['ENGINE']).DatabaseWrapper(ajustes, 'default')
+    azar = random.Random(semilla)
+    totales = {'lecturas': 0, 'escrituras': 0, 'errores': 0}
+    latencias = []
+    barrera.wait()
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        close_old_connections()  # request_started
+        pk = azar.choice(pks)
+        inicio = time.perf_counter()
+        try:
+            if azar.random() < fraccion_escrituras:
+                with transaction.atomic():
+                    Proyecto.objects.filter(pk=pk).update(version=F('version') + 1)
+                totales['escrituras'] += 1
+            else:
+                # Lo que lee el detalle: el proyecto y sus muros.
+                Proyecto.objects.get(pk=pk)
+                list(Muro.objects.filter(proyecto_id=pk))
+                totales['lecturas'] += 1
+        except OperationalError:
+            # "database is locked": la petición habría respondido 500.
+            totales['errores'] += 1
+        latencias.append(time.perf_counter() - inicio)
+        close_old_connections()  # request_finished
+    connections['default'].close()
+    cola.put((totales, latencias))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el perfil SQLite de desarrollo (valores por defecto) con el de "
+        "producción (WAL, PRAGMA y conexiones persistentes; ver "
+        "settings.CEV_SQLITE_PRODUCCION): varios procesos trabajadores, como los "
+        "de gunicorn, leen y escriben a la vez sobre una copia de la base de "
+        "datos. Informa lecturas y escrituras por segundo, errores por bloqueo y "
+        "latencias p50/p99."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trabajadores', type=int, default=4, help="Procesos concurrentes (por defecto 4).")
+        parser.add_argument('--segundos', type=float, default=5, help="Duración de cada medición (por defecto 5).")
+        parser.add_argument(
+            '--escrituras', type=float, default=0.2,
+            help="Fracción de peticiones que escriben (por defecto 0.2).",
+        )
+        parser.add_argument('--perfiles', nargs='+', choices=PERFILES, default=list(PERFILES))
+
+    def handle(self, *args, trabajadores, segundos, escrituras, perfiles, **options):
+        if trabajadores < 1 or segundos <= 0:
+            raise CommandError("--trabajadores y --segundos deben ser positivos")
+        if not 0 <= escrituras <= 1:
+            raise CommandError("--escrituras debe estar entre 0 y 1")
+        if connection.vendor != 'sqlite':
+            raise CommandError("Este benchmark es para SQLite.")
+        if connection.in_atomic_block:
+            # La copia con la API de backup esperaría para siempre a la transacción abierta.
+            raise CommandError("benchmark_sqlite no puede ejecutarse dentro de una transacción.")
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError("Los trabajadores se crean con fork (Linux o macOS).")
+        pks = list(Proyecto.objects.values_list('pk', flat=True)[:10000])
+        if not pks:
+            raise CommandError("No hay proyectos; genera datos con manage.py seed_cev.")
+
+        self.stdout.write(
+            f"{trabajadores} trabajadores, {segundos:g} s por perfil, {escrituras:.0%} escrituras"
+        )
+        self.stdout.write(
+            f"{'perfil':<12} {'lect/s':>8} {'escr/s':>8} {'errores':>8} {'p50 ms':>8} {'p99 ms':>8}"
+        )
+        resultados = {}
+        with tempfile.TemporaryDirectory() as directorio:
+            for perfil in perfiles:
+                ruta = Path(directorio) / f'{perfil}.sqlite3'
+                self.copiar_base(ruta)
+                resultados[perfil] = self.medir(
+                    self.ajustes(perfil, ruta), pks, trabajadores, segundos, escrituras
+                )
+                self.informar(perfil, resultados[perfil])
+        if len(resultados) == 2:
+            antes, despues = (resultados[perfil]['peticiones_por_segundo'] for perfil in PERFILES)
+            self.stdout.write(self.style.SUCCESS(f"produccion: {despues / antes:.1f}× peticiones por segundo"))
+
+    def copiar_base(self, ruta):
+        """Copia consistente de la base actual (API de backup de SQLite), en modo rollback journal."""
+        connection.ensure_connection()
+        with closing(sqlite3.connect(ruta)) as destino:
+            connection.connection.backup(destino)
+            destino.execute('PRAGMA journal_mode=DELETE')
+
+    def ajustes(self, perfil, ruta):
+        ajustes = {**connection.settings_dict, 'NAME': str(ruta), 'CONN_MAX_AGE': 0, 'OPTIONS': {}}
+        if perfil == 'produccion':
+            ajustes.update(settings.CEV_SQLITE_PRODUCCION)
+            # El valor de settings puede ser 0 con las vistas async; aquí se miden procesos sync.
+            ajustes['CONN_MAX_AGE'] = ajustes['CONN_MAX_AGE'] or 600
+        return ajustes
+
+    def medir(self, ajustes, pks, trabajadores, segundos, escrituras):
+        contexto = multiprocessing.get_context('fork')
+        barrera = contexto.Barrier(trabajadores, timeout=60)
+        cola = contexto.Queue()
+        procesos = [
+            contexto.Process(
+                target=trabajador, args=(ajustes, pks, segundos, escrituras, semilla, barrera, cola)
+            )
+            for semilla in range(trabajadores)
+        ]
+        for proceso in procesos:
+            proceso.start()
+        # Leer la cola antes de join: un proceso no termina con datos sin consumir.
+        try:
+            partes = [cola.get(timeout=segundos + 60) for _ in procesos]
+        except queue.Empty:
+            for proceso in procesos:
+                proceso.terminate()
+            raise CommandError("Un trabajador terminó sin informar resultados.")
+        for proceso in procesos:
+            proceso.join()
+
+        totales = {clave: sum(parte[0][clave] for parte in partes) for clave in partes[0][0]}
+        latencias = [latencia for _, lista in partes for latencia in lista]
+        percentiles = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+        return {
+            'lecturas_por_segundo': totales['lecturas'] / segundos,
+            'escrituras_por_segundo': totales['escrituras'] / segundos,
+            'errores': totales['errores'],
+            'peticiones_por_segundo': len(latencias) / segundos,
+            'p50_ms': percentiles[49] * 1000,
+            'p99_ms': percentiles[98] * 1000,
+        }
+
+    def informar(self, perfil, resultado):
+        self.stdout.write(
+            f"{perfil:<12} {resultado['lecturas_por_segundo']:>8.0f} "
+            f"{resultado['escrituras_por_segundo']:>8.0f} {resultado['errores']:>8} "
+            f"{resultado['p50_ms']:>8.2f} {resultado['p99_ms']:>8.2f}"
+        )
@@ -0,0 +1,79 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.certificacion import CertificadorCEV
+from gestion.models import Cliente, Proyecto
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea o actualiza por lotes el ResultadoCEV de los proyectos a partir de "
+        "su calificación calculada (bulk_create con upsert sobre el proyecto). "
+        "Con --simular solo informa qué resultados cambiarían."
+    )
+
+    def add_arguments(self, parser):
+        alcance = parser.add_mutually_exclusive_group(required=True)
+        alcance.add_argument(
+            '--pendientes', '--pending', action='store_true',
+            help="Solo los proyectos sin ResultadoCEV.",
+        )
+        alcance.add_argument(
+            '--todos', '--all', action='store_true',
+            help="Todos los proyectos (re-certifica los que cambiaron).",
+        )
+        alcance.add_argument('--cliente', '--client', type=int, help="Todos los proyectos de este cliente.")
+        parser.add_argument(
+            '--simular', '--dry-run', action='store_true',
+            help="No escribe nada; lista los resultados existentes que cambiarían.",
+        )
+        parser.add_argument(
+            '--lote', type=int, default=2000,
+            help="Proyectos por lote/transacción (por defecto 2000).",
+        )
+        parser.add_argument(
+            '--fecha', type=date.fromisoformat,
+            help="Fecha de calificación de los resultados escritos (AAAA-MM-DD, por defecto hoy).",
+        )
+
+    def handle(self, *args, pendientes, todos, cliente, simular, lote, fecha, **options):
+        if lote < 1:
+            raise CommandError("--lote debe ser al menos 1.")
+        proyectos = Proyecto.objects.all()
+        if pendientes:
+            proyectos = proyectos.filter(resultados__isnull=True)
+        elif cliente is not None:
+            if not Cliente.objects.filter(pk=cliente).exists():
+                raise CommandError(f"No existe el cliente {cliente}.")
+            proyectos = proyectos.filter(cliente_id=cliente)
+
+        certificador = CertificadorCEV(lote=lote, simular=simular, fecha=fecha)
+        verbosidad = options['verbosity']
+
+        def cambios(proyecto_id, anterior, nuevo):
+            # En la simulación siempre se listan los resultados que cambiarían;
+            # los nuevos, solo con -v 2.
+            if anterior is None:
+                if verbosidad > 1:
+                    self.stdout.write(f"  #{proyecto_id}: nuevo {nuevo[0]} ({nuevo[1]} kWh/m²)")
+            elif simular or verbosidad > 1:
+                self.stdout.write(
+                    f"  #{proyecto_id}: {anterior[0]} ({anterior[1]} kWh/m²) -> {nuevo[0]} ({nuevo[1]} kWh/m²)"
+                )
+
+        def progreso(estadisticas):
+            if verbosidad > 1:
+                self.stdout.write(
+                    f"{estadisticas['proyectos']} proyectos ({certificador.proyectos_por_segundo:.0f}/s)"
+                )
+
+        estadisticas = certificador.certificar(proyectos, cambios=cambios, progreso=progreso)
+
+        verbo = ("se crearían", "se actualizarían") if simular else ("creados", "actualizados")
+        self.stdout.write(self.style.SUCCESS(
+            f"{estadisticas['proyectos']} proyectos revisados en {estadisticas['segundos']:.1f} s "
+            f"({certificador.proyectos_por_segundo:.0f}/s): {estadisticas['nuevos']} resultados {verbo[0]}, "
+            f"{estadisticas['actualizados']} {verbo[1]}, {estadisticas['sin_cambios']} sin cambios, "
+            f"{estadisticas['sin_datos']} sin muros para calificar."
+        ))
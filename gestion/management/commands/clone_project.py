@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.clonacion import clonar_proyecto
+from gestion.models import Cliente, Proyecto
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea N copias de un proyecto con sus muros (y capas) y sistemas de "
+        "climatización, opcionalmente para otro cliente. Las copias se insertan "
+        "por lotes: el número de consultas no depende de los muros."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('proyecto', type=int, help="Id del proyecto a clonar.")
+        parser.add_argument(
+            '--copias', '--copies', type=int, default=1,
+            help="Número de copias (por defecto 1).",
+        )
+        parser.add_argument(
+            '--cliente', '--client', type=int,
+            help="Cliente de las copias (por defecto el del original).",
+        )
+        parser.add_argument('--nombre', '--name', help="Nombre base de las copias (por defecto el del original).")
+
+    def handle(self, *args, proyecto, copias, cliente, nombre, **options):
+        if copias < 1:
+            raise CommandError("--copias debe ser al menos 1.")
+        try:
+            original = Proyecto.objects.get(pk=proyecto)
+        except Proyecto.DoesNotExist:
+            raise CommandError(f"No existe el proyecto {proyecto}.")
+        if cliente is not None and not Cliente.objects.filter(pk=cliente).exists():
+            raise CommandError(f"No existe el cliente {cliente}.")
+
+        inicio = time.perf_counter()
+        nuevos = clonar_proyecto(original, copias=copias, cliente=cliente, nombre=nombre)
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(nuevos)} copias de «{original.nombre}» ({original.muros.count()} muros cada una) "
+            f"creadas en {segundos:.1f} s: #{nuevos[0].pk}–#{nuevos[-1].pk}."
+        ))
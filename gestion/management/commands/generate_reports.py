@@ -0,0 +1,95 @@
+import os
+import time
+import zipfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.models import Proyecto
+from gestion.reportes import datos_reportes, generar_reportes
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera los reportes PDF de muchos proyectos en paralelo (un proceso por "
+        "núcleo) y los guarda en un directorio o en un único ZIP."
+    )
+
+    def add_arguments(self, parser):
+        destino = parser.add_mutually_exclusive_group()
+        destino.add_argument('--salida', help="Directorio donde escribir los PDF.")
+        destino.add_argument('--zip', dest='archivo_zip', help="Archivo ZIP donde guardar todos los PDF.")
+        parser.add_argument('--ids', type=int, nargs='+', help="Solo estos proyectos.")
+        parser.add_argument('--cliente', type=int, help="Solo los proyectos de este cliente.")
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Procesos de renderizado (por defecto, uno por núcleo).",
+        )
+        parser.add_argument(
+            '--benchmark', action='store_true',
+            help="Renderiza sin guardar con 1, 2, 4… hasta --workers procesos y compara reportes/s.",
+        )
+
+    def handle(self, *args, salida, archivo_zip, ids, cliente, workers, benchmark, **options):
+        try:
+            import reportlab  # noqa: F401
+        except ImportError:
+            raise CommandError("Instala reportlab: pip install reportlab")
+        if workers < 1:
+            raise CommandError("--workers debe ser al menos 1")
+
+        proyectos = Proyecto.objects.all()
+        if ids:
+            proyectos = proyectos.filter(pk__in=ids)
+        if cliente:
+            proyectos = proyectos.filter(cliente_id=cliente)
+
+        if benchmark:
+            return self.benchmark(proyectos, workers)
+        if not salida and not archivo_zip:
+            raise CommandError("Indica --salida DIRECTORIO o --zip ARCHIVO.")
+
+        def progreso(generados, segundos):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{generados} reportes ({generados / max(segundos, 1e-6):.0f}/s)")
+
+        if archivo_zip:
+            with zipfile.ZipFile(archivo_zip, 'w', compression=zipfile.ZIP_DEFLATED) as archivo:
+                generados, segundos = self.medir(
+                    datos_reportes(proyectos), workers, archivo.writestr, progreso
+                )
+            destino = archivo_zip
+        else:
+            directorio = Path(salida)
+            directorio.mkdir(parents=True, exist_ok=True)
+            generados, segundos = self.medir(
+                datos_reportes(proyectos), workers,
+                lambda nombre, pdf: (directorio / nombre).write_bytes(pdf), progreso,
+            )
+            destino = directorio
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{generados} reportes en {destino} ({segundos:.1f} s, "
+            f"{generados / segundos if segundos else 0:.0f} reportes/s, {workers} procesos)."
+        ))
+
+    def medir(self, datos, workers, guardar, progreso=None):
+        inicio = time.monotonic()
+        generados = generar_reportes(datos, guardar, workers=workers, progreso=progreso)
+        return generados, time.monotonic() - inicio
+
+    def benchmark(self, proyectos, workers):
+        # Los datos se leen una vez para medir solo el renderizado.
+        datos = list(datos_reportes(proyectos))
+        if not datos:
+            raise CommandError("No hay proyectos para el benchmark.")
+
+        niveles = sorted({min(2 ** i, workers) for i in range(workers.bit_length() + 1)})
+        self.stdout.write(f"{len(datos)} reportes, {os.cpu_count()} núcleos disponibles")
+        self.stdout.write(f"{'procesos':>8} {'segundos':>9} {'reportes/s':>11} {'aceleración':>12}")
+        base = None
+        for nivel in niveles:
+            generados, segundos = self.medir(datos, nivel, lambda nombre, pdf: None)
+            velocidad = generados / segundos
+            base = base or velocidad
+            self.stdout.write(f"{nivel:>8} {segundos:>9.2f} {velocidad:>11.0f} {velocidad / base:>11.2f}x")
@@ -0,0 +1,82 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.importacion import COLUMNAS_CSV, EscritorRechazos, ImportadorCEV
+from gestion.models import Organizacion
+from gestion.organizaciones import en_organizacion
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa en streaming clientes, proyectos, muros y resultados CEV desde "
+        "un archivo CSV o JSONL, por lotes transaccionales con bulk_create. "
+        f"Columnas CSV: {', '.join(COLUMNAS_CSV)}."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo .csv o .jsonl a importar.")
+        parser.add_argument(
+            '--formato', choices=['csv', 'jsonl'],
+            help="Formato del archivo (por defecto se deduce de la extensión).",
+        )
+        parser.add_argument(
+            '--lote', type=int, default=500,
+            help="Proyectos por transacción (por defecto 500).",
+        )
+        parser.add_argument(
+            '--errores',
+            help="Archivo donde guardar las filas rechazadas (por defecto <archivo>.errores.<ext>).",
+        )
+        parser.add_argument(
+            '--organizacion', metavar='SLUG',
+            help="Importa dentro de esta organización (por defecto, sin organización).",
+        )
+
+    def handle(self, *args, organizacion, **options):
+        if organizacion is not None:
+            try:
+                organizacion = Organizacion.objects.get(slug=organizacion)
+            except Organizacion.DoesNotExist:
+                raise CommandError(f"No existe la organización {organizacion!r}")
+        with en_organizacion(organizacion):
+            self.importar(**options)
+
+    def importar(self, archivo, formato, lote, errores, **options):
+        ruta = Path(archivo)
+        if not ruta.exists():
+            raise CommandError(f"No existe el archivo {ruta}")
+        formato = formato or ('jsonl' if ruta.suffix.lower() in ('.jsonl', '.ndjson') else 'csv')
+        ruta_errores = Path(errores) if errores else ruta.with_name(f"{ruta.stem}.errores.{formato}")
+
+        importador = ImportadorCEV(lote=lote)
+
+        def progreso(estadisticas):
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f"{estadisticas['filas']} filas, {estadisticas['proyectos']} proyectos "
+                    f"({importador.filas_por_segundo:.0f} filas/s)"
+                )
+
+        with open(ruta, newline='', encoding='utf-8-sig') as entrada, \
+                open(ruta_errores, 'w', newline='', encoding='utf-8') as salida_errores:
+            try:
+                estadisticas = importador.importar(
+                    entrada, formato,
+                    rechazos=EscritorRechazos(salida_errores, formato),
+                    progreso=progreso,
+                )
+            except ValueError as error:
+                raise CommandError(str(error))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{estadisticas['proyectos']} proyectos, {estadisticas['muros']} muros y "
+            f"{estadisticas['resultados']} resultados importados desde {estadisticas['filas']} filas "
+            f"en {estadisticas['segundos']:.1f} s ({importador.filas_por_segundo:.0f} filas/s)."
+        ))
+        if estadisticas['rechazados']:
+            self.stdout.write(self.style.WARNING(
+                f"{estadisticas['rechazados']} proyectos rechazados; detalle en {ruta_errores}"
+            ))
+        else:
+            ruta_errores.unlink()
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from gestion.dashboard import invalidar_dashboard
+from gestion.models import Muro, Proyecto
+from gestion.transmitancia import actualizar_transmitancias
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye por lotes las columnas de calificación estimada almacenadas "
+        "en Proyecto, o con --verificar solo informa las que están desactualizadas. "
+        "Con --transmitancias recalcula antes la U de todos los muros con capas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=2000,
+            help="Cantidad de proyectos por lote/transacción (por defecto 2000).",
+        )
+        parser.add_argument(
+            '--verificar', action='store_true',
+            help="No modifica nada; falla si hay proyectos desactualizados.",
+        )
+        parser.add_argument(
+            '--transmitancias', action='store_true',
+            help="Recalcula primero la transmitancia U de los muros (con NumPy si está instalado).",
+        )
+
+    def handle(self, *args, lote, verificar, transmitancias, **options):
+        if transmitancias and not verificar:
+            self.recalcular_transmitancias(options['verbosity'])
+        procesados = 0
+        desactualizados = 0
+
+        for pks in self.lotes(lote):
+            proyectos = Proyecto.objects.filter(pk__in=pks)
+            if verificar:
+                erroneos = list(proyectos.con_calificacion_desactualizada().values_list('pk', flat=True))
+                desactualizados += len(erroneos)
+                if erroneos and options['verbosity'] > 1:
+                    self.stdout.write(f"Desactualizados: {erroneos}")
+            else:
+                with transaction.atomic():
+                    proyectos.actualizar_calificacion()
+            procesados += len(pks)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{procesados} proyectos procesados...")
+
+        if verificar:
+            if desactualizados:
+                raise CommandError(
+                    f"{desactualizados} de {procesados} proyectos tienen la calificación desactualizada."
+                )
+            self.stdout.write(self.style.SUCCESS(f"{procesados} proyectos verificados, todos al día."))
+        else:
+            invalidar_dashboard()
+            self.stdout.write(self.style.SUCCESS(f"{procesados} proyectos recalculados."))
+
+    def recalcular_transmitancias(self, verbosidad):
+        """U de todos los muros: por lotes con NumPy, o una sola UPDATE SQL sin él."""
+        try:
+            proyectos = actualizar_transmitancias()
+        except ImportError:
+            if verbosidad > 1:
+                self.stdout.write("NumPy no está instalado: se recalculan las transmitancias con SQL.")
+            with transaction.atomic():
+                Muro.objects.all().actualizar_transmitancia()
+        else:
+            if verbosidad > 0:
+                self.stdout.write(f"Transmitancias recalculadas: {len(proyectos)} proyectos con muros modificados.")
+
+    def lotes(self, tamano):
+        """Recorre los pk de Proyecto por rangos (keyset) sin cargar la tabla completa."""
+        ultimo = 0
+        while True:
+            pks = list(
+                Proyecto.objects.filter(pk__gt=ultimo)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:tamano]
+            )
+            if not pks:
+                return
+            yield pks
+            ultimo = pks[-1]
@@ -0,0 +1,86 @@
+import os
+import socket
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from gestion.tareas import procesar_siguiente, purgar_tareas, recuperar_abandonadas
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta las tareas en segundo plano encoladas en la base de datos (PDF, "
+        "exportaciones, importaciones, certificación…) con N hilos trabajadores. "
+        "Se pueden lanzar varios procesos a la vez: cada tarea se reclama una sola vez."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrencia', '--concurrency', type=int, default=1,
+            help="Hilos trabajadores en este proceso (por defecto 1).",
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help="Segundos de espera cuando la cola está vacía (por defecto 2).",
+        )
+        parser.add_argument(
+            '--una-vez', '--once', action='store_true',
+            help="Procesa hasta vaciar la cola y termina (útil en cron o pruebas).",
+        )
+
+    def handle(self, *args, concurrencia, intervalo, una_vez, **options):
+        if concurrencia < 1:
+            raise CommandError("--concurrencia debe ser al menos 1.")
+        recuperadas = recuperar_abandonadas()
+        purgadas = purgar_tareas()
+        if options['verbosity'] > 1 and (recuperadas or purgadas):
+            self.stdout.write(f"{recuperadas} tareas abandonadas recuperadas, {purgadas} tareas viejas purgadas.")
+
+        detener = threading.Event()
+        procesadas = [0] * concurrencia
+        prefijo = f"{socket.gethostname()}:{os.getpid()}"
+
+        def trabajar(numero):
+            trabajador = f"{prefijo}:{numero}"
+            while not detener.is_set():
+                if procesar_siguiente(trabajador):
+                    procesadas[numero] += 1
+                    continue
+                if una_vez:
+                    return
+                recuperar_abandonadas()
+                detener.wait(intervalo)
+
+        def trabajar_en_hilo(numero):
+            try:
+                trabajar(numero)
+            finally:
+                # Cada hilo abre su propia conexión a la base de datos.
+                connections.close_all()
+
+        if options['verbosity'] > 0 and not una_vez:
+            self.stdout.write(f"{concurrencia} trabajadores esperando tareas (Ctrl+C para terminar)...")
+        hilos = []
+        try:
+            if concurrencia == 1:
+                # Un solo trabajador: en el hilo principal, sin hilos extra.
+                trabajar(0)
+            else:
+                hilos = [
+                    threading.Thread(target=trabajar_en_hilo, args=(numero,), daemon=True)
+                    for numero in range(concurrencia)
+                ]
+                for hilo in hilos:
+                    hilo.start()
+                for hilo in hilos:
+                    while hilo.is_alive():
+                        hilo.join(0.5)
+        except KeyboardInterrupt:
+            # Se termina la tarea en curso de cada hilo antes de salir.
+            self.stdout.write("Deteniendo trabajadores...")
+            detener.set()
+            for hilo in hilos:
+                hilo.join()
+
+        self.stdout.write(self.style.SUCCESS(f"{sum(procesadas)} tareas procesadas."))
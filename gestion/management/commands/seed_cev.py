@@ -0,0 +1,199 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from gestion.busqueda import indexar_proyectos
+from gestion.dashboard import invalidar_dashboard
+from gestion.fragmentos import invalidar_filtros
+from gestion.models import (
+    CONSUMOS_ESTIMADOS,
+    Cliente,
+    Material,
+    Muro,
+    Organizacion,
+    Proyecto,
+    ResultadoCEV,
+    SistemaClimatizacion,
+    TipoProyecto,
+)
+
+# Datos de referencia que se crean si no existen (se buscan por nombre).
+MATERIALES = (
+    ('Poliestireno expandido', '0.036'),
+    ('Lana de vidrio', '0.040'),
+    ('Poliuretano proyectado', '0.028'),
+    ('Ladrillo hueco', '0.490'),
+    ('Hormigón armado', '1.630'),
+    ('Bloque de cemento', '1.100'),
+    ('Madera de pino', '0.130'),
+    ('Adobe', '0.900'),
+    ('Acero sin aislación', '2.500'),
+)
+TIPOS = ('Casa', 'Departamento', 'Oficina', 'Local comercial', 'Edificio')
+SISTEMAS = (
+    ('Bomba de calor aire-agua', '3.50'),
+    ('Caldera a gas', '0.92'),
+    ('Estufa a pellet', '0.85'),
+    ('Aire acondicionado split', '3.10'),
+    ('Calefacción eléctrica', '1.00'),
+)
+
+UBICACIONES = ('Norte', 'Sur', 'Oriente', 'Poniente', 'Techo', 'Piso')
+NOMBRES = ('Casa', 'Vivienda', 'Edificio', 'Condominio', 'Oficina', 'Local', 'Cabaña', 'Departamento')
+APELLIDOS = ('Los Robles', 'El Bosque', 'Las Lomas', 'Del Mar', 'San Pedro', 'La Florida', 'Vista Cordillera')
+CIUDADES = ('Santiago', 'Valparaíso', 'Concepción', 'Temuco', 'Puerto Montt', 'La Serena', 'Antofagasta')
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sintéticos deterministas (misma --semilla, mismos datos) "
+        "para pruebas de carga: clientes, proyectos, muros, sistemas y resultados, "
+        "insertados por lotes con bulk_create. Con --organizaciones los clientes "
+        "(y sus proyectos) se reparten entre organizaciones nuevas; materiales y "
+        "sistemas quedan en el catálogo común."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', '--clients', type=int, default=100, help="Clientes a crear (por defecto 100).")
+        parser.add_argument('--proyectos', '--projects', type=int, default=1000, help="Proyectos a crear (por defecto 1000).")
+        parser.add_argument(
+            '--muros-por-proyecto', '--walls-per-project', dest='muros', type=int, default=6,
+            help="Muros por proyecto (por defecto 6).",
+        )
+        parser.add_argument('--semilla', '--seed', type=int, default=1, help="Semilla del generador (por defecto 1).")
+        parser.add_argument(
+            '--lote', type=int, default=1000,
+            help="Proyectos por lote/transacción (por defecto 1000).",
+        )
+        parser.add_argument(
+            '--calificados', type=float, default=0.4,
+            help="Fracción de proyectos con ResultadoCEV (por defecto 0.4).",
+        )
+        parser.add_argument(
+            '--organizaciones', '--tenants', type=int, default=0,
+            help="Organizaciones entre las que se reparten los clientes (por defecto 0: sin organización).",
+        )
+
+    def handle(self, *args, clientes, proyectos, muros, semilla, lote, calificados, organizaciones, **options):
+        if clientes < 1 or proyectos < 0 or muros < 0 or lote < 1 or organizaciones < 0:
+            raise CommandError(
+                "--clientes y --lote deben ser al menos 1; --proyectos, --muros-por-proyecto "
+                "y --organizaciones, 0 o más."
+            )
+        if not 0 <= calificados <= 1:
+            raise CommandError("--calificados debe estar entre 0 y 1.")
+        prefijo = f"semilla{semilla}-"
+        if Cliente.objects.filter(contacto__startswith=prefijo).exists():
+            raise CommandError(f"Ya hay datos de la semilla {semilla}; usa otra --semilla.")
+
+        azar = random.Random(semilla)
+        inicio = time.monotonic()
+        with transaction.atomic():
+            materiales, tipos, sistemas = self.referencias()
+            ids_organizaciones = self.crear_organizaciones(organizaciones, prefijo, semilla)
+            ids_clientes = self.crear_clientes(azar, clientes, prefijo, ids_organizaciones)
+
+        creados = 0
+        while creados < proyectos:
+            cantidad = min(lote, proyectos - creados)
+            with transaction.atomic():
+                self.crear_lote(azar, cantidad, ids_clientes, tipos, materiales, sistemas, muros, calificados)
+            creados += cantidad
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{creados} proyectos creados...")
+
+        invalidar_dashboard()
+        invalidar_filtros()
+        segundos = time.monotonic() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{clientes} clientes, {proyectos} proyectos y {proyectos * muros} muros "
+            f"creados en {segundos:.1f} s (semilla {semilla}"
+            f"{f', {organizaciones} organizaciones' if organizaciones else ''})."
+        ))
+
+    def referencias(self):
+        """Materiales, tipos y sistemas de referencia (se reutilizan los existentes)."""
+        materiales = [
+            Material.objects.get_or_create(nombre=nombre, defaults={'conductividad': Decimal(conductividad)})[0]
+            for nombre, conductividad in MATERIALES
+        ]
+        tipos = [TipoProyecto.objects.get_or_create(nombre=nombre)[0] for nombre in TIPOS]
+        sistemas = [
+            SistemaClimatizacion.objects.get_or_create(tipo=tipo, defaults={'eficiencia_nominal': Decimal(eficiencia)})[0]
+            for tipo, eficiencia in SISTEMAS
+        ]
+        return [m.pk for m in materiales], [t.pk for t in tipos], [s.pk for s in sistemas]
+
+    def crear_organizaciones(self, cantidad, prefijo, semilla):
+        nuevas = Organizacion.objects.bulk_create([
+            Organizacion(nombre=f"Organización {i + 1} (semilla {semilla})", slug=f"{prefijo}org{i + 1}")
+            for i in range(cantidad)
+        ])
+        return [organizacion.pk for organizacion in nuevas]
+
+    def crear_clientes(self, azar, cantidad, prefijo, organizaciones):
+        """Crea los clientes (repartidos por turno entre ``organizaciones``); devuelve ``{pk: organizacion_id}``."""
+        nuevos = Cliente.objects.bulk_create([
+            Cliente(
+                nombre=f"{azar.choice(NOMBRES[:3])} {azar.choice(APELLIDOS)} {i + 1}",
+                contacto=f"{prefijo}cliente{i + 1}@ejemplo.cl",
+                organizacion_id=organizaciones[i % len(organizaciones)] if organizaciones else None,
+            )
+            for i in range(cantidad)
+        ], batch_size=1000)
+        return {cliente.pk: cliente.organizacion_id for cliente in nuevos}
+
+    def crear_lote(self, azar, cantidad, ids_clientes, tipos, materiales, sistemas, muros, calificados):
+        hoy = date.today()
+        pks_clientes = list(ids_clientes)
+        nuevos = Proyecto.objects.bulk_create([
+            Proyecto(
+                cliente_id=cliente,
+                organizacion_id=ids_clientes[cliente],
+                tipo_id=azar.choice(tipos),
+                nombre=f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)} {azar.randint(1, 9999)}",
+                descripcion=f"Proyecto en {azar.choice(CIUDADES)}, {azar.randint(40, 400)} m² construidos.",
+                fecha_inicio=hoy - timedelta(days=azar.randint(0, 5 * 365)),
+            )
+            for cliente in (azar.choice(pks_clientes) for _ in range(cantidad))
+        ])
+        ids = [proyecto.pk for proyecto in nuevos]
+
+        Muro.objects.bulk_create([
+            Muro(
+                proyecto_id=pk,
+                material_aislante_id=azar.choice(materiales),
+                ubicacion=UBICACIONES[i % len(UBICACIONES)],
+                superficie=Decimal(azar.randint(500, 9999)) / 100,
+            )
+            for pk in ids
+            for i in range(muros)
+        ], batch_size=2000)
+
+        Proyecto.sistemas.through.objects.bulk_create([
+            Proyecto.sistemas.through(proyecto_id=pk, sistemaclimatizacion_id=sistema)
+            for pk in ids
+            for sistema in azar.sample(sistemas, azar.randint(0, 2))
+        ], batch_size=2000)
+
+        # bulk_create no dispara señales: calificación e índice de búsqueda por lote.
+        lote = Proyecto.objects.filter(pk__in=ids)
+        lote.actualizar_calificacion()
+        indexar_proyectos(lote)
+
+        calificaciones = [codigo for codigo, _ in ResultadoCEV.CALIFICACIONES]
+        resultados = []
+        for pk in ids:
+            if azar.random() < calificados:
+                calificacion = azar.choice(calificaciones)
+                resultados.append(ResultadoCEV(
+                    proyecto_id=pk,
+                    calificacion=calificacion,
+                    consumo_energia_anual=Decimal(CONSUMOS_ESTIMADOS[calificacion] + azar.randint(-10, 10)),
+                    fecha_calificacion=hoy - timedelta(days=azar.randint(0, 365)),
+                ))
+        ResultadoCEV.objects.bulk_create(resultados, batch_size=2000)
@@ -0,0 +1,50 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copia la base 'default' en las réplicas SQLite de settings.CEV_REPLICAS "
+        "con la API de backup de SQLite (copia consistente, sin detener la "
+        "aplicación). Es el sustituto local de la replicación: con --intervalo "
+        "repite la copia cada N segundos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--intervalo', type=float,
+            help="Segundos entre copias; sin esta opción copia una vez y termina.",
+        )
+
+    def handle(self, *args, intervalo, **options):
+        if not settings.CEV_REPLICAS:
+            raise CommandError("No hay réplicas configuradas (CEV_BD_REPLICAS).")
+        for alias in (DEFAULT_DB_ALIAS, *settings.CEV_REPLICAS):
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"{alias} no es SQLite; usa la replicación del motor de base de datos.")
+        if intervalo is not None and intervalo <= 0:
+            raise CommandError("--intervalo debe ser positivo.")
+
+        while True:
+            inicio = time.perf_counter()
+            self.copiar()
+            if options['verbosity'] > 1 or intervalo is None:
+                self.stdout.write(
+                    f"{len(settings.CEV_REPLICAS)} réplicas copiadas en {time.perf_counter() - inicio:.2f} s"
+                )
+            if intervalo is None:
+                return
+            time.sleep(intervalo)
+
+    def copiar(self):
+        primaria = connections[DEFAULT_DB_ALIAS]
+        primaria.ensure_connection()
+        for alias in settings.CEV_REPLICAS:
+            with closing(sqlite3.connect(connections[alias].settings_dict['NAME'], timeout=30)) as destino:
+                primaria.connection.backup(destino)
+        primaria.close()
@@ -0,0 +1,286 @@
+# gestion/metricas.py
+"""
+Métricas de la aplicación en formato de texto de Prometheus (``/metrics``).
+
+* ``Registro`` guarda contadores e histogramas en memoria del proceso; cada
+  worker expone los suyos y Prometheus los suma por ``instance``.
+* Las consultas SQL se cuentan con un ``execute_wrapper`` que se instala en
+  cada conexión al abrirse (ver apps.py) y anota en la ``Medicion`` de la
+  petición en curso, guardada en un ContextVar: así también se cuentan las
+  consultas que el ORM async corre en otro hilo. Fuera de una petición el
+  wrapper no hace nada.
+* En las respuestas en streaming (exportación CSV) las consultas corren
+  mientras el servidor consume el flujo, después de salir de la vista:
+  ``FlujoMedido`` mantiene activa la ``Medicion`` en cada trozo y avisa al
+  terminar para registrar la petición completa.
+
+El middleware que mide cada petición está en gestion/middleware.py. /metrics
+lo leen el staff con sesión o Prometheus con el token de CEV_METRICAS_TOKEN.
+Este módulo no importa modelos.
+"""
+import bisect
+import hmac
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+
+# Límites superiores de los histogramas (la última cubeta siempre es +Inf).
+CUBETAS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CUBETAS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _etiquetas(nombres, valores, extra=()):
+    pares = [*zip(nombres, valores), *extra]
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + '}'
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valores, cantidad=1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def valor(self, *valores):
+        return self._valores.get(valores, 0)
+
+    def exportar(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} counter"
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for clave, total in valores:
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {total}"
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, etiquetas=(), cubetas=CUBETAS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.cubetas = tuple(cubetas)
+        # etiquetas -> [conteos por cubeta (no acumulados) + [+Inf], suma, total]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores):
+        indice = bisect.bisect_left(self.cubetas, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.cubetas) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def total(self, *valores):
+        serie = self._series.get(valores)
+        return serie[2] if serie else 0
+
+    def exportar(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} histogram"
+        with self._lock:
+            series = sorted((clave, ([*conteos], suma, total)) for clave, (conteos, suma, total) in self._series.items())
+        for clave, (conteos, suma, total) in series:
+            acumulado = 0
+            for limite, conteo in zip([*self.cubetas, '+Inf'], conteos):
+                acumulado += conteo
+                yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, [('le', limite)])} {acumulado}"
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {suma:.6f}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {total}"
+
+
+class Registro:
+    """Conjunto de métricas del proceso, exportable como texto de Prometheus."""
+
+    def __init__(self):
+        self.metricas = {}
+
+    def _agregar(self, metrica):
+        if metrica.nombre in self.metricas:
+            raise ValueError(f"Métrica duplicada: {metrica.nombre}")
+        self.metricas[metrica.nombre] = metrica
+        return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._agregar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), cubetas=CUBETAS_SEGUNDOS):
+        return self._agregar(Histograma(nombre, ayuda, etiquetas, cubetas))
+
+    def exportar(self):
+        lineas = [linea for metrica in self.metricas.values() for linea in metrica.exportar()]
+        return '\n'.join(lineas) + '\n'
+
+
+REGISTRO = Registro()
+
+PETICIONES = REGISTRO.contador(
+    'cev_peticiones_total', "Peticiones HTTP atendidas.", ('vista', 'metodo', 'estado'),
+)
+DURACION_PETICION = REGISTRO.histograma(
+    'cev_peticion_segundos', "Latencia de la petición (middleware a respuesta).", ('vista',),
+)
+CONSULTAS_PETICION = REGISTRO.histograma(
+    'cev_sql_consultas', "Consultas SQL por petición.", ('vista',), cubetas=CUBETAS_CONSULTAS,
+)
+TIEMPO_SQL_PETICION = REGISTRO.histograma(
+    'cev_sql_segundos', "Tiempo total en SQL por petición.", ('vista',),
+)
+PETICIONES_N_MAS_1 = REGISTRO.contador(
+    'cev_sql_n_mas_1_total',
+    "Peticiones con una misma consulta repetida al menos CEV_METRICAS_UMBRAL_REPETIDAS veces (posible N+1).",
+    ('vista',),
+)
+RENDER_PDF = REGISTRO.histograma(
+    'cev_pdf_render_segundos', "Tiempo de renderizado de un reporte PDF con reportlab (proceso web).",
+)
+REFERENCIAS_CACHE = REGISTRO.contador(
+    'cev_referencias_cache_total',
+    "Lecturas del caché en memoria de datos de referencia (acierto, o fallo que carga la tabla).",
+    ('modelo', 'resultado'),
+)
+REPLICAS_PETICIONES = REGISTRO.contador(
+    'cev_replicas_peticiones_total',
+    "Peticiones de solo lectura por base elegida y motivo (replica, pegajosa tras escribir, o retraso).",
+    ('base', 'motivo'),
+)
+
+
+# ----------------------------------------
+# CONSULTAS SQL POR PETICIÓN
+# ----------------------------------------
+
+class Medicion:
+    """Consultas de una petición: cantidad, tiempo y repeticiones por sentencia."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos_sql = 0.0
+        self.sentencias = Counter()
+
+    def repetidas(self, minimo=2):
+        """[(sentencia, veces)] de las repetidas al menos ``minimo`` veces, de más a menos."""
+        return [(sql, veces) for sql, veces in self.sentencias.most_common() if veces >= minimo]
+
+
+_medicion_actual = ContextVar('cev_medicion', default=None)
+
+
+def contar_consultas(execute, sql, params, many, context):
+    """``execute_wrapper`` instalado en todas las conexiones."""
+    medicion = _medicion_actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.segundos_sql += time.perf_counter() - inicio
+        medicion.consultas += 1
+        # La sentencia lleva marcadores en vez de valores: misma consulta, misma clave.
+        medicion.sentencias[sql] += 1
+
+
+def instalar_en_conexion(sender, connection, **kwargs):
+    """Receptor de ``connection_created``."""
+    if contar_consultas not in connection.execute_wrappers:
+        connection.execute_wrappers.append(contar_consultas)
+
+
+@contextmanager
+def medir_consultas(medicion=None):
+    """Activa una ``Medicion`` para el código del bloque (y lo que llame en otros hilos vía asgiref)."""
+    medicion = Medicion() if medicion is None else medicion
+    token = _medicion_actual.set(medicion)
+    try:
+        yield medicion
+    finally:
+        _medicion_actual.reset(token)
+
+
+class FlujoMedido:
+    """
+    Envuelve el contenido de una respuesta en streaming: cada trozo se genera
+    con ``medicion`` activa y ``al_terminar`` se llama una sola vez, al agotarse
+    el flujo o al cerrarse la respuesta (cliente que corta la descarga).
+    """
+
+    def __init__(self, contenido, medicion, al_terminar):
+        self.contenido = contenido
+        self.medicion = medicion
+        self.al_terminar = al_terminar
+
+    def __iter__(self):
+        self.iterador = iter(self.contenido)
+        return self
+
+    def __next__(self):
+        try:
+            with medir_consultas(self.medicion):
+                return next(self.iterador)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        al_terminar, self.al_terminar = self.al_terminar, None
+        if al_terminar is not None:
+            al_terminar()
+
+
+class FlujoMedidoAsync(FlujoMedido):
+    """``FlujoMedido`` para ``streaming_content`` asíncrono (ASGI)."""
+
+    def __aiter__(self):
+        self.iterador = aiter(self.contenido)
+        return self
+
+    async def __anext__(self):
+        try:
+            with medir_consultas(self.medicion):
+                return await anext(self.iterador)
+        except StopAsyncIteration:
+            self.close()
+            raise
+
+
+@contextmanager
+def medir_render_pdf():
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        RENDER_PDF.observar(time.perf_counter() - inicio)
+
+
+def token_metricas(request):
+    """True si la petición trae ``Authorization: Bearer <CEV_METRICAS_TOKEN>`` (y el token está configurado)."""
+    token = settings.CEV_METRICAS_TOKEN
+    esquema, _, valor = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and esquema.lower() == 'bearer' and hmac.compare_digest(valor.encode(), token.encode())
+
+
+def vista_metricas(request):
+    """Exposición para Prometheus (text format 0.0.4). Solo staff o con el token de CEV_METRICAS_TOKEN."""
+    if not (token_metricas(request) or request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(REGISTRO.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,260 @@
+# gestion/middleware.py
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, get_user_model
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.urls import reverse
+
+from .metricas import (
+    CONSULTAS_PETICION,
+    DURACION_PETICION,
+    PETICIONES,
+    PETICIONES_N_MAS_1,
+    TIEMPO_SQL_PETICION,
+    FlujoMedido,
+    FlujoMedidoAsync,
+    medir_consultas,
+    token_metricas,
+)
+from .models import Organizacion
+from .organizaciones import activar, clave_miembro
+from .referencias import REFERENCIAS
+from .replicas import REPLICAS
+
+logger = logging.getLogger('gestion.metricas')
+
+# Cabecera opcional con el resumen de SQL de la petición (CEV_METRICAS_DETALLE_SQL).
+CABECERA_SQL = 'X-CEV-SQL'
+
+
+def nombre_vista(request):
+    """Etiqueta de la petición: nombre de la URL (``admin:`` para el admin) o 'sin_ruta'."""
+    ruta = getattr(request, 'resolver_match', None)
+    if ruta is None or not ruta.url_name:
+        return 'sin_ruta'
+    return ruta.view_name
+
+
+class MetricasMiddleware:
+    """
+    Registra por vista la latencia, las consultas SQL y su tiempo, y cuenta
+    las peticiones con consultas repetidas (N+1). Con
+    ``CEV_METRICAS_DETALLE_SQL`` agrega la cabecera X-CEV-SQL y una línea de
+    log con las sentencias más repetidas. Debe ir primero en MIDDLEWARE.
+
+    Las respuestas en streaming se registran cuando termina el flujo, para
+    contar las consultas y el tiempo de generar el contenido.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        with medir_consultas() as medicion:
+            response = self.get_response(request)
+        return self.terminar(request, response, medicion, inicio)
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        with medir_consultas() as medicion:
+            response = await self.get_response(request)
+        return self.terminar(request, response, medicion, inicio)
+
+    def terminar(self, request, response, medicion, inicio):
+        # Los archivos (FileResponse) no consultan la base y conservan el envío directo del servidor.
+        if not response.streaming or getattr(response, 'file_to_stream', None) is not None:
+            self.registrar(request, response, medicion, time.perf_counter() - inicio)
+            return response
+
+        def al_terminar():
+            self.registrar(request, response, medicion, time.perf_counter() - inicio)
+
+        flujo = FlujoMedidoAsync if response.is_async else FlujoMedido
+        response.streaming_content = flujo(response.streaming_content, medicion, al_terminar)
+        return response
+
+    def registrar(self, request, response, medicion, segundos):
+        vista = nombre_vista(request)
+        PETICIONES.inc(vista, request.method, response.status_code)
+        DURACION_PETICION.observar(segundos, vista)
+        CONSULTAS_PETICION.observar(medicion.consultas, vista)
+        TIEMPO_SQL_PETICION.observar(medicion.segundos_sql, vista)
+
+        repetidas = medicion.repetidas(settings.CEV_METRICAS_UMBRAL_REPETIDAS)
+        if repetidas:
+            PETICIONES_N_MAS_1.inc(vista)
+        if settings.CEV_METRICAS_DETALLE_SQL:
+            self.detallar(request, response, vista, medicion, segundos)
+
+    def detallar(self, request, response, vista, medicion, segundos):
+        principales = medicion.repetidas()[:3]
+        # En streaming las cabeceras ya se enviaron: queda solo la línea de log.
+        if not response.streaming:
+            response[CABECERA_SQL] = '; '.join([
+                f"consultas={medicion.consultas}",
+                f"sql_ms={medicion.segundos_sql * 1000:.1f}",
+                # Solo ASCII en la cabecera: la sentencia va resumida y sin saltos de línea.
+                *(f"{veces}x {' '.join(sql.split())[:120]}".encode('ascii', 'replace').decode() for sql, veces in principales),
+            ])
+        logger.info(
+            "%s %s vista=%s %.1f ms, %d consultas (%.1f ms SQL)%s",
+            request.method, request.path, vista, segundos * 1000, medicion.consultas,
+            medicion.segundos_sql * 1000,
+            ''.join(f"\n  {veces}x {sql}" for sql, veces in principales),
+        )
+
+
+class ReferenciasMiddleware:
+    """
+    Marca el inicio de cada petición para el caché de datos de referencia:
+    la primera lectura compara su versión con la de la base de datos (ver
+    gestion/referencias.py).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = REFERENCIAS.nueva_peticion()
+        try:
+            return self.get_response(request)
+        finally:
+            REFERENCIAS.fin_peticion(token)
+
+    async def __acall__(self, request):
+        token = REFERENCIAS.nueva_peticion()
+        try:
+            return await self.get_response(request)
+        finally:
+            REFERENCIAS.fin_peticion(token)
+
+
+class ReplicasMiddleware:
+    """
+    Estado por petición del router de réplicas: lee la cookie de lectura en
+    la primaria y la renueva si la petición escribió (ver gestion/replicas.py).
+    Debe ir antes de SessionMiddleware para ver también lo que guarda la sesión.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        REPLICAS.nueva_peticion(request)
+        response = self.get_response(request)
+        REPLICAS.responder(response)
+        return response
+
+    async def __acall__(self, request):
+        REPLICAS.nueva_peticion(request)
+        response = await self.get_response(request)
+        REPLICAS.responder(response)
+        return response
+
+
+class OrganizacionMiddleware:
+    """
+    Resuelve la organización de la petición (``request.organizacion``, su pk
+    o None) y la deja en curso para los managers (ver
+    gestion/organizaciones.py). Va después de AuthenticationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # La organización de la petición anterior del hilo no se usa ni para un error.
+        self.activar(request, None)
+        self.activar(request, self.resolver(request))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.activar(request, None)
+        # Se activa aquí y no en el hilo de sync_to_async: el contexto de la vista es este.
+        self.activar(request, await sync_to_async(self.resolver)(request))
+        return await self.get_response(request)
+
+    def activar(self, request, organizacion):
+        request.organizacion = organizacion
+        activar(organizacion)
+
+    def resolver(self, request):
+        """
+        Organización del subdominio (con CEV_ORGANIZACION_DOMINIO) si el usuario
+        es miembro, o su primera organización. Los superusuarios sin
+        organización ven todo (None). Sin organización el resto recibe 403; con
+        CEV_ORGANIZACION_OBLIGATORIA desactivado (instalación de una sola
+        organización) fuera de un subdominio no se filtra.
+        """
+        # El pk del usuario sale de la sesión, sin cargar el usuario.
+        usuario = request.session.get(SESSION_KEY)
+        superusuario, organizaciones = (False, []) if usuario is None else self.miembro(usuario)
+        dominio = settings.CEV_ORGANIZACION_DOMINIO
+        host = request.get_host().partition(':')[0]
+        subdominio = bool(dominio) and host.endswith(f'.{dominio}')
+        if subdominio:
+            organizacion = Organizacion.objects.filter(slug=host[:-len(dominio) - 1]).values_list(
+                'pk', flat=True
+            ).first()
+            if organizacion is None:
+                raise Http404("Organización desconocida.")
+            if organizacion in organizaciones or superusuario:
+                return organizacion
+        elif organizaciones:
+            return organizaciones[0]
+        elif superusuario or not settings.CEV_ORGANIZACION_OBLIGATORIA:
+            return None
+        if usuario is None and (
+            request.path.startswith(settings.CEV_ORGANIZACION_RUTAS_LIBRES)
+            or (request.path == reverse('metricas') and token_metricas(request))
+        ):
+            # Anónimo en el login del admin, o Prometheus con su token: no muestran datos de ninguna organización.
+            return None
+        raise PermissionDenied
+
+    def miembro(self, usuario):
+        """
+        (es superusuario, pks de sus organizaciones), en caché mientras no
+        cambien las membresías ni el usuario (ver gestion/signals.py).
+        """
+        def cargar():
+            # Un usuario desactivado (o borrado) no tiene organizaciones, como en AuthenticationMiddleware.
+            activo = get_user_model()._base_manager.filter(pk=usuario, is_active=True).values_list(
+                'is_superuser', flat=True
+            ).first()
+            if activo is None:
+                return False, []
+            organizaciones = Organizacion.objects.filter(miembros=usuario).order_by('pk').values_list('pk', flat=True)
+            return activo, list(organizaciones)
+
+        return cache.get_or_set(clave_miembro(usuario), cargar, settings.CEV_FRAGMENTOS_CACHE_TIMEOUT)
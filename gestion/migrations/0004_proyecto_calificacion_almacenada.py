@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0003_alter_material_options_alter_muro_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proyecto',
+            name='calificacion_estimada',
+            field=models.CharField(db_index=True, default='Sin datos', editable=False, max_length=10, verbose_name='Calificación Estimada'),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='conductividad_ponderada',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Conductividad Ponderada (W/mK)'),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='consumo_estimado',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Consumo Estimado (kWh/m²)'),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='superficie_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Superficie Total de Muros (m²)'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0004_proyecto_calificacion_almacenada'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['-fecha_inicio', '-id'], name='proyecto_fecha_id_idx'),
+        ),
+    ]
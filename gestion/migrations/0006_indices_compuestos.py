@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0005_proyecto_fecha_id_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='muro',
+            name='ubicacion',
+            field=models.CharField(db_index=True, max_length=50, verbose_name='Ubicación (Norte, Sur, etc.)'),
+        ),
+        migrations.AddIndex(
+            model_name='muro',
+            index=models.Index(fields=['proyecto', 'material_aislante', 'superficie'], name='muro_proyecto_material_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['cliente', '-fecha_inicio'], name='proyecto_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['tipo', '-fecha_inicio'], name='proyecto_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['conductividad_ponderada', '-fecha_inicio', '-id'], name='proyecto_conductividad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resultadocev',
+            index=models.Index(fields=['calificacion', 'fecha_calificacion'], name='resultado_calif_fecha_idx'),
+        ),
+    ]
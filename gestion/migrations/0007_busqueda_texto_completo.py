@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# El DDL va copiado aquí y no se importa de gestion/busqueda.py: una migración
+# aplicada no debe cambiar si después cambia el código de la búsqueda.
+
+SQLITE_CREAR = [
+    "CREATE VIRTUAL TABLE gestion_proyecto_busqueda USING fts5("
+    "nombre, cliente, descripcion, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO gestion_proyecto_busqueda (rowid, nombre, cliente, descripcion) "
+    "SELECT p.id, p.nombre, c.nombre, COALESCE(p.descripcion, '') "
+    "FROM gestion_proyecto p INNER JOIN gestion_cliente c ON c.id = p.cliente_id",
+]
+
+POSTGRESQL_CREAR = [
+    "CREATE TABLE gestion_proyecto_busqueda ("
+    "rowid bigint PRIMARY KEY REFERENCES gestion_proyecto (id) "
+    "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "documento tsvector NOT NULL)",
+    "CREATE INDEX gestion_proyecto_busqueda_documento_idx ON gestion_proyecto_busqueda USING GIN (documento)",
+    "INSERT INTO gestion_proyecto_busqueda (rowid, documento) "
+    "SELECT p.id, "
+    "setweight(to_tsvector('spanish'::regconfig, p.nombre), 'A') || "
+    "setweight(to_tsvector('spanish'::regconfig, c.nombre), 'B') || "
+    "setweight(to_tsvector('spanish'::regconfig, COALESCE(p.descripcion, '')), 'C') "
+    "FROM gestion_proyecto p INNER JOIN gestion_cliente c ON c.id = p.cliente_id",
+]
+
+ELIMINAR = "DROP TABLE IF EXISTS gestion_proyecto_busqueda"
+
+
+class RunSQLMotor(migrations.RunSQL):
+    """``RunSQL`` que solo corre en el motor indicado (en los demás no hay índice)."""
+
+    def __init__(self, motor, *args, **kwargs):
+        self.motor = motor
+        super().__init__(*args, **kwargs)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.motor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.motor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0006_indices_compuestos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProyectoBusqueda',
+            fields=[
+                ('proyecto', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='busqueda', serialize=False, to='gestion.proyecto')),
+            ],
+            options={
+                'db_table': 'gestion_proyecto_busqueda',
+                'managed': False,
+            },
+        ),
+        RunSQLMotor('sqlite', SQLITE_CREAR, ELIMINAR),
+        RunSQLMotor('postgresql', POSTGRESQL_CREAR, ELIMINAR),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0007_busqueda_texto_completo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proyecto',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, verbose_name='Última Actualización'),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
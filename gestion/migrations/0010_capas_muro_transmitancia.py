@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:10
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0009_tareas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='muro',
+            name='transmitancia',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Transmitancia U (W/m²K)'),
+        ),
+        migrations.CreateModel(
+            name='CapaMuro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('espesor', models.DecimalField(decimal_places=3, max_digits=6, validators=[django.core.validators.MinValueValidator(Decimal('0.001'))], verbose_name='Espesor (m)')),
+                ('orden', models.PositiveSmallIntegerField(default=0, help_text='Posición de interior a exterior.')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='capas', to='gestion.material')),
+                ('muro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capas', to='gestion.muro')),
+            ],
+            options={
+                'verbose_name': 'Capa de muro',
+                'verbose_name_plural': 'Capas de muro',
+                'ordering': ['muro', 'orden', 'pk'],
+                'indexes': [models.Index(fields=['muro', 'material', 'espesor'], name='capa_muro_material_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0011_contador_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Organizacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('slug', models.SlugField(unique=True)),
+                ('miembros', models.ManyToManyField(blank=True, related_name='organizaciones_cev', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Organización',
+                'verbose_name_plural': 'Organizaciones',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='organizacion',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion.organizacion', verbose_name='Organización'),
+        ),
+        migrations.AddField(
+            model_name='material',
+            name='organizacion',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion.organizacion', verbose_name='Organización'),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='organizacion',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion.organizacion', verbose_name='Organización'),
+        ),
+        migrations.AddField(
+            model_name='sistemaclimatizacion',
+            name='organizacion',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion.organizacion', verbose_name='Organización'),
+        ),
+        migrations.AddField(
+            model_name='tarea',
+            name='organizacion',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion.organizacion', verbose_name='Organización'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['organizacion', 'nombre'], name='cliente_org_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['organizacion', 'nombre'], name='material_org_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['organizacion', '-fecha_inicio', '-id'], name='proyecto_org_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['organizacion', 'tipo', '-fecha_inicio'], name='proyecto_org_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['organizacion', 'calificacion_estimada', '-fecha_inicio'], name='proyecto_org_calif_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['organizacion', 'conductividad_ponderada', '-fecha_inicio', '-id'], name='proyecto_org_conduct_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sistemaclimatizacion',
+            index=models.Index(fields=['organizacion', 'tipo'], name='sistema_org_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarea',
+            index=models.Index(fields=['organizacion', '-creada'], name='tarea_org_creada_idx'),
+        ),
+    ]
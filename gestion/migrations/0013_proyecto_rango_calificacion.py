@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0012_organizaciones'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='proyecto',
+            name='proyecto_conductividad_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='proyecto',
+            name='proyecto_org_conduct_idx',
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='rango_calificacion',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(calificacion_estimada='A+', then=models.Value(0)), models.When(calificacion_estimada='A', then=models.Value(1)), models.When(calificacion_estimada='B', then=models.Value(2)), models.When(calificacion_estimada='C', then=models.Value(3)), models.When(calificacion_estimada='D', then=models.Value(4)), models.When(calificacion_estimada='Sin datos', then=models.Value(5)), default=models.Value(5)), output_field=models.PositiveSmallIntegerField(), verbose_name='Rango de la Calificación Estimada'),
+        ),
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['organizacion', 'rango_calificacion', '-fecha_inicio', '-id'], name='proyecto_org_rango_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['rango_calificacion', '-fecha_inicio', '-id'], name='proyecto_rango_calif_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0013_proyecto_rango_calificacion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='proyecto',
+            name='calificacion_estimada',
+            field=models.CharField(default='Sin datos', editable=False, max_length=10, verbose_name='Calificación Estimada'),
+        ),
+    ]
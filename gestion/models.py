@@ -1,21 +1,202 @@
 # gestion/models.py
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.db.models import (
+    Case, Count, ExpressionWrapper, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Now, NullIf
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.validators import MinValueValidator
+from django.utils import timezone
 from datetime import date
+from decimal import Decimal
+
+from .organizaciones import en_organizacion, organizacion_actual
+
+# ----------------------------------------
+# CRITERIOS DE CALIFICACIÓN ENERGÉTICA
+# ----------------------------------------
+
+# Límite superior (exclusivo) de conductividad ponderada para cada calificación.
+# Lo comparten el cálculo en Python y el cálculo en SQL de ProyectoQuerySet.
+UMBRALES_CALIFICACION = (
+    (0.5, 'A+'),
+    (1.0, 'A'),
+    (1.5, 'B'),
+    (2.0, 'C'),
+)
+CALIFICACION_MAXIMA = 'D'
+SIN_DATOS = 'Sin datos'
+
+# Calificaciones de mejor a peor (las mismas etiquetas para ambos criterios).
+ORDEN_CALIFICACIONES = (*[calificacion for _, calificacion in UMBRALES_CALIFICACION], CALIFICACION_MAXIMA, SIN_DATOS)
+
+# Límite superior (exclusivo) de transmitancia ponderada U (W/m²K) para cada
+# calificación. Se usa en vez de la conductividad cuando todos los muros del
+# proyecto tienen capas (ver CapaMuro).
+UMBRALES_TRANSMITANCIA = (
+    (0.35, 'A+'),
+    (0.6, 'A'),
+    (1.0, 'B'),
+    (1.9, 'C'),
+)
+
+# Resistencias superficiales interior y exterior de un muro (m²K/W, ISO 6946,
+# flujo de calor horizontal): U = 1 / (Rsi + Σ espesor/λ + Rse).
+RESISTENCIA_SUPERFICIAL_INTERIOR = 0.13
+RESISTENCIA_SUPERFICIAL_EXTERIOR = 0.04
+
+# Consumo energético anual estimado (kWh/m²) por calificación.
+CONSUMOS_ESTIMADOS = {
+    'A+': 50,
+    'A': 75,
+    'B': 100,
+    'C': 150,
+    'D': 200,
+    SIN_DATOS: 0,
+}
+
+# Clase CSS del badge por calificación.
+BADGES_CALIFICACION = {
+    'A+': 'success',
+    'A': 'primary',
+    'B': 'info',
+    'C': 'warning',
+    'D': 'danger',
+    SIN_DATOS: 'secondary',
+}
+
+
+def _calificacion_por_umbrales(valor, umbrales):
+    if valor is None:
+        return SIN_DATOS
+    for limite, calificacion in umbrales:
+        if valor < limite:
+            return calificacion
+    return CALIFICACION_MAXIMA
+
+
+def calificacion_desde_conductividad(promedio_conductividad):
+    """Traduce una conductividad ponderada (W/mK) a su calificación energética."""
+    return _calificacion_por_umbrales(promedio_conductividad, UMBRALES_CALIFICACION)
+
+
+def calificacion_desde_transmitancia(promedio_transmitancia):
+    """Traduce una transmitancia ponderada U (W/m²K) a su calificación energética."""
+    return _calificacion_por_umbrales(promedio_transmitancia, UMBRALES_TRANSMITANCIA)
+
+# ----------------------------------------
+# 0. ORGANIZACIONES (TENANTS)
+# ----------------------------------------
+
+class Organizacion(models.Model):
+    """Cliente del SaaS: sus datos quedan aislados de los de las demás (ver gestion/organizaciones.py)."""
+    nombre = models.CharField(max_length=100)
+    # Subdominio de la organización (CEV_ORGANIZACION_DOMINIO)
+    slug = models.SlugField(max_length=50, unique=True)
+    miembros = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='organizaciones_cev', blank=True)
+
+    class Meta:
+        verbose_name = "Organización"
+        verbose_name_plural = "Organizaciones"
+        ordering = ['nombre']
+
+    def __str__(self):
+        return self.nombre
+
+
+class OrganizacionManager(models.Manager):
+    """
+    Manager por defecto de los modelos de una organización: con una
+    organización en curso filtra todas las consultas por ella (también las de
+    los managers relacionados y los formularios, que se construyen desde este).
+    Los modelos hijos filtran a través de su padre con ``campo_organizacion``.
+    """
+    campo_organizacion = 'organizacion'
+    # Incluye también las filas sin organización (catálogo común a todas).
+    incluye_compartidos = False
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        organizacion = organizacion_actual()
+        if organizacion is None:
+            return queryset
+        filtro = Q(**{self.campo_organizacion: organizacion})
+        if self.incluye_compartidos:
+            filtro |= Q(**{f'{self.campo_organizacion}__isnull': True})
+        return queryset.filter(filtro)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create no llama a save(): la organización en curso se asigna aquí.
+        objs = list(objs)
+        organizacion = organizacion_actual()
+        if organizacion is not None and self.campo_organizacion == 'organizacion':
+            for obj in objs:
+                if obj.organizacion_id is None:
+                    obj.organizacion_id = organizacion
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class CatalogoManager(OrganizacionManager):
+    """Materiales y sistemas: los de la organización más el catálogo común (sin organización)."""
+    incluye_compartidos = True
+
+
+class DeProyectoManager(OrganizacionManager):
+    """Filas que pertenecen a un proyecto: se filtran por la organización del proyecto."""
+    campo_organizacion = 'proyecto__organizacion'
+
+
+class ConOrganizacion(models.Model):
+    """
+    Base de los modelos de una organización. Sin organización (NULL) la fila
+    es anterior a las organizaciones o, en Material y SistemaClimatizacion,
+    del catálogo común.
+    """
+    # Sin índice propio: los índices compuestos de cada modelo empiezan por esta columna.
+    organizacion = models.ForeignKey(
+        Organizacion, on_delete=models.CASCADE, null=True, blank=True, db_index=False,
+        related_name='+', verbose_name="Organización",
+    )
+
+    objects = OrganizacionManager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.organizacion_id is None:
+            self.organizacion_id = organizacion_actual()
+        super().save(*args, **kwargs)
+
 
 # ----------------------------------------
 # 1. ENTIDADES NO RELACIONADAS
 # ----------------------------------------
 
-class Material(models.Model):
+class Material(ConOrganizacion):
     nombre = models.CharField(max_length=100)
     conductividad = models.DecimalField(max_digits=5, decimal_places=3, verbose_name="Conductividad Térmica (W/mK)")
+
+    objects = CatalogoManager()
     
     class Meta:
         verbose_name_plural = "Materiales"
+        indexes = [
+            models.Index(fields=['organizacion', 'nombre'], name='material_org_nombre_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nombre} ({self.conductividad} W/mK)"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Permite detectar en post_save si cambió la conductividad.
+        instance._conductividad_original = instance.__dict__.get('conductividad')
+        return instance
 
 
 class TipoProyecto(models.Model):
@@ -32,14 +213,34 @@ class TipoProyecto(models.Model):
 # 2. ENTIDAD BASE CON RELACIÓN
 # ----------------------------------------
 
-class Cliente(models.Model):
+class Cliente(ConOrganizacion):
     """Entidad para representar al cliente/propietario de la vivienda."""
     nombre = models.CharField(max_length=100, verbose_name="Nombre/Razón Social")
+    # Único en toda la plataforma: la importación hace upsert por contacto.
     contacto = models.CharField(max_length=100, verbose_name="Email de Contacto", unique=True)
+
+    class Meta:
+        indexes = [
+            # Desplegables y admin de la organización, ordenados por nombre
+            models.Index(fields=['organizacion', 'nombre'], name='cliente_org_nombre_idx'),
+        ]
     
     def __str__(self):
         return self.nombre
     
+    def validate_unique(self, exclude=None):
+        # El contacto de otra organización también choca con la restricción única.
+        with en_organizacion(None):
+            super().validate_unique(exclude)
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Permite detectar en post_save si hay que reindexar sus proyectos o subir su versión.
+        instance._nombre_original = instance.__dict__.get('nombre')
+        instance._contacto_original = instance.__dict__.get('contacto')
+        return instance
+    
     def total_proyectos(self):
         """Retorna el total de proyectos del cliente."""
         return self.proyectos.count()
@@ -49,13 +250,18 @@ class Cliente(models.Model):
 # 3. ENTIDAD RELACIONADA N:M
 # ----------------------------------------
 
-class SistemaClimatizacion(models.Model):
+class SistemaClimatizacion(ConOrganizacion):
     """Sistemas de climatización que puede tener el proyecto."""
     tipo = models.CharField(max_length=100, verbose_name="Tipo de Sistema")
     eficiencia_nominal = models.DecimalField(max_digits=5, decimal_places=2, default=1.0, verbose_name="Eficiencia Nominal (COP/SCOP)")
+
+    objects = CatalogoManager()
     
     class Meta:
         verbose_name_plural = "Sistemas de Climatización"
+        indexes = [
+            models.Index(fields=['organizacion', 'tipo'], name='sistema_org_tipo_idx'),
+        ]
     
     def __str__(self):
         return f"{self.tipo} (Eficiencia: {self.eficiencia_nominal})"
@@ -65,7 +271,135 @@ class SistemaClimatizacion(models.Model):
 # 4. ENTIDAD PRINCIPAL: PROYECTO
 # ----------------------------------------
 
-class Proyecto(models.Model):
+# Columnas de Proyecto que guardan la calificación estimada, en el mismo orden
+# que las expresiones de _subconsultas_calificacion().
+CAMPOS_CALIFICACION = (
+    'superficie_total',
+    'conductividad_ponderada',
+    'calificacion_estimada',
+    'consumo_estimado',
+)
+
+
+def _subconsultas_calificacion():
+    """
+    Expresiones (superficie, conductividad ponderada, calificación, consumo)
+    calculadas con subconsultas correlacionadas sobre los muros de cada proyecto.
+    Si todos los muros tienen capas, la calificación sale de la transmitancia
+    U ponderada; si no, de la conductividad del material aislante.
+    """
+    def ponderada(campo):
+        return Cast(
+            Sum(ExpressionWrapper(F(campo) * F('superficie'), output_field=FloatField()))
+            / NullIf(Sum('superficie'), 0),
+            FloatField(),
+        )
+
+    # Sin superficie las medias quedan en NULL y caen en el valor por defecto.
+    con_capas = Q(muros_sin_capas=0)
+    reglas = [
+        *[
+            (con_capas & Q(transmitancia_media__lt=limite), calificacion)
+            for limite, calificacion in UMBRALES_TRANSMITANCIA
+        ],
+        (con_capas & Q(transmitancia_media__isnull=False), CALIFICACION_MAXIMA),
+        *[
+            (Q(conductividad_media__lt=limite), calificacion)
+            for limite, calificacion in UMBRALES_CALIFICACION
+        ],
+        (Q(conductividad_media__isnull=False), CALIFICACION_MAXIMA),
+    ]
+    # _base_manager: el proyecto exterior ya está filtrado por organización.
+    muros = Muro._base_manager.filter(proyecto=OuterRef('pk')).order_by().values('proyecto').annotate(
+        superficie_total=Sum('superficie'),
+        conductividad_media=ponderada('material_aislante__conductividad'),
+        transmitancia_media=ponderada('transmitancia'),
+        muros_sin_capas=Count('pk', filter=Q(transmitancia__isnull=True)),
+    ).annotate(
+        calificacion=Case(
+            *[When(condicion, then=Value(calificacion)) for condicion, calificacion in reglas],
+            default=Value(SIN_DATOS),
+            output_field=models.CharField(),
+        ),
+        consumo=Case(
+            *[When(condicion, then=Value(CONSUMOS_ESTIMADOS[calificacion])) for condicion, calificacion in reglas],
+            default=Value(CONSUMOS_ESTIMADOS[SIN_DATOS]),
+            output_field=IntegerField(),
+        ),
+    )
+    # Un proyecto sin muros no devuelve fila en la subconsulta.
+    return (
+        Coalesce(Subquery(muros.values('superficie_total')), Value(0), output_field=models.DecimalField()),
+        Subquery(muros.values('conductividad_media')),
+        Coalesce(Subquery(muros.values('calificacion')), Value(SIN_DATOS)),
+        Coalesce(Subquery(muros.values('consumo')), Value(CONSUMOS_ESTIMADOS[SIN_DATOS])),
+    )
+
+
+def _nueva_version():
+    """Valores de UPDATE que marcan un proyecto como modificado."""
+    return {'version': F('version') + 1, 'fecha_actualizacion': Now()}
+
+
+class ProyectoQuerySet(models.QuerySet):
+    """QuerySet de proyectos con cálculos energéticos resueltos en SQL."""
+
+    def with_rating(self):
+        """
+        Anota cada proyecto con su calificación estimada en una sola consulta:
+        - superficie_muros: suma de superficies de sus muros
+        - conductividad_media: Σ(conductividad × superficie) / Σ(superficie)
+        - calificacion_calculada: A+ … D, o 'Sin datos' si no hay superficie
+        - consumo_calculado: consumo anual estimado (kWh/m²)
+
+        Cada valor es una subconsulta correlacionada sobre los muros del
+        proyecto, así solo se calcula para las filas que realmente se leen
+        (una página) y no altera COUNT(*), filtros ni ordenamientos.
+        """
+        return self.annotate(**{
+            anotacion: expresion
+            for anotacion, expresion in zip(
+                ('superficie_muros', 'conductividad_media', 'calificacion_calculada', 'consumo_calculado'),
+                _subconsultas_calificacion(),
+            )
+        })
+
+    def actualizar_calificacion(self):
+        """
+        Recalcula en un único UPDATE las columnas de calificación almacenadas
+        (superficie_total, conductividad_ponderada, calificacion_estimada,
+        consumo_estimado) de todos los proyectos del queryset.
+        """
+        return self.order_by().update(
+            **{campo: expresion for campo, expresion in zip(CAMPOS_CALIFICACION, _subconsultas_calificacion())},
+            **_nueva_version(),
+        )
+
+    def tocar(self):
+        """Sube la versión de los proyectos (cambió algo que se muestra de ellos)."""
+        return self.order_by().update(**_nueva_version())
+
+    def con_calificacion_desactualizada(self):
+        """Proyectos cuyas columnas almacenadas no coinciden con el cálculo actual."""
+        return self.with_rating().exclude(
+            superficie_total=F('superficie_muros'),
+            calificacion_estimada=F('calificacion_calculada'),
+            consumo_estimado=F('consumo_calculado'),
+        )
+
+    def with_total_muros(self):
+        """Anota total_muros con una subconsulta (sin GROUP BY sobre el queryset)."""
+        muros = Muro._base_manager.filter(proyecto=OuterRef('pk')).order_by().values('proyecto').annotate(
+            total=Count('pk')
+        )
+        return self.annotate(total_muros=Coalesce(Subquery(muros.values('total')), Value(0)))
+
+    def with_resultado(self):
+        """Anota la calificación oficial (ResultadoCEV) o NULL si el proyecto sigue en curso."""
+        return self.annotate(resultado_calificacion=F('resultados__calificacion'))
+
+
+class Proyecto(ConOrganizacion):
     """Modelo principal que representa la Vivienda o el Proyecto de Calificación Energética."""
     
     # Relaciones
@@ -78,15 +412,99 @@ class Proyecto(models.Model):
     descripcion = models.TextField(blank=True, null=True)
     fecha_inicio = models.DateField(default=date.today)
 
+    # Calificación estimada almacenada. La mantienen al día las señales de
+    # Muro y Material (ver gestion/signals.py); no se editan a mano.
+    superficie_total = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, editable=False,
+        verbose_name="Superficie Total de Muros (m²)"
+    )
+    conductividad_ponderada = models.FloatField(
+        null=True, blank=True, editable=False,
+        verbose_name="Conductividad Ponderada (W/mK)"
+    )
+    calificacion_estimada = models.CharField(
+        max_length=10, default=SIN_DATOS, editable=False,
+        verbose_name="Calificación Estimada"
+    )
+    consumo_estimado = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Consumo Estimado (kWh/m²)"
+    )
+    # Posición de calificacion_estimada en ORDEN_CALIFICACIONES (0 = A+). Es
+    # el orden "por calificación" del listado y el admin: la calificación puede
+    # salir de la transmitancia, así que la conductividad no sirve para ordenar.
+    rango_calificacion = models.GeneratedField(
+        expression=Case(
+            *[
+                When(calificacion_estimada=calificacion, then=Value(rango))
+                for rango, calificacion in enumerate(ORDEN_CALIFICACIONES)
+            ],
+            default=Value(len(ORDEN_CALIFICACIONES) - 1),
+        ),
+        output_field=models.PositiveSmallIntegerField(),
+        db_persist=True,
+        verbose_name="Rango de la Calificación Estimada",
+    )
+
+    # Sube con cualquier cambio del proyecto, sus muros, su resultado o sus
+    # sistemas (ver save(), ProyectoQuerySet.tocar y gestion/signals.py). Las
+    # plantillas la usan como clave de sus fragmentos en caché.
+    version = models.PositiveIntegerField(default=1, editable=False)
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Última Actualización")
+
+    objects = OrganizacionManager.from_queryset(ProyectoQuerySet)()
+
     class Meta:
         verbose_name_plural = "Proyectos"
         ordering = ['-fecha_inicio']
+        indexes = [
+            # Los mismos órdenes y filtros dentro de una organización: el costo
+            # depende de sus proyectos, no de los de toda la plataforma.
+            models.Index(fields=['organizacion', '-fecha_inicio', '-id'], name='proyecto_org_fecha_idx'),
+            models.Index(fields=['organizacion', 'tipo', '-fecha_inicio'], name='proyecto_org_tipo_idx'),
+            models.Index(
+                fields=['organizacion', 'calificacion_estimada', '-fecha_inicio'], name='proyecto_org_calif_idx',
+            ),
+            models.Index(
+                fields=['organizacion', 'rango_calificacion', '-fecha_inicio', '-id'],
+                name='proyecto_org_rango_idx',
+            ),
+            # Orden del listado y de su paginación por clave (fecha_inicio, id)
+            models.Index(fields=['-fecha_inicio', '-id'], name='proyecto_fecha_id_idx'),
+            # Filtros por cliente o tipo del listado y el admin, ya ordenados por fecha
+            models.Index(fields=['cliente', '-fecha_inicio'], name='proyecto_cliente_fecha_idx'),
+            models.Index(fields=['tipo', '-fecha_inicio'], name='proyecto_tipo_fecha_idx'),
+            # Orden "por calificación" del listado (ver ProyectoListView.ORDENES_KEYSET)
+            models.Index(
+                fields=['rango_calificacion', '-fecha_inicio', '-id'],
+                name='proyecto_rango_calif_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.nombre} ({self.get_estado_display()})"
 
+    @property
+    def clave_cache(self):
+        """Clave de los fragmentos en caché; la fecha distingue un pk reutilizado tras un borrado."""
+        return f"{self.pk}-{self.version}-{self.fecha_actualizacion:%Y%m%d%H%M%S%f}"
+
+    def save(self, *args, **kwargs):
+        existente = not self._state.adding
+        if existente:
+            # Incremento en SQL: dos guardados simultáneos no repiten versión.
+            self.version = F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'fecha_actualizacion'}
+        super().save(*args, **kwargs)
+        if existente:
+            self.refresh_from_db(fields=['version', 'fecha_actualizacion'])
+
     def get_estado_display(self):
         """Retorna el estado del proyecto basado en si tiene calificación."""
+        if hasattr(self, 'resultado_calificacion'):
+            if self.resultado_calificacion:
+                return f"Calificado ({self.resultado_calificacion})"
+            return "En Curso"
         try:
             resultado = self.resultados
             return f"Calificado ({resultado.calificacion})"
@@ -97,72 +515,70 @@ class Proyecto(models.Model):
     # MÉTODOS DE CÁLCULO ENERGÉTICO
     # ----------------------------------------
     
+    def actualizar_calificacion(self):
+        """Recalcula y recarga las columnas de calificación almacenadas."""
+        Proyecto.objects.filter(pk=self.pk).actualizar_calificacion()
+        self.refresh_from_db(fields=[*CAMPOS_CALIFICACION, 'version', 'fecha_actualizacion'])
+    
     def calcular_calificacion_energetica(self):
         """
         Calcula la calificación energética basada en:
         - Materiales aislantes
         - Superficie de muros
-        - Conductividad térmica
+        - Conductividad térmica, o la transmitancia U si todos los muros
+          tienen capas
+
+        Si el proyecto viene de ``Proyecto.objects.with_rating()`` se usa el
+        valor ya calculado en SQL; si no, se recorre cada muro en Python.
         """
+        if hasattr(self, 'calificacion_calculada'):
+            return self.calificacion_calculada
+        
         total_conductividad = 0
+        total_transmitancia = 0
         total_superficie = 0
+        con_capas = True
+        
+        from .referencias import REFERENCIAS
         
-        for muro in self.muros.all():
+        # Los materiales salen del caché de datos de referencia, sin JOIN.
+        for muro in REFERENCIAS.resolver(self.muros.all(), 'material_aislante'):
             total_conductividad += (
                 float(muro.material_aislante.conductividad) * 
                 float(muro.superficie)
             )
             total_superficie += float(muro.superficie)
+            if muro.transmitancia is None:
+                con_capas = False
+            else:
+                total_transmitancia += muro.transmitancia * float(muro.superficie)
         
         if total_superficie > 0:
-            promedio_conductividad = total_conductividad / total_superficie
-            
-            # Criterios de calificación energética
-            if promedio_conductividad < 0.5:
-                return 'A+'
-            elif promedio_conductividad < 1.0:
-                return 'A'
-            elif promedio_conductividad < 1.5:
-                return 'B'
-            elif promedio_conductividad < 2.0:
-                return 'C'
-            else:
-                return 'D'
+            if con_capas:
+                return calificacion_desde_transmitancia(total_transmitancia / total_superficie)
+            return calificacion_desde_conductividad(total_conductividad / total_superficie)
         
-        return 'Sin datos'
+        return SIN_DATOS
     
     def calcular_consumo_estimado(self):
         """Estima el consumo energético anual en kWh/m²."""
-        calificacion = self.calcular_calificacion_energetica()
-        
-        consumos = {
-            'A+': 50,
-            'A': 75,
-            'B': 100,
-            'C': 150,
-            'D': 200,
-            'Sin datos': 0
-        }
+        if hasattr(self, 'consumo_calculado'):
+            return self.consumo_calculado
         
-        return consumos.get(calificacion, 0)
+        calificacion = self.calcular_calificacion_energetica()
+        return CONSUMOS_ESTIMADOS.get(calificacion, 0)
     
     def get_badge_class(self):
         """Retorna la clase CSS para el badge según la calificación."""
+        if hasattr(self, 'resultado_calificacion'):
+            calificacion = self.resultado_calificacion or self.calificacion_estimada
+            return BADGES_CALIFICACION.get(calificacion, 'secondary')
         try:
             calificacion = self.resultados.calificacion
         except ObjectDoesNotExist:
-            calificacion = self.calcular_calificacion_energetica()
-        
-        badges = {
-            'A+': 'success',
-            'A': 'primary',
-            'B': 'info',
-            'C': 'warning',
-            'D': 'danger',
-            'Sin datos': 'secondary'
-        }
+            calificacion = self.calificacion_estimada
         
-        return badges.get(calificacion, 'secondary')
+        return BADGES_CALIFICACION.get(calificacion, 'secondary')
 
 
 # ----------------------------------------
@@ -186,29 +602,67 @@ class ResultadoCEV(models.Model):
     consumo_energia_anual = models.DecimalField(max_digits=8, decimal_places=2, verbose_name="Consumo Anual (kWh/m²)")
     fecha_calificacion = models.DateField(default=date.today)
 
+    objects = DeProyectoManager()
+
     class Meta:
         verbose_name = "Resultado CEV"
         verbose_name_plural = "Resultados CEV"
+        indexes = [
+            # Distribución del dashboard y filtros del admin
+            models.Index(fields=['calificacion', 'fecha_calificacion'], name='resultado_calif_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"Resultado de {self.proyecto.nombre}: {self.calificacion}"
     
     def get_badge_class(self):
         """Retorna la clase CSS para el badge según la calificación."""
-        badges = {
-            'A+': 'success',
-            'A': 'primary',
-            'B': 'info',
-            'C': 'warning',
-            'D': 'danger'
-        }
-        return badges.get(self.calificacion, 'secondary')
+        return BADGES_CALIFICACION.get(self.calificacion, 'secondary')
+
+
+class ProyectoBusqueda(models.Model):
+    """
+    Fila del índice de texto completo de un proyecto (FTS5 en SQLite,
+    tsvector en PostgreSQL). La tabla la crea la migración 0007 y la mantiene
+    gestion/busqueda.py; solo se usa para unir en las búsquedas.
+    """
+    proyecto = models.OneToOneField(
+        Proyecto, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', related_name='busqueda',
+    )
+
+    class Meta:
+        managed = False
+        db_table = 'gestion_proyecto_busqueda'
 
 
 # ----------------------------------------
 # 6. ENTIDAD RELACIONADA 1:N
 # ----------------------------------------
 
+class MuroQuerySet(models.QuerySet):
+    """QuerySet de muros con la transmitancia resuelta en SQL."""
+
+    def actualizar_transmitancia(self):
+        """
+        Recalcula en un único UPDATE la transmitancia almacenada de los muros:
+        U = 1 / (Rsi + Σ espesor/λ + Rse) sobre sus capas, o NULL sin capas.
+        Para millones de muros ver gestion/transmitancia.py (NumPy).
+        """
+        resistencia = CapaMuro._base_manager.filter(muro=OuterRef('pk')).order_by().values('muro').annotate(
+            total=Sum(
+                Cast('espesor', FloatField()) / NullIf(Cast('material__conductividad', FloatField()), Value(0.0))
+            )
+        ).values('total')
+        return self.order_by().update(transmitancia=ExpressionWrapper(
+            1.0 / (
+                Value(RESISTENCIA_SUPERFICIAL_INTERIOR + RESISTENCIA_SUPERFICIAL_EXTERIOR)
+                + Subquery(resistencia)
+            ),
+            output_field=FloatField(),
+        ))
+
+
 class Muro(models.Model):
     """Componente de la envolvente (muros, techos) asociado a un proyecto."""
     
@@ -217,11 +671,158 @@ class Muro(models.Model):
     material_aislante = models.ForeignKey(Material, on_delete=models.PROTECT, related_name='muros')
 
     # Campos
-    ubicacion = models.CharField(max_length=50, verbose_name="Ubicación (Norte, Sur, etc.)")
+    ubicacion = models.CharField(max_length=50, db_index=True, verbose_name="Ubicación (Norte, Sur, etc.)")
     superficie = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="Superficie (m²)")
+
+    # Transmitancia térmica calculada desde sus capas (NULL si no tiene). La
+    # mantienen al día las señales de CapaMuro y Material.
+    transmitancia = models.FloatField(
+        null=True, blank=True, editable=False, verbose_name="Transmitancia U (W/m²K)"
+    )
+
+    objects = DeProyectoManager.from_queryset(MuroQuerySet)()
     
     class Meta:
         verbose_name_plural = "Muros"
+        indexes = [
+            # Cubre la calificación por proyecto (material y superficie) sin leer la tabla
+            models.Index(
+                fields=['proyecto', 'material_aislante', 'superficie'],
+                name='muro_proyecto_material_idx',
+            ),
+        ]
     
     def __str__(self):
-        return f"Muro {self.ubicacion} del Proyecto {self.proyecto.nombre}"
\ No newline at end of file
+        return f"Muro {self.ubicacion} del Proyecto {self.proyecto.nombre}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Permite detectar en post_save si cambió algo que afecte la calificación.
+        instance._calificacion_original = instance.valores_calificacion()
+        return instance
+    
+    def valores_calificacion(self):
+        """Campos del muro que intervienen en la calificación del proyecto."""
+        return (
+            self.__dict__.get('proyecto_id'),
+            self.__dict__.get('material_aislante_id'),
+            self.__dict__.get('superficie'),
+        )
+
+
+class CapaMuroManager(OrganizacionManager):
+    campo_organizacion = 'muro__proyecto__organizacion'
+
+
+class CapaMuro(models.Model):
+    """Capa de un muro (de interior a exterior) con su material y espesor."""
+    muro = models.ForeignKey(Muro, on_delete=models.CASCADE, related_name='capas')
+    material = models.ForeignKey(Material, on_delete=models.PROTECT, related_name='capas')
+    espesor = models.DecimalField(
+        max_digits=6, decimal_places=3, validators=[MinValueValidator(Decimal('0.001'))],
+        verbose_name="Espesor (m)",
+    )
+    orden = models.PositiveSmallIntegerField(default=0, help_text="Posición de interior a exterior.")
+
+    objects = CapaMuroManager()
+
+    class Meta:
+        verbose_name = "Capa de muro"
+        verbose_name_plural = "Capas de muro"
+        ordering = ['muro', 'orden', 'pk']
+        indexes = [
+            # Cubre la resistencia por muro (material y espesor) sin leer la tabla
+            models.Index(fields=['muro', 'material', 'espesor'], name='capa_muro_material_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.material.nombre} {self.espesor} m"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Permite recalcular en post_save también el muro anterior si la capa se movió.
+        instance._muro_original = instance.__dict__.get('muro_id')
+        return instance
+
+
+# ----------------------------------------
+# 7. TAREAS EN SEGUNDO PLANO
+# ----------------------------------------
+
+class Tarea(ConOrganizacion):
+    """
+    Operación pesada (PDF, exportaciones, certificación…) encolada en la base
+    de datos; la ejecuta ``manage.py run_workers`` (ver gestion/tareas.py)
+    dentro de la organización que la encoló.
+    """
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    COMPLETADA = 'completada'
+    FALLIDA = 'fallida'
+    ESTADOS = (
+        (PENDIENTE, 'Pendiente'),
+        (EN_CURSO, 'En curso'),
+        (COMPLETADA, 'Completada'),
+        (FALLIDA, 'Fallida'),
+    )
+
+    # Identificador público: las URL de consulta y descarga no exponen el pk.
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='tareas_cev'
+    )
+
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
+    progreso = models.PositiveSmallIntegerField(default=0, verbose_name="Progreso (%)")
+    mensaje = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    # Ruta del archivo de resultado, relativa a settings.CEV_TAREAS_DIR
+    archivo = models.CharField(max_length=255, blank=True)
+
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=3)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    trabajador = models.CharField(max_length=100, blank=True)
+    # Lo renueva el trabajador mientras avanza; sin latido reciente la tarea se da por abandonada.
+    latido = models.DateTimeField(null=True, blank=True)
+
+    creada = models.DateTimeField(auto_now_add=True)
+    iniciada = models.DateTimeField(null=True, blank=True)
+    terminada = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Tareas"
+        ordering = ['-creada']
+        indexes = [
+            # Búsqueda de la siguiente tarea a reclamar
+            models.Index(fields=['estado', 'disponible_desde'], name='tarea_estado_disponible_idx'),
+            # Admin de tareas de una organización
+            models.Index(fields=['organizacion', '-creada'], name='tarea_org_creada_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.get_estado_display()})"
+
+
+# ----------------------------------------
+# 8. VERSIONES COMPARTIDAS ENTRE PROCESOS
+# ----------------------------------------
+
+class ContadorVersion(models.Model):
+    """
+    Número que sube cada vez que cambia un conjunto de datos; los procesos
+    comparan su copia en memoria con él (ver gestion/referencias.py).
+    """
+    clave = models.CharField(max_length=50, primary_key=True)
+    valor = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Contador de versión"
+        verbose_name_plural = "Contadores de versión"
+
+    def __str__(self):
+        return f"{self.clave} v{self.valor}"
@@ -0,0 +1,94 @@
+# gestion/organizaciones.py
+"""
+Organización (tenant) en curso.
+
+Cada cliente del SaaS es una ``Organizacion``; sus clientes, proyectos,
+materiales, sistemas y tareas llevan su FK. ``OrganizacionMiddleware``
+la resuelve en cada petición y los managers de gestion/models.py filtran
+todas las consultas por ella, así que una vista nunca ve filas de otra
+organización ni recorre los datos de toda la plataforma.
+
+* Sin organización en curso (comandos, trabajadores fuera de una tarea,
+  superusuarios sin organización) las consultas no se filtran.
+* Las tareas guardan la organización que las encoló y se ejecutan dentro de
+  ella (ver gestion/tareas.py).
+* Las claves del caché que dependen de los datos de la organización se
+  arman con ``clave_organizacion``.
+* Las organizaciones de cada usuario (y si es superusuario) se guardan en el
+  caché bajo la versión de las membresías, que cambia al agregar o quitar
+  miembros o borrar una organización; guardar el usuario descarta la suya
+  (señales en gestion/signals.py). Resolver la organización no cuesta más
+  consultas que leer la sesión.
+
+Este módulo no importa los modelos: lo usan los propios managers.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+
+CLAVE_VERSION_MIEMBROS = 'gestion:organizaciones:miembros:version'
+
+# pk de la organización en curso, o None (sin filtro).
+_actual = ContextVar('organizacion_actual', default=None)
+
+
+def organizacion_actual():
+    """pk de la organización en curso, o None si las consultas no se filtran."""
+    return _actual.get()
+
+
+def activar(organizacion):
+    """
+    Fija la organización (instancia, pk o None) del contexto en curso. El
+    middleware no la restablece al devolver la respuesta (las respuestas en
+    streaming siguen leyendo después): lo hace ``desactivar`` al cerrarla.
+    """
+    _actual.set(getattr(organizacion, 'pk', organizacion))
+
+
+def desactivar(**kwargs):
+    """Deja de filtrar por organización (receptor de request_finished, ver gestion/signals.py)."""
+    _actual.set(None)
+
+
+@contextmanager
+def en_organizacion(organizacion):
+    """Ejecuta el bloque con ``organizacion`` (instancia, pk o None) en curso."""
+    token = _actual.set(getattr(organizacion, 'pk', organizacion))
+    try:
+        yield
+    finally:
+        _actual.reset(token)
+
+
+def clave_organizacion(clave, organizacion=None):
+    """``clave`` con el espacio de la organización (por defecto la en curso): ``clave:org:3`` o ``clave:org:todas``."""
+    if organizacion is None:
+        organizacion = organizacion_actual()
+    return f"{clave}:org:{organizacion or 'todas'}"
+
+
+def version_miembros():
+    version = cache.get(CLAVE_VERSION_MIEMBROS)
+    if version is None:
+        # Como en gestion/fragmentos.py: un número que no se repite tras vaciar el caché.
+        cache.add(CLAVE_VERSION_MIEMBROS, time.time_ns(), None)
+        version = cache.get(CLAVE_VERSION_MIEMBROS)
+    return version
+
+
+def clave_miembro(usuario):
+    """Clave del caché con las organizaciones del usuario ``usuario`` (pk)."""
+    return f'gestion:organizaciones:miembro:{usuario}:{version_miembros()}'
+
+
+def invalidar_usuario(instance, **kwargs):
+    """Receptor de post_save/post_delete del usuario: sus permisos pueden haber cambiado."""
+    cache.delete(clave_miembro(instance.pk))
+
+
+def invalidar_miembros(**kwargs):
+    """Cambia la versión de las membresías (se usa también como receptor de señales)."""
+    cache.set(CLAVE_VERSION_MIEMBROS, time.time_ns(), None)
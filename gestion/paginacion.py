@@ -0,0 +1,172 @@
+# gestion/paginacion.py
+"""
+Paginación por clave (keyset / seek) para listados grandes.
+
+En vez de ``OFFSET`` cada página filtra "después de la última fila vista"
+sobre un orden total (siempre termina en ``id``), así que la página N cuesta
+lo mismo que la primera. La posición viaja en un token firmado y opaco con
+los valores de orden de la fila frontera.
+"""
+from django.core import signing
+from django.db import connection
+from django.db.models import F, Q
+
+SALT_CURSOR = 'gestion.paginacion.cursor'
+
+
+class CursorInvalido(Exception):
+    """El token de página está alterado o pertenece a otro orden."""
+
+
+class PaginaKeyset:
+    """Una página de resultados con los tokens para avanzar y retroceder."""
+
+    def __init__(self, object_list, siguiente=None, anterior=None, total=None, total_estimado=False):
+        self.object_list = object_list
+        self.siguiente = siguiente
+        self.anterior = anterior
+        self.total = total
+        self.total_estimado = total_estimado
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.siguiente is not None
+
+    def has_previous(self):
+        return self.anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class PaginadorKeyset:
+    """
+    Pagina ``queryset`` según ``orden``: una lista de ``(campo, descendente)``
+    que debe terminar en un campo único. Los campos ascendentes pueden ser
+    nulos (se ordenan al final); los descendentes se suponen no nulos.
+    ``nombre`` identifica el orden dentro del token para rechazar tokens de
+    otro listado u otro criterio.
+    """
+
+    def __init__(self, queryset, orden, por_pagina, nombre):
+        self.queryset = queryset
+        self.orden = orden
+        self.por_pagina = por_pagina
+        self.nombre = nombre
+
+    # --- tokens ---
+
+    def token(self, objeto, direccion):
+        # Las filas pueden ser instancias o diccionarios de .values()
+        if isinstance(objeto, dict):
+            valores = [self._serializar(objeto[campo]) for campo, _ in self.orden]
+        else:
+            valores = [self._serializar(getattr(objeto, campo)) for campo, _ in self.orden]
+        return signing.dumps([self.nombre, direccion, valores], salt=SALT_CURSOR, compress=True)
+
+    def leer_token(self, token):
+        try:
+            nombre, direccion, valores = signing.loads(token, salt=SALT_CURSOR)
+        except (signing.BadSignature, ValueError, TypeError):
+            raise CursorInvalido(token)
+        if nombre != self.nombre or direccion not in ('>', '<') or len(valores) != len(self.orden):
+            raise CursorInvalido(token)
+        return direccion, valores
+
+    @staticmethod
+    def _serializar(valor):
+        return valor.isoformat() if hasattr(valor, 'isoformat') else valor
+
+    # --- consultas ---
+
+    def _ordenar(self, queryset, invertido):
+        expresiones = []
+        for campo, descendente in self.orden:
+            # Ascendente va con NULLS LAST; invertido, descendente con NULLS FIRST.
+            if descendente != invertido:
+                expresiones.append(F(campo).desc(nulls_first=invertido or None))
+            else:
+                expresiones.append(F(campo).asc(nulls_last=not invertido or None))
+        return queryset.order_by(*expresiones)
+
+    def _despues(self, campo, descendente, valor, invertido):
+        """Condición "viene después de ``valor``" en la dirección recorrida, o None si nada viene después."""
+        if descendente != invertido:
+            if valor is None:
+                return Q(**{f'{campo}__isnull': False}) if invertido else None
+            return Q(**{f'{campo}__lt': valor})
+        if valor is None:
+            return None
+        if invertido:
+            return Q(**{f'{campo}__gt': valor})
+        return Q(**{f'{campo}__gt': valor}) | Q(**{f'{campo}__isnull': True})
+
+    def _filtro(self, valores, invertido):
+        condicion = Q(pk__in=[])
+        iguales = Q()
+        for (campo, descendente), valor in zip(self.orden, valores):
+            despues = self._despues(campo, descendente, valor, invertido)
+            if despues is not None:
+                condicion |= iguales & despues
+            iguales &= Q(**{f'{campo}__isnull': True} if valor is None else {campo: valor})
+        return condicion
+
+    def _consulta(self, token):
+        """(queryset de la página con una fila extra, dirección inversa) para ``token``."""
+        direccion = '>'
+        queryset = self.queryset
+        if token:
+            direccion, valores = self.leer_token(token)
+            queryset = queryset.filter(self._filtro(valores, invertido=direccion == '<'))
+        invertido = direccion == '<'
+        return self._ordenar(queryset, invertido)[:self.por_pagina + 1], invertido
+
+    def _armar(self, filas, token, invertido):
+        hay_mas = len(filas) > self.por_pagina
+        filas = filas[:self.por_pagina]
+        if invertido:
+            filas.reverse()
+        if not filas:
+            return PaginaKeyset([])
+
+        # Hacia adelante, hay página anterior si se llegó con un token; hacia
+        # atrás, siempre hay siguiente (de ahí se vino).
+        siguiente = hay_mas if not invertido else True
+        anterior = bool(token) if not invertido else hay_mas
+        return PaginaKeyset(
+            filas,
+            siguiente=self.token(filas[-1], '>') if siguiente else None,
+            anterior=self.token(filas[0], '<') if anterior else None,
+        )
+
+    def pagina(self, token=None):
+        """Devuelve la ``PaginaKeyset`` indicada por ``token`` (None = primera página)."""
+        queryset, invertido = self._consulta(token)
+        return self._armar(list(queryset), token, invertido)
+
+    async def apagina(self, token=None):
+        """Versión async de ``pagina``."""
+        queryset, invertido = self._consulta(token)
+        return self._armar([fila async for fila in queryset], token, invertido)
+
+
+def estimar_total(queryset):
+    """
+    Total aproximado sin ``COUNT(*)``: en PostgreSQL, y solo para la tabla sin
+    filtrar, se lee la estadística ``reltuples`` del planificador. En otros
+    casos devuelve None.
+    """
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        fila = cursor.fetchone()
+    return fila[0] if fila and fila[0] >= 0 else None
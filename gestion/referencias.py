@@ -0,0 +1,190 @@
+# gestion/referencias.py
+"""
+Caché en memoria del proceso para los datos de referencia: Material,
+TipoProyecto y SistemaClimatizacion.
+
+Son tablas chicas que casi nunca cambian, pero se leían (o se unían con JOIN)
+en casi cada petición. ``REFERENCIAS`` guarda cada tabla completa como
+``{pk: instancia}`` y resuelve las FK y el M2M con sistemas desde memoria.
+
+* La versión vive en la base de datos (``ContadorVersion``), así que la
+  comparten todos los procesos y servidores. Las señales la suben al guardar
+  o borrar cualquiera de los tres modelos (ver gestion/signals.py).
+* Cada proceso la compara con la suya como mucho una vez por petición (una
+  consulta de una fila; la petición la marca ``ReferenciasMiddleware``), o
+  cada ``CEV_REFERENCIAS_REVISION_SEGUNDOS`` por hilo fuera de una petición
+  (comandos, trabajadores). Si cambió, descarta sus tablas y las vuelve a
+  cargar cuando se pidan.
+* ``update()`` y ``bulk_create`` no disparan señales: después de usarlos
+  sobre estos modelos hay que llamar a ``REFERENCIAS.invalidar()``.
+* Material y SistemaClimatizacion pertenecen a una organización (o al
+  catálogo común): se guarda una tabla por organización en curso, con lo que
+  ve su manager (ver gestion/organizaciones.py).
+* Aciertos y fallos por modelo se exponen en /metrics
+  (``cev_referencias_cache_total``).
+
+Las instancias se comparten entre hilos: son de solo lectura.
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.models import F
+
+from .metricas import REFERENCIAS_CACHE
+from .models import ConOrganizacion, ContadorVersion, Material, SistemaClimatizacion, TipoProyecto
+from .organizaciones import organizacion_actual
+
+
+class CacheReferencias:
+    """Tablas de referencia en memoria, válidas mientras no cambie su versión en la base de datos."""
+
+    def __init__(self, clave='referencias', modelos=(Material, TipoProyecto, SistemaClimatizacion)):
+        self.clave = clave
+        self.modelos = modelos
+        self._lock = threading.Lock()
+        self._version = None
+        self._generacion = 0
+        self._tablas = {}
+        # Estado de la petición en curso ({'revisada': momento o None}). Es un
+        # dict mutable: las copias del contexto (sync_to_async, gather) lo comparten.
+        self._peticion = ContextVar(f'referencias_{clave}_peticion', default=None)
+        self._hilo = threading.local()
+
+    # ----------------------------------------
+    # VERSIÓN
+    # ----------------------------------------
+
+    def version(self):
+        return ContadorVersion.objects.filter(clave=self.clave).values_list('valor', flat=True).first() or 0
+
+    def _estado(self):
+        estado = self._peticion.get()
+        if estado is None:
+            # Fuera de una petición: por hilo, con revisión periódica.
+            estado = self._hilo.__dict__.setdefault('estado', {'revisada': None, 'peticion': False})
+        return estado
+
+    def revisar(self):
+        """Descarta las tablas si la versión de la base de datos cambió."""
+        estado = self._estado()
+        revisada = estado['revisada']
+        ahora = time.monotonic()
+        if revisada is not None and (
+            estado['peticion'] or ahora - revisada < settings.CEV_REFERENCIAS_REVISION_SEGUNDOS
+        ):
+            return
+        version = self.version()
+        estado['revisada'] = ahora
+        with self._lock:
+            if version != self._version:
+                self._vaciar()
+                self._version = version
+
+    def nueva_peticion(self):
+        """Empieza una petición: su primera lectura revisa la versión. Devuelve el token para ``fin_peticion``."""
+        return self._peticion.set({'revisada': None, 'peticion': True})
+
+    def fin_peticion(self, token):
+        self._peticion.reset(token)
+
+    def invalidar(self, **kwargs):
+        """
+        Sube la versión en la base de datos (los demás procesos descartan sus
+        copias en su próxima revisión) y vacía la de este proceso. Se usa
+        también como receptor de señales.
+        """
+        if not ContadorVersion.objects.filter(clave=self.clave).update(valor=F('valor') + 1):
+            ContadorVersion.objects.get_or_create(clave=self.clave, defaults={'valor': 1})
+        with self._lock:
+            self._vaciar()
+            self._version = None
+        self._estado()['revisada'] = None
+
+    def _vaciar(self):
+        self._tablas = {}
+        # Una carga que empezó antes de vaciar no se guarda (ver tabla()).
+        self._generacion += 1
+
+    # ----------------------------------------
+    # LECTURA
+    # ----------------------------------------
+
+    def tabla(self, modelo):
+        """``{pk: instancia}`` de ``modelo``, en orden de pk."""
+        self.revisar()
+        nombre = modelo._meta.model_name
+        clave = (modelo, organizacion_actual() if issubclass(modelo, ConOrganizacion) else None)
+        tabla = self._tablas.get(clave)
+        if tabla is not None:
+            REFERENCIAS_CACHE.inc(nombre, 'acierto')
+            return tabla
+        REFERENCIAS_CACHE.inc(nombre, 'fallo')
+        generacion = self._generacion
+        tabla = {instancia.pk: instancia for instancia in modelo.objects.order_by('pk')}
+        with self._lock:
+            if generacion == self._generacion:
+                self._tablas[clave] = tabla
+        return tabla
+
+    def todos(self, modelo):
+        return list(self.tabla(modelo).values())
+
+    def obtener(self, modelo, pk):
+        """Instancia de ``modelo`` con ese pk; si no está en la tabla (recién creada en otro proceso) se lee de la base de datos."""
+        try:
+            return self.tabla(modelo)[pk]
+        except KeyError:
+            REFERENCIAS_CACHE.inc(modelo._meta.model_name, 'fallo')
+            return modelo.objects.get(pk=pk)
+
+    def resolver(self, objetos, campo):
+        """
+        Asigna desde el caché la FK ``campo`` de cada objeto, como haría
+        ``select_related`` pero sin el JOIN. Devuelve los objetos en una lista.
+        """
+        objetos = list(objetos)
+        if not objetos:
+            return objetos
+        relacion = objetos[0]._meta.get_field(campo)
+        tabla = self.tabla(relacion.related_model)
+        for objeto in objetos:
+            pk = getattr(objeto, relacion.attname)
+            if pk is not None:
+                relacion.set_cached_value(
+                    objeto, tabla[pk] if pk in tabla else self.obtener(relacion.related_model, pk)
+                )
+        return objetos
+
+    def relacionados(self, objeto, campo):
+        """
+        Instancias del M2M ``campo`` de ``objeto`` (p. ej. los sistemas de un
+        proyecto): una consulta a la tabla intermedia, sin JOIN.
+        """
+        relacion = objeto._meta.get_field(campo)
+        intermedia = relacion.remote_field.through
+        pks = list(intermedia.objects.filter(**{relacion.m2m_field_name(): objeto.pk}).values_list(
+            relacion.m2m_reverse_field_name(), flat=True
+        ))
+        if not pks:
+            return []
+        modelo = relacion.related_model
+        tabla = self.tabla(modelo)
+        return sorted(
+            (tabla[pk] if pk in tabla else self.obtener(modelo, pk) for pk in pks),
+            key=lambda instancia: instancia.pk,
+        )
+
+    def estadisticas(self):
+        """Aciertos y fallos acumulados por modelo en este proceso."""
+        return {
+            modelo._meta.model_name: {
+                resultado: REFERENCIAS_CACHE.valor(modelo._meta.model_name, resultado)
+                for resultado in ('acierto', 'fallo')
+            }
+            for modelo in self.modelos
+        }
+
+
+REFERENCIAS = CacheReferencias()
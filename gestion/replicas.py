@@ -0,0 +1,199 @@
+# gestion/replicas.py
+"""
+Réplicas de lectura para las vistas de solo lectura más pesadas: dashboard,
+listado, exportación y reportes PDF.
+
+* ``settings.CEV_REPLICAS`` lista los alias de DATABASES que replican a
+  'default' (localmente, archivos SQLite copiados con manage.py sync_replicas;
+  ver settings.py). Sin réplicas el router no interviene.
+* Solo leen de una réplica las vistas con ``LecturaEnReplicaMixin``. La réplica
+  se elige al azar una vez por petición; toda escritura, las lecturas dentro
+  de una transacción y las del resto de las vistas van a 'default'.
+* Leer lo propio: la petición que escribe (método no seguro o cualquier
+  escritura por el ORM) deja la cookie ``cev_primaria`` y ese navegador lee de
+  'default' durante ``CEV_REPLICAS_PEGAJOSIDAD_SEGUNDOS``.
+* Retraso: la primaria guarda un latido (``ContadorVersion`` 'latido_replicas',
+  en milisegundos) cada ``CEV_REPLICAS_REVISION_SEGUNDOS``, y cada proceso
+  compara con él el de cada réplica con la misma frecuencia. Una réplica a la
+  que le falta un latido de hace más de ``CEV_REPLICAS_RETRASO_MAXIMO_SEGUNDOS``,
+  o que no responde, se deja de usar hasta la siguiente revisión; sin réplicas
+  sanas se lee de 'default'.
+* Lecturas por base y motivo en /metrics (``cev_replicas_peticiones_total``).
+"""
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .metricas import REPLICAS_PETICIONES
+from .models import ContadorVersion
+
+COOKIE_PRIMARIA = 'cev_primaria'
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class Replicas:
+    """Elección de la base de lectura por petición y estado de retraso de cada réplica."""
+
+    def __init__(self, clave='latido_replicas'):
+        self.clave = clave
+        self._lock = threading.Lock()
+        self._revisada = None
+        self._sanas = []
+        self.retrasos = {}
+        # Estado de la petición en curso: dict mutable, compartido con las copias del contexto.
+        self._peticion = ContextVar('replicas_peticion', default=None)
+
+    @property
+    def aliases(self):
+        return settings.CEV_REPLICAS
+
+    # ----------------------------------------
+    # PETICIÓN
+    # ----------------------------------------
+
+    def nueva_peticion(self, request):
+        # Sin reset al terminar: las respuestas en streaming (exportación) leen
+        # después de que el middleware devolvió la respuesta. La siguiente
+        # petición del hilo reemplaza el estado.
+        self._peticion.set({
+            'lectura': False,
+            'primaria': COOKIE_PRIMARIA in request.COOKIES,
+            'escribio': request.method not in METODOS_SEGUROS,
+            'base': None,
+        })
+
+    def leer_en_replica(self):
+        """La vista en curso es de solo lectura: sus lecturas pueden ir a una réplica."""
+        estado = self._peticion.get()
+        if estado is not None:
+            estado['lectura'] = True
+
+    def responder(self, response):
+        """Después de escribir, las lecturas de este navegador van a la primaria por un tiempo."""
+        estado = self._peticion.get()
+        if self.aliases and estado is not None and estado['escribio']:
+            response.set_cookie(
+                COOKIE_PRIMARIA, '1', max_age=settings.CEV_REPLICAS_PEGAJOSIDAD_SEGUNDOS,
+                httponly=True, samesite='Lax',
+            )
+
+    def base_de_lectura(self):
+        """Alias de la base de la que lee la petición en curso, o None si no está decidido."""
+        estado = self._peticion.get()
+        return None if estado is None else estado['base']
+
+    # ----------------------------------------
+    # ROUTER
+    # ----------------------------------------
+
+    def lectura(self):
+        estado = self._peticion.get()
+        if not self.aliases or estado is None or not estado['lectura']:
+            return None
+        if estado['escribio'] or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if estado['base'] is None:
+            if estado['primaria']:
+                estado['base'], motivo = DEFAULT_DB_ALIAS, 'pegajosa'
+            else:
+                sanas = self.sanas()
+                estado['base'], motivo = (random.choice(sanas), 'replica') if sanas else (DEFAULT_DB_ALIAS, 'retraso')
+            REPLICAS_PETICIONES.inc(estado['base'], motivo)
+        return estado['base']
+
+    def escritura(self):
+        estado = self._peticion.get()
+        if estado is not None:
+            estado['escribio'] = True
+
+    # ----------------------------------------
+    # RETRASO
+    # ----------------------------------------
+
+    def sanas(self):
+        """Réplicas con retraso aceptable, revisadas como mucho cada CEV_REPLICAS_REVISION_SEGUNDOS."""
+        ahora = time.monotonic()
+        with self._lock:
+            if self._revisada is not None and ahora - self._revisada < settings.CEV_REPLICAS_REVISION_SEGUNDOS:
+                return self._sanas
+            # Los demás hilos siguen con la lista anterior mientras este revisa.
+            self._revisada = ahora
+        self._sanas = self.revisar()
+        return self._sanas
+
+    def revisar(self):
+        """Mide el retraso de cada réplica (segundos, None si no responde) y devuelve las sanas."""
+        latido = self.latido()
+        sanas = []
+        for alias in self.aliases:
+            try:
+                replicado = ContadorVersion.objects.using(alias).filter(clave=self.clave).values_list(
+                    'valor', flat=True
+                ).first()
+            except DatabaseError:
+                replicado = None
+            if replicado is None:
+                retraso = None
+            elif replicado >= latido:
+                retraso = 0.0
+            else:
+                # Le falta al menos el último latido: atrasa desde que se escribió.
+                retraso = max(0.0, time.time() - latido / 1000)
+            self.retrasos[alias] = retraso
+            if retraso is not None and retraso <= settings.CEV_REPLICAS_RETRASO_MAXIMO_SEGUNDOS:
+                sanas.append(alias)
+        return sanas
+
+    def latido(self):
+        """Último latido de la primaria (ms); escribe uno nuevo si ya pasó el intervalo de revisión."""
+        ahora = int(time.time() * 1000)
+        primaria = ContadorVersion.objects.using(DEFAULT_DB_ALIAS)
+        anterior = primaria.filter(clave=self.clave).values_list('valor', flat=True).first()
+        if anterior is None:
+            primaria.get_or_create(clave=self.clave, defaults={'valor': ahora})
+            return ahora
+        if ahora - anterior >= settings.CEV_REPLICAS_REVISION_SEGUNDOS * 1000:
+            # Si otro proceso se adelantó, el UPDATE no cambia nada.
+            primaria.filter(clave=self.clave, valor=anterior).update(valor=ahora)
+        # Las réplicas se comparan con el anterior: el nuevo aún no alcanza a replicarse.
+        return anterior
+
+
+REPLICAS = Replicas()
+
+
+class RouterReplicas:
+    """Router de DATABASE_ROUTERS: lecturas de las vistas marcadas a una réplica, escrituras a 'default'."""
+
+    def db_for_read(self, model, **hints):
+        return REPLICAS.lectura()
+
+    def db_for_write(self, model, **hints):
+        if not REPLICAS.aliases:
+            return None
+        REPLICAS.escritura()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {DEFAULT_DB_ALIAS, *REPLICAS.aliases}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema con los datos.
+        if db != DEFAULT_DB_ALIAS and db in REPLICAS.aliases:
+            return False
+        return None
+
+
+class LecturaEnReplicaMixin:
+    """Vistas de solo lectura: sus consultas pueden ir a una réplica (ver gestion/replicas.py)."""
+
+    def dispatch(self, request, *args, **kwargs):
+        REPLICAS.leer_en_replica()
+        return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,296 @@
+# gestion/reportes.py
+"""
+Generación de reportes PDF (reportlab) de proyectos, individual o por lotes.
+
+El dibujo trabaja sobre diccionarios simples (ver ``datos_reportes``) para que
+los lotes se puedan repartir entre procesos sin volver a consultar la base de
+datos. Este módulo no importa modelos al cargarse: los procesos hijos pueden
+usarlo sin inicializar Django.
+"""
+import hashlib
+import io
+import itertools
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import F
+
+from .metricas import medir_render_pdf
+
+# Cantidad de reportes que se envían juntos a cada proceso.
+REPORTES_POR_TAREA = 16
+
+# Se incluye en la clave de caché: subirla invalida todos los PDF guardados
+# cuando cambia el diseño del reporte.
+VERSION_REPORTE = 1
+
+
+def datos_reportes(queryset, chunk_size=2000):
+    """Todo lo que necesita el reporte, en una consulta con JOINs leída por lotes."""
+    return queryset.order_by('pk').values(
+        'pk',
+        'nombre',
+        'fecha_inicio',
+        'calificacion_estimada',
+        'consumo_estimado',
+        cliente_nombre=F('cliente__nombre'),
+        tipo_nombre=F('tipo__nombre'),
+        resultado_calificacion=F('resultados__calificacion'),
+        resultado_consumo=F('resultados__consumo_energia_anual'),
+    ).iterator(chunk_size=chunk_size)
+
+
+def datos_reporte(proyecto):
+    """
+    Los mismos datos de ``datos_reportes`` a partir de una instancia ya
+    cargada; el tipo sale del caché de datos de referencia.
+    """
+    from .models import TipoProyecto
+    from .referencias import REFERENCIAS
+
+    try:
+        resultado = proyecto.resultados
+    except ObjectDoesNotExist:
+        resultado = None
+    return {
+        'pk': proyecto.pk,
+        'nombre': proyecto.nombre,
+        'fecha_inicio': proyecto.fecha_inicio,
+        'calificacion_estimada': proyecto.calificacion_estimada,
+        'consumo_estimado': proyecto.consumo_estimado,
+        'cliente_nombre': proyecto.cliente.nombre,
+        'tipo_nombre': REFERENCIAS.obtener(TipoProyecto, proyecto.tipo_id).nombre,
+        'resultado_calificacion': resultado.calificacion if resultado else None,
+        'resultado_consumo': resultado.consumo_energia_anual if resultado else None,
+    }
+
+
+def nombre_reporte(datos):
+    """Nombre de archivo único y seguro para el reporte."""
+    nombre = re.sub(r'[^\w-]+', '_', datos['nombre']).strip('_')
+    return f"reporte_{datos['pk']}_{nombre}.pdf"
+
+
+def dibujar_reporte(p, datos):
+    """Dibuja el reporte de un proyecto en el canvas ``p``."""
+    # Título
+    p.setFont("Helvetica-Bold", 20)
+    p.drawString(100, 750, f"Reporte CEV: {datos['nombre']}")
+
+    # Información del proyecto
+    p.setFont("Helvetica", 12)
+    y = 700
+    p.drawString(100, y, f"Cliente: {datos['cliente_nombre']}")
+    y -= 20
+    p.drawString(100, y, f"Tipo: {datos['tipo_nombre']}")
+    y -= 20
+    p.drawString(100, y, f"Fecha de Inicio: {datos['fecha_inicio']}")
+    y -= 30
+
+    # Calificación
+    if datos['resultado_calificacion']:
+        p.setFont("Helvetica-Bold", 16)
+        p.drawString(100, y, f"Calificación: {datos['resultado_calificacion']}")
+        y -= 25
+        p.setFont("Helvetica", 12)
+        p.drawString(100, y, f"Consumo: {datos['resultado_consumo']} kWh/m²")
+    else:
+        p.setFont("Helvetica-Bold", 16)
+        p.drawString(100, y, f"Calificación Estimada: {datos['calificacion_estimada']}")
+        y -= 25
+        p.setFont("Helvetica", 12)
+        p.drawString(100, y, f"Consumo Estimado: {datos['consumo_estimado']} kWh/m²")
+
+    p.showPage()
+    p.save()
+
+
+def renderizar_pdf(datos):
+    """Devuelve (nombre de archivo, bytes del PDF). Requiere reportlab."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    with medir_render_pdf():
+        dibujar_reporte(canvas.Canvas(buffer, pagesize=letter), datos)
+    return nombre_reporte(datos), buffer.getvalue()
+
+
+def generar_reportes(datos, guardar, workers=None, progreso=None):
+    """
+    Renderiza cada elemento de ``datos`` y llama ``guardar(nombre, pdf)`` en el
+    proceso actual. Con más de un worker el renderizado se reparte en un
+    ProcessPoolExecutor; la entrada se consume por ventanas para que la memoria
+    no crezca con el total. Devuelve la cantidad de reportes generados.
+    """
+    workers = workers or os.cpu_count() or 1
+    datos = iter(datos)
+    generados = 0
+    inicio = time.monotonic()
+
+    if workers == 1:
+        for item in datos:
+            guardar(*renderizar_pdf(item))
+            generados += 1
+            if progreso and generados % 100 == 0:
+                progreso(generados, time.monotonic() - inicio)
+        if progreso and generados % 100:
+            progreso(generados, time.monotonic() - inicio)
+    else:
+        ventana = workers * REPORTES_POR_TAREA * 4
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                lote = list(itertools.islice(datos, ventana))
+                if not lote:
+                    break
+                for nombre, pdf in pool.map(renderizar_pdf, lote, chunksize=REPORTES_POR_TAREA):
+                    guardar(nombre, pdf)
+                generados += len(lote)
+                if progreso:
+                    progreso(generados, time.monotonic() - inicio)
+
+    return generados
+
+
+# ----------------------------------------
+# CACHÉ DE PDF DIRECCIONADA POR CONTENIDO
+# ----------------------------------------
+
+def muros_reporte(proyecto):
+    """Muros y materiales del proyecto que forman parte de la clave del reporte."""
+    from .models import Material
+    from .referencias import REFERENCIAS
+
+    muros = []
+    for ubicacion, superficie, material_id in proyecto.muros.order_by('pk').values_list(
+        'ubicacion', 'superficie', 'material_aislante_id',
+    ):
+        material = REFERENCIAS.obtener(Material, material_id)
+        muros.append([ubicacion, superficie, material.nombre, material.conductividad])
+    return muros
+
+
+def clave_reporte(datos, muros):
+    """
+    Hash SHA-256 de todo lo que determina el PDF: datos del proyecto, cliente,
+    tipo y resultado, más sus muros y materiales. Si cualquiera cambia, la
+    clave cambia y la entrada anterior deja de usarse (la elimina el LRU).
+    """
+    contenido = json.dumps(
+        {'version': VERSION_REPORTE, 'datos': datos, 'muros': muros},
+        sort_keys=True, default=str, ensure_ascii=False,
+    )
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+# Tamaño de cada directorio de caché que lleva este proceso: directorio ->
+# [bytes, escrituras desde el último recorrido]. Se recorre el directorio
+# completo solo al pasar el presupuesto o cada REVISAR_CADA escrituras (para
+# sumar lo que escribieron otros procesos), no en cada PDF guardado.
+_USO = {}
+_USO_LOCK = threading.Lock()
+REVISAR_CADA = 100
+
+
+class CacheReportes:
+    """
+    PDF guardados en disco como ``<dir>/<ab>/<clave>.pdf``. La fecha de
+    modificación del archivo es su Last-Modified y la de acceso marca el uso
+    para el desalojo LRU, que mantiene el directorio bajo ``max_bytes``.
+    """
+
+    def __init__(self, directorio, max_bytes):
+        self.directorio = Path(directorio)
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def desde_settings(cls):
+        from django.conf import settings
+
+        return cls(settings.CEV_REPORTES_CACHE_DIR, settings.CEV_REPORTES_CACHE_MAX_BYTES)
+
+    def ruta(self, clave):
+        return self.directorio / clave[:2] / f"{clave}.pdf"
+
+    def modificado(self, clave):
+        """Timestamp de creación de la entrada, o None si no está en caché."""
+        try:
+            return int(self.ruta(clave).stat().st_mtime)
+        except FileNotFoundError:
+            return None
+
+    def obtener(self, clave):
+        """Bytes del PDF o None. Un acierto lo marca como recién usado."""
+        ruta = self.ruta(clave)
+        try:
+            pdf = ruta.read_bytes()
+            os.utime(ruta, (time.time(), ruta.stat().st_mtime))
+        except FileNotFoundError:
+            return None
+        return pdf
+
+    def obtener_o_renderizar(self, clave, datos):
+        """Bytes del PDF desde la caché, o lo renderiza y lo guarda."""
+        pdf = self.obtener(clave)
+        if pdf is None:
+            _, pdf = renderizar_pdf(datos)
+            self.guardar(clave, pdf)
+        return pdf
+
+    def guardar(self, clave, pdf):
+        """Escribe la entrada de forma atómica y luego aplica el límite de tamaño."""
+        ruta = self.ruta(clave)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            anterior = ruta.stat().st_size
+        except FileNotFoundError:
+            anterior = 0
+        descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(pdf)
+        os.replace(temporal, ruta)
+        self.sumar(len(pdf) - anterior)
+
+    def sumar(self, bytes_agregados):
+        """Suma una escritura al tamaño llevado en memoria y desaloja solo si hace falta."""
+        with _USO_LOCK:
+            uso = _USO.get(self.directorio)
+            if uso is not None:
+                uso[0] += bytes_agregados
+                uso[1] += 1
+        if uso is None or uso[0] > self.max_bytes or uso[1] >= REVISAR_CADA:
+            self.desalojar()
+
+    def desalojar(self):
+        """
+        Recorre el directorio y borra las entradas usadas hace más tiempo hasta
+        quedar bajo el presupuesto; deja el tamaño resultante para ``sumar``.
+        """
+        entradas = []
+        total = 0
+        for subdirectorio in self.directorio.iterdir() if self.directorio.exists() else ():
+            if not subdirectorio.is_dir():
+                continue
+            for entrada in os.scandir(subdirectorio):
+                if entrada.name.endswith('.pdf'):
+                    info = entrada.stat()
+                    entradas.append((info.st_atime, info.st_size, entrada.path))
+                    total += info.st_size
+        if total > self.max_bytes:
+            for _, tamano, ruta in sorted(entradas):
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+                total -= tamano
+                if total <= self.max_bytes:
+                    break
+        with _USO_LOCK:
+            _USO[self.directorio] = [total, 0]
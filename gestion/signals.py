@@ -0,0 +1,211 @@
+# gestion/signals.py
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.db.models import Q
+from django.dispatch import receiver
+
+from .busqueda import desindexar_proyectos, indexar_proyectos
+from .dashboard import invalidar_dashboard
+from .fragmentos import invalidar_catalogo, invalidar_filtros
+from .organizaciones import desactivar, en_organizacion, invalidar_miembros, invalidar_usuario
+from .referencias import REFERENCIAS
+from .models import (
+    CapaMuro, Cliente, Material, Muro, Organizacion, Proyecto, ResultadoCEV, SistemaClimatizacion, TipoProyecto,
+)
+
+
+# ----------------------------------------
+# CALIFICACIÓN ESTIMADA ALMACENADA EN PROYECTO
+# ----------------------------------------
+
+def borrado_en_cascada(origin, modelo):
+    """
+    True si el post_delete de una fila de ``modelo`` viene del borrado de otra
+    cosa (proyecto, cliente, organización...): su proyecto también se borra y
+    no tiene sentido recalcularlo fila por fila.
+    """
+    return origin is not None and not (isinstance(origin, modelo) or getattr(origin, 'model', None) is modelo)
+
+
+@receiver(post_save, sender=Muro)
+def muro_guardado(sender, instance, created, raw=False, **kwargs):
+    """Recalcula el proyecto del muro si cambió su material, superficie o proyecto."""
+    if raw:
+        return
+    original = getattr(instance, '_calificacion_original', None)
+    actual = instance.valores_calificacion()
+    if not created and original == actual:
+        # La calificación no cambia, pero el detalle muestra la ubicación.
+        Proyecto.objects.filter(pk=actual[0]).tocar()
+        return
+    
+    proyectos = {actual[0]}
+    if original and original[0] != actual[0]:
+        # El muro se movió: el proyecto anterior también pierde su superficie.
+        proyectos.add(original[0])
+    Proyecto.objects.filter(pk__in=proyectos).actualizar_calificacion()
+    instance._calificacion_original = actual
+
+
+@receiver(post_delete, sender=Muro)
+def muro_eliminado(sender, instance, origin=None, **kwargs):
+    """Recalcula el proyecto del muro eliminado, salvo que el borrado venga en cascada."""
+    if borrado_en_cascada(origin, Muro):
+        return
+    Proyecto.objects.filter(pk=instance.proyecto_id).actualizar_calificacion()
+
+
+@receiver(post_save, sender=Material)
+def material_guardado(sender, instance, created, raw=False, **kwargs):
+    """Si cambia la conductividad, recalcula en un solo UPDATE todos los proyectos que usan el material."""
+    if raw or created:
+        return
+    if getattr(instance, '_conductividad_original', None) == instance.conductividad:
+        # El nombre también se muestra, pero los fragmentos ya van por la
+        # versión del catálogo (ver fragmentos.py).
+        return
+    # Un material del catálogo común lo usan proyectos de todas las organizaciones.
+    with en_organizacion(None):
+        # Primero la transmitancia de los muros con capas de este material.
+        con_capas = Muro.objects.filter(pk__in=CapaMuro.objects.filter(material=instance).values('muro_id'))
+        con_capas.actualizar_transmitancia()
+        Proyecto.objects.filter(
+            Q(pk__in=Muro.objects.filter(material_aislante=instance).values('proyecto_id'))
+            | Q(pk__in=con_capas.values('proyecto_id'))
+        ).actualizar_calificacion()
+    instance._conductividad_original = instance.conductividad
+
+
+@receiver(post_save, sender=CapaMuro)
+@receiver(post_delete, sender=CapaMuro)
+def capa_modificada(sender, instance, raw=False, origin=None, **kwargs):
+    """Recalcula la transmitancia del muro de la capa y la calificación de su proyecto."""
+    if raw or borrado_en_cascada(origin, CapaMuro):
+        # Se está borrando el muro, el proyecto o algo que los contiene.
+        return
+    # Si la capa cambió de muro, el anterior también pierde su resistencia.
+    muros = Muro.objects.filter(
+        pk__in={instance.muro_id, getattr(instance, '_muro_original', None) or instance.muro_id}
+    )
+    muros.actualizar_transmitancia()
+    Proyecto.objects.filter(pk__in=muros.values('proyecto_id')).actualizar_calificacion()
+    instance._muro_original = instance.muro_id
+
+
+# ----------------------------------------
+# ÍNDICE DE BÚSQUEDA DE TEXTO COMPLETO
+# ----------------------------------------
+
+@receiver(post_save, sender=Proyecto)
+def proyecto_guardado(sender, instance, raw=False, **kwargs):
+    """Reindexa el proyecto (nombre, descripción o cliente pueden haber cambiado)."""
+    if raw:
+        return
+    indexar_proyectos(Proyecto.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Proyecto)
+def proyecto_eliminado(sender, instance, **kwargs):
+    desindexar_proyectos([instance.pk])
+
+
+@receiver(post_save, sender=Cliente)
+def cliente_guardado(sender, instance, created, raw=False, **kwargs):
+    """
+    Si cambia el nombre del cliente, reindexa todos sus proyectos en una
+    sentencia. El nombre y el contacto aparecen en las filas y el detalle de
+    sus proyectos: si cambia alguno, sube también su versión.
+    """
+    if raw or created:
+        return
+    cambio_nombre = getattr(instance, '_nombre_original', None) != instance.nombre
+    cambio_contacto = getattr(instance, '_contacto_original', None) != instance.contacto
+    proyectos = Proyecto.objects.filter(cliente=instance)
+    if cambio_nombre:
+        indexar_proyectos(proyectos)
+    if cambio_nombre or cambio_contacto:
+        proyectos.tocar()
+    instance._nombre_original = instance.nombre
+    instance._contacto_original = instance.contacto
+
+
+# ----------------------------------------
+# VERSIÓN DE PROYECTOS (FRAGMENTOS EN CACHÉ)
+# ----------------------------------------
+
+# Muros, capas y la conductividad de Material suben la versión en las
+# funciones de arriba (actualizar_calificacion también la sube), y Cliente en
+# cliente_guardado. Los nombres de tipos, materiales y sistemas no reescriben
+# proyectos de todas las organizaciones: los fragmentos se guardan también por
+# la versión del catálogo, que cambia al guardarlos o borrarlos (abajo).
+
+@receiver(post_save, sender=ResultadoCEV)
+@receiver(post_delete, sender=ResultadoCEV)
+def resultado_modificado(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or borrado_en_cascada(origin, ResultadoCEV):
+        return
+    Proyecto.objects.filter(pk=instance.proyecto_id).tocar()
+
+
+@receiver(m2m_changed, sender=Proyecto.sistemas.through)
+def sistemas_modificados(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        proyectos = Proyecto.objects.filter(pk=instance.pk)
+    elif action == 'pre_clear':
+        proyectos = Proyecto.objects.filter(sistemas=instance)
+    else:
+        proyectos = Proyecto.objects.filter(pk__in=pk_set)
+    proyectos.tocar()
+
+
+# El desplegable de clientes del listado se guarda por versión de los datos
+# de referencia (ver fragmentos.py); los tipos los cubre REFERENCIAS.
+post_save.connect(invalidar_filtros, sender=Cliente, dispatch_uid='filtros_save_Cliente')
+post_delete.connect(invalidar_filtros, sender=Cliente, dispatch_uid='filtros_delete_Cliente')
+
+for _modelo in (TipoProyecto, Material, SistemaClimatizacion):
+    post_save.connect(invalidar_catalogo, sender=_modelo, dispatch_uid=f'catalogo_save_{_modelo.__name__}')
+    post_delete.connect(invalidar_catalogo, sender=_modelo, dispatch_uid=f'catalogo_delete_{_modelo.__name__}')
+
+
+# ----------------------------------------
+# CACHÉ DE DATOS DE REFERENCIA
+# ----------------------------------------
+
+# Sube la versión en la base de datos: cada proceso descarta su copia en
+# memoria en su próxima revisión (ver referencias.py).
+for _modelo in REFERENCIAS.modelos:
+    post_save.connect(REFERENCIAS.invalidar, sender=_modelo, dispatch_uid=f'referencias_save_{_modelo.__name__}')
+    post_delete.connect(REFERENCIAS.invalidar, sender=_modelo, dispatch_uid=f'referencias_delete_{_modelo.__name__}')
+
+
+# ----------------------------------------
+# CACHÉ DEL DASHBOARD
+# ----------------------------------------
+
+# Cualquier cambio en un modelo que aparece en el dashboard lo descarta; se
+# vuelve a calcular en la siguiente visita. Las operaciones masivas que no
+# disparan señales (bulk_create, update) llaman a invalidar_dashboard a mano.
+for _modelo in (Cliente, TipoProyecto, Proyecto, ResultadoCEV, Muro, CapaMuro, Material):
+    post_save.connect(invalidar_dashboard, sender=_modelo, dispatch_uid=f'dashboard_save_{_modelo.__name__}')
+    post_delete.connect(invalidar_dashboard, sender=_modelo, dispatch_uid=f'dashboard_delete_{_modelo.__name__}')
+
+
+# ----------------------------------------
+# ORGANIZACIÓN EN CURSO Y MIEMBROS
+# ----------------------------------------
+
+# Al cerrar la respuesta (también después de enviar una en streaming), lo que
+# siga en el mismo hilo ya no filtra por la organización de la petición.
+request_finished.connect(desactivar, dispatch_uid='organizacion_desactivar')
+
+# La organización de cada usuario se resuelve desde el caché (ver
+# OrganizacionMiddleware): cualquier cambio de membresía lo descarta.
+m2m_changed.connect(invalidar_miembros, sender=Organizacion.miembros.through, dispatch_uid='miembros_m2m')
+post_delete.connect(invalidar_miembros, sender=Organizacion, dispatch_uid='miembros_delete_Organizacion')
+# El caché también guarda si el usuario es superusuario.
+post_save.connect(invalidar_usuario, sender=settings.AUTH_USER_MODEL, dispatch_uid='miembros_save_usuario')
+post_delete.connect(invalidar_usuario, sender=settings.AUTH_USER_MODEL, dispatch_uid='miembros_delete_usuario')
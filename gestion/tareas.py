@@ -0,0 +1,432 @@
+# gestion/tareas.py
+"""
+Cola de tareas en segundo plano sobre la propia base de datos (sin broker).
+
+* ``encolar(tipo, usuario, **parametros)`` crea una Tarea pendiente en la
+  organización en curso; las vistas y el admin responden enseguida con la URL
+  para consultar su estado. El trabajador la ejecuta dentro de esa misma
+  organización (ver gestion/organizaciones.py).
+* ``manage.py run_workers`` reclama tareas con un UPDATE condicionado al estado
+  (compare-and-set, seguro en SQLite) y, donde la base lo permite, con
+  ``SELECT ... FOR UPDATE SKIP LOCKED``; dos trabajadores nunca ejecutan la
+  misma tarea.
+* Un error se reintenta con espera exponencial hasta ``max_intentos``;
+  ``TareaFallida`` marca un error definitivo. Mientras se ejecuta, un hilo del
+  trabajador renueva el latido de la tarea (también las que no informan
+  avance, como un PDF grande); una tarea en curso sin latido reciente
+  (trabajador caído) vuelve a la cola.
+* Los archivos de resultado quedan en ``settings.CEV_TAREAS_DIR/<uuid>/`` y se
+  borran junto con las tareas terminadas hace más de CEV_TAREAS_RETENCION_DIAS.
+  Las importaciones solo leen (y la purga solo borra) archivos de
+  ``CEV_TAREAS_DIR/entradas/``, los que guarda ``guardar_entrada``.
+"""
+import logging
+import shutil
+import threading
+import time
+import traceback
+import uuid
+import zipfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Proyecto, Tarea
+from .organizaciones import en_organizacion
+
+logger = logging.getLogger('gestion.tareas')
+
+# Tipos de tarea registrados con @tipo_tarea: nombre -> función(ejecucion)
+TIPOS = {}
+
+
+class TareaFallida(Exception):
+    """Error definitivo: la tarea se marca como fallida sin más reintentos."""
+
+
+def tipo_tarea(nombre):
+    """Registra una función como tipo de tarea; recibe una Ejecucion y devuelve un mensaje."""
+    def registrar(funcion):
+        TIPOS[nombre] = funcion
+        return funcion
+    return registrar
+
+
+def directorio_tareas():
+    return Path(settings.CEV_TAREAS_DIR)
+
+
+def ruta_resultado(tarea):
+    """Ruta absoluta del archivo de resultado, o None si la tarea no generó uno."""
+    return directorio_tareas() / tarea.archivo if tarea.archivo else None
+
+
+def ruta_entrada(relativa):
+    """
+    Ruta absoluta de un archivo guardado con ``guardar_entrada``, o None si
+    ``relativa`` apunta fuera de ``entradas/`` (ruta absoluta o con ``..``).
+    """
+    entradas = (directorio_tareas() / 'entradas').resolve()
+    ruta = (directorio_tareas() / str(relativa)).resolve()
+    return ruta if ruta.is_relative_to(entradas) else None
+
+
+def guardar_entrada(archivo, sufijo):
+    """Copia un archivo subido al directorio de tareas y devuelve su ruta relativa."""
+    relativa = Path('entradas') / f"{uuid.uuid4()}{sufijo}"
+    ruta = directorio_tareas() / relativa
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    with open(ruta, 'wb') as destino:
+        for trozo in archivo.chunks():
+            destino.write(trozo)
+    return relativa.as_posix()
+
+
+def encolar(tipo, usuario=None, max_intentos=None, **parametros):
+    """Crea una tarea pendiente de ``tipo`` con ``parametros`` (serializables a JSON)."""
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de tarea desconocido: {tipo!r}")
+    tarea = Tarea(
+        tipo=tipo,
+        parametros=parametros,
+        usuario=usuario if usuario is not None and usuario.is_authenticated else None,
+    )
+    if max_intentos is not None:
+        tarea.max_intentos = max_intentos
+    tarea.save()
+    return tarea
+
+
+# ----------------------------------------
+# TRABAJADORES
+# ----------------------------------------
+
+class Ejecucion:
+    """Lo que recibe cada tipo de tarea: sus parámetros, el avance y el archivo de resultado."""
+
+    # Segundos mínimos entre dos escrituras de avance.
+    intervalo_avance = 1.0
+
+    def __init__(self, tarea):
+        self.tarea = tarea
+        self.parametros = tarea.parametros
+        self.archivo = ''
+        self._ultimo_avance = 0.0
+
+    def avance(self, hechos, total=None, mensaje=''):
+        """Informa el progreso (y renueva el latido), como mucho una vez por intervalo."""
+        ahora = time.monotonic()
+        if ahora - self._ultimo_avance < self.intervalo_avance:
+            return
+        self._ultimo_avance = ahora
+        campos = {'latido': timezone.now()}
+        if total:
+            campos['progreso'] = min(99, int(100 * hechos / total))
+        if mensaje:
+            campos['mensaje'] = mensaje[:255]
+        try:
+            Tarea.objects.filter(pk=self.tarea.pk).update(**campos)
+        except OperationalError as error:
+            # El avance es informativo: en SQLite, escribir mientras la misma
+            # conexión aún lee un cursor falla de inmediato si otro proceso
+            # escribe ("database is locked"); se omite y se informa en el próximo.
+            logger.debug("Avance de la tarea %s omitido: %s", self.tarea.pk, error)
+
+    def ruta_resultado(self, nombre):
+        """Ruta donde escribir el archivo de resultado ``nombre`` (se crea el directorio)."""
+        relativa = Path(str(self.tarea.uuid)) / nombre
+        ruta = directorio_tareas() / relativa
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        self.archivo = relativa.as_posix()
+        return ruta
+
+
+class Latido:
+    """
+    Renueva el latido de una tarea en curso desde un hilo aparte mientras se
+    ejecuta, cada tercio de CEV_TAREAS_ABANDONO_SEGUNDOS. Sin él, una tarea
+    que no llama a ``Ejecucion.avance`` durante ese plazo parecería abandonada
+    y otro trabajador la ejecutaría de nuevo.
+    """
+
+    def __init__(self, tarea):
+        self.tarea = tarea
+        self.intervalo = settings.CEV_TAREAS_ABANDONO_SEGUNDOS / 3
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self.latir, name=f'latido-tarea-{tarea.pk}', daemon=True)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *excepcion):
+        self._detener.set()
+        self._hilo.join()
+
+    def latir(self):
+        try:
+            while not self._detener.wait(self.intervalo):
+                try:
+                    # Solo mientras siga siendo de este trabajador.
+                    Tarea._base_manager.filter(
+                        pk=self.tarea.pk, estado=Tarea.EN_CURSO, trabajador=self.tarea.trabajador
+                    ).update(latido=timezone.now())
+                except OperationalError as error:
+                    logger.debug("Latido de la tarea %s omitido: %s", self.tarea.pk, error)
+        finally:
+            # El hilo abre su propia conexión a la base de datos.
+            connections.close_all()
+
+
+def reclamar(trabajador):
+    """Marca como en curso la siguiente tarea disponible y la devuelve, o None si no hay."""
+    ahora = timezone.now()
+    disponibles = Tarea.objects.filter(estado=Tarea.PENDIENTE, disponible_desde__lte=ahora).order_by(
+        'disponible_desde', 'pk'
+    )
+    reclamo = {
+        'estado': Tarea.EN_CURSO,
+        'trabajador': trabajador,
+        'intentos': F('intentos') + 1,
+        'iniciada': ahora,
+        'latido': ahora,
+    }
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            pk = disponibles.select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            Tarea.objects.filter(pk=pk).update(**reclamo)
+        return Tarea.objects.get(pk=pk)
+
+    # Sin bloqueo por fila (SQLite): UPDATE condicionado al estado en modo
+    # autocommit; solo uno encuentra la tarea aún pendiente. Se prueban varias
+    # candidatas por si otro trabajador gana la primera.
+    for pk in disponibles.values_list('pk', flat=True)[:5]:
+        if Tarea.objects.filter(pk=pk, estado=Tarea.PENDIENTE).update(**reclamo):
+            return Tarea.objects.get(pk=pk)
+    return None
+
+
+def ejecutar(tarea):
+    """Ejecuta una tarea ya reclamada y guarda su resultado, reintento o fallo."""
+    ejecucion = Ejecucion(tarea)
+    funcion = TIPOS.get(tarea.tipo)
+    try:
+        if funcion is None:
+            raise TareaFallida(f"Tipo de tarea desconocido: {tarea.tipo!r}")
+        with en_organizacion(tarea.organizacion_id), Latido(tarea):
+            mensaje = funcion(ejecucion) or ''
+    except Exception as error:
+        definitivo = isinstance(error, TareaFallida) or tarea.intentos >= tarea.max_intentos
+        logger.warning("Tarea %s (%s) falló en el intento %s: %s", tarea.pk, tarea.tipo, tarea.intentos, error)
+        campos = {
+            'error': str(error) if isinstance(error, TareaFallida) else traceback.format_exc(),
+            'mensaje': str(error)[:255],
+            'trabajador': '',
+        }
+        if definitivo:
+            campos.update(estado=Tarea.FALLIDA, terminada=timezone.now())
+        else:
+            espera = settings.CEV_TAREAS_REINTENTO_SEGUNDOS * 2 ** (tarea.intentos - 1)
+            campos.update(estado=Tarea.PENDIENTE, disponible_desde=timezone.now() + timedelta(seconds=espera))
+    else:
+        campos = {
+            'estado': Tarea.COMPLETADA,
+            'progreso': 100,
+            'mensaje': mensaje[:255],
+            'error': '',
+            'archivo': ejecucion.archivo,
+            'terminada': timezone.now(),
+        }
+    # Solo si la tarea sigue siendo de este trabajador: si su latido venció y
+    # otro la reclamó, el resultado que vale es el de ese otro.
+    if not Tarea.objects.filter(pk=tarea.pk, estado=Tarea.EN_CURSO, trabajador=tarea.trabajador).update(**campos):
+        logger.warning(
+            "Tarea %s (%s): el trabajador %s ya no la tenía reclamada; se descarta su resultado.",
+            tarea.pk, tarea.tipo, tarea.trabajador,
+        )
+
+
+def procesar_siguiente(trabajador):
+    """Reclama y ejecuta una tarea; devuelve False si la cola está vacía."""
+    tarea = reclamar(trabajador)
+    if tarea is None:
+        return False
+    ejecutar(tarea)
+    return True
+
+
+def recuperar_abandonadas():
+    """Devuelve a la cola las tareas en curso sin latido reciente (su trabajador murió)."""
+    limite = timezone.now() - timedelta(seconds=settings.CEV_TAREAS_ABANDONO_SEGUNDOS)
+    abandonadas = Tarea.objects.filter(estado=Tarea.EN_CURSO, latido__lt=limite)
+    agotadas = abandonadas.filter(intentos__gte=F('max_intentos')).update(
+        estado=Tarea.FALLIDA, mensaje="Trabajador sin respuesta", terminada=timezone.now()
+    )
+    return agotadas + abandonadas.update(estado=Tarea.PENDIENTE, trabajador='', disponible_desde=timezone.now())
+
+
+def purgar_tareas():
+    """Borra las tareas terminadas hace más de CEV_TAREAS_RETENCION_DIAS y sus archivos."""
+    limite = timezone.now() - timedelta(days=settings.CEV_TAREAS_RETENCION_DIAS)
+    viejas = Tarea.objects.filter(estado__in=[Tarea.COMPLETADA, Tarea.FALLIDA], terminada__lt=limite)
+    for tarea in viejas.only('uuid', 'parametros'):
+        shutil.rmtree(directorio_tareas() / str(tarea.uuid), ignore_errors=True)
+        entrada = ruta_entrada(tarea.parametros['archivo']) if tarea.parametros.get('archivo') else None
+        if entrada is not None:
+            entrada.unlink(missing_ok=True)
+    return viejas.delete()[0]
+
+
+# ----------------------------------------
+# TIPOS DE TAREA
+# ----------------------------------------
+
+def _proyectos(parametros):
+    """Proyectos indicados por ``ids``, ``cliente`` o ``pendientes`` (sin ResultadoCEV)."""
+    proyectos = Proyecto.objects.all()
+    if parametros.get('ids') is not None:
+        proyectos = proyectos.filter(pk__in=parametros['ids'])
+    if parametros.get('cliente') is not None:
+        proyectos = proyectos.filter(cliente_id=parametros['cliente'])
+    if parametros.get('pendientes'):
+        proyectos = proyectos.filter(resultados__isnull=True)
+    return proyectos
+
+
+@tipo_tarea('reporte_pdf')
+def reporte_pdf(ejecucion):
+    """PDF de un proyecto (``proyecto``), usando la misma caché que la vista."""
+    from .reportes import CacheReportes, clave_reporte, datos_reporte, muros_reporte, nombre_reporte
+
+    try:
+        proyecto = Proyecto.objects.select_related('cliente', 'resultados').get(
+            pk=ejecucion.parametros['proyecto']
+        )
+    except Proyecto.DoesNotExist:
+        raise TareaFallida(f"No existe el proyecto {ejecucion.parametros['proyecto']}.")
+    datos = datos_reporte(proyecto)
+    pdf = CacheReportes.desde_settings().obtener_o_renderizar(clave_reporte(datos, muros_reporte(proyecto)), datos)
+    ejecucion.ruta_resultado(nombre_reporte(datos)).write_bytes(pdf)
+    return "Reporte generado."
+
+
+@tipo_tarea('reportes_pdf')
+def reportes_pdf(ejecucion):
+    """ZIP con los PDF de varios proyectos. Se renderiza en este proceso: el
+    paralelismo lo da la cantidad de trabajadores."""
+    from .reportes import datos_reportes, generar_reportes
+
+    proyectos = _proyectos(ejecucion.parametros)
+    total = proyectos.count()
+    with zipfile.ZipFile(ejecucion.ruta_resultado('reportes_cev.zip'), 'w', compression=zipfile.ZIP_DEFLATED) as zip_reportes:
+        generados = generar_reportes(
+            datos_reportes(proyectos), zip_reportes.writestr, workers=1,
+            progreso=lambda generados, segundos: ejecucion.avance(generados, total),
+        )
+    return f"{generados} reportes generados."
+
+
+@tipo_tarea('certificar')
+def certificar(ejecucion):
+    """Crea o actualiza el ResultadoCEV de los proyectos (ver certificacion.py)."""
+    from .certificacion import CertificadorCEV
+
+    proyectos = _proyectos(ejecucion.parametros)
+    total = proyectos.count()
+    estadisticas = CertificadorCEV().certificar(
+        proyectos, progreso=lambda estadisticas: ejecucion.avance(estadisticas['proyectos'], total)
+    )
+    return (
+        f"{estadisticas['nuevos']} resultados creados, {estadisticas['actualizados']} actualizados "
+        f"y {estadisticas['sin_cambios']} sin cambios."
+    )
+
+
+@tipo_tarea('recalcular_calificaciones')
+def recalcular_calificaciones(ejecucion, lote=2000):
+    """Recalcula las columnas de calificación almacenadas, por lotes de pk."""
+    from .dashboard import invalidar_dashboard
+
+    proyectos = _proyectos(ejecucion.parametros)
+    total = proyectos.count()
+    procesados = ultimo = 0
+    while True:
+        pks = list(proyectos.filter(pk__gt=ultimo).order_by('pk').values_list('pk', flat=True)[:lote])
+        if not pks:
+            break
+        with transaction.atomic():
+            Proyecto.objects.filter(pk__in=pks).actualizar_calificacion()
+        procesados += len(pks)
+        ultimo = pks[-1]
+        ejecucion.avance(procesados, total)
+    invalidar_dashboard()
+    return f"{procesados} proyectos recalculados."
+
+
+@tipo_tarea('importar')
+def importar(ejecucion):
+    """Importa un archivo guardado con guardar_entrada; el resultado son las filas rechazadas."""
+    from .importacion import EscritorRechazos, ImportadorCEV
+
+    formato = ejecucion.parametros['formato']
+    entrada = ruta_entrada(ejecucion.parametros['archivo'])
+    if entrada is None:
+        raise TareaFallida(f"El archivo {ejecucion.parametros['archivo']} no es una entrada de tareas.")
+    if not entrada.exists():
+        raise TareaFallida(f"No existe el archivo {ejecucion.parametros['archivo']}.")
+    importador = ImportadorCEV()
+    ruta_errores = ejecucion.ruta_resultado(f"errores.{formato}")
+    with open(entrada, newline='', encoding='utf-8-sig') as archivo, \
+            open(ruta_errores, 'w', newline='', encoding='utf-8') as errores:
+        try:
+            estadisticas = importador.importar(
+                archivo, formato,
+                rechazos=EscritorRechazos(errores, formato),
+                progreso=lambda estadisticas: ejecucion.avance(
+                    0, mensaje=f"{estadisticas['proyectos']} proyectos importados..."
+                ),
+            )
+        except ValueError as error:
+            raise TareaFallida(str(error))
+    if not estadisticas['rechazados']:
+        ruta_errores.unlink()
+        ejecucion.archivo = ''
+    return (
+        f"{estadisticas['proyectos']} proyectos, {estadisticas['muros']} muros y "
+        f"{estadisticas['resultados']} resultados importados; {estadisticas['rechazados']} rechazados."
+    )
+
+
+@tipo_tarea('exportar')
+def exportar(ejecucion):
+    """CSV o XLSX del listado con los filtros de ``query`` (mismo formato que la descarga directa)."""
+    from django.http import HttpRequest, QueryDict
+
+    from .views import ProyectoExportView
+
+    vista = ProyectoExportView()
+    vista.request = HttpRequest()
+    vista.request.GET = QueryDict(ejecucion.parametros.get('query', ''))
+    queryset = vista.queryset_exportacion()
+    total = queryset.count()
+    formato = 'xlsx' if ejecucion.parametros.get('formato') == 'xlsx' else 'csv'
+    ruta = ejecucion.ruta_resultado(f"{vista.nombre_archivo()}.{formato}")
+
+    def avance(filas):
+        ejecucion.avance(filas, total)
+
+    if formato == 'xlsx':
+        try:
+            vista.escribir_xlsx(queryset, ruta, avance)
+        except ImportError:
+            raise TareaFallida("Instala openpyxl: pip install openpyxl")
+    else:
+        with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+            vista.escribir_csv(queryset, archivo, avance)
+    return f"{total} proyectos exportados."
@@ -1,3 +1,1933 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import time
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .busqueda import buscar_proyectos, soporta_busqueda
+from .clonacion import clonar_proyecto
+from .dashboard import calcular_dashboard, obtener_dashboard
+from .admin import MuroAdmin
+from .importacion import EscritorRechazos, ImportadorCEV
+from .organizaciones import en_organizacion, organizacion_actual
+from .metricas import DURACION_PETICION, PETICIONES, PETICIONES_N_MAS_1, RENDER_PDF, REPLICAS_PETICIONES
+from .referencias import REFERENCIAS
+from .replicas import COOKIE_PRIMARIA, REPLICAS
+from .reportes import CacheReportes
+from .views import ProyectoExportView
+from .models import (
+    SIN_DATOS,
+    CapaMuro,
+    Cliente,
+    ContadorVersion,
+    Material,
+    Muro,
+    Organizacion,
+    Proyecto,
+    ResultadoCEV,
+    SistemaClimatizacion,
+    Tarea,
+    TipoProyecto,
+)
+
+
+def precargar_referencias():
+    """Carga las tablas del caché de datos de referencia, como en un proceso ya en marcha."""
+    for modelo in REFERENCIAS.modelos:
+        REFERENCIAS.tabla(modelo)
+
+
+class CalificacionEnergeticaTests(TestCase):
+    """Paridad entre el cálculo en Python y ``Proyecto.objects.with_rating()``."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nombre="Cliente", contacto="cliente@example.com")
+        cls.tipo = TipoProyecto.objects.create(nombre="Casa")
+
+    def crear_proyecto(self, *muros):
+        """Crea un proyecto con muros dados como pares (conductividad, superficie)."""
+        proyecto = Proyecto.objects.create(cliente=self.cliente, tipo=self.tipo, nombre="Vivienda")
+        for i, (conductividad, superficie) in enumerate(muros):
+            material = Material.objects.create(nombre=f"Material {i}", conductividad=Decimal(conductividad))
+            Muro.objects.create(
+                proyecto=proyecto,
+                material_aislante=material,
+                ubicacion=f"Muro {i}",
+                superficie=Decimal(superficie),
+            )
+        return proyecto
+
+    def assertParidad(self, proyecto, calificacion, consumo):
+        python = Proyecto.objects.get(pk=proyecto.pk)
+        sql = Proyecto.objects.with_rating().get(pk=proyecto.pk)
+        self.assertEqual(python.calcular_calificacion_energetica(), calificacion)
+        self.assertEqual(sql.calificacion_calculada, calificacion)
+        self.assertEqual(python.calificacion_estimada, calificacion)
+        self.assertEqual(python.calcular_consumo_estimado(), consumo)
+        self.assertEqual(sql.consumo_calculado, consumo)
+        self.assertEqual(python.consumo_estimado, consumo)
+
+    def test_umbrales(self):
+        casos = [
+            ('0.499', 'A+', 50),
+            ('0.500', 'A', 75),
+            ('0.999', 'A', 75),
+            ('1.000', 'B', 100),
+            ('1.499', 'B', 100),
+            ('1.500', 'C', 150),
+            ('1.999', 'C', 150),
+            ('2.000', 'D', 200),
+            ('5.000', 'D', 200),
+        ]
+        for conductividad, calificacion, consumo in casos:
+            with self.subTest(conductividad=conductividad):
+                proyecto = self.crear_proyecto((conductividad, '10.00'))
+                self.assertParidad(proyecto, calificacion, consumo)
+
+    def test_promedio_ponderado_por_superficie(self):
+        # (0.2 × 30 + 1.4 × 10) / 40 = 0.5 -> A
+        proyecto = self.crear_proyecto(('0.200', '30.00'), ('1.400', '10.00'))
+        self.assertParidad(proyecto, 'A', 75)
+        sql = Proyecto.objects.with_rating().get(pk=proyecto.pk)
+        self.assertAlmostEqual(sql.conductividad_media, 0.5)
+        self.assertEqual(sql.superficie_muros, Decimal('40.00'))
+
+    def test_sin_muros(self):
+        proyecto = self.crear_proyecto()
+        self.assertParidad(proyecto, 'Sin datos', 0)
+
+    def test_superficie_cero(self):
+        proyecto = self.crear_proyecto(('1.000', '0.00'))
+        self.assertParidad(proyecto, 'Sin datos', 0)
+
+    def test_listado_en_una_consulta(self):
+        for conductividad in ('0.300', '1.200', '2.500'):
+            self.crear_proyecto((conductividad, '12.00'), (conductividad, '8.00'))
+        with self.assertNumQueries(1):
+            calificaciones = sorted(
+                p.calcular_calificacion_energetica() for p in Proyecto.objects.with_rating()
+            )
+        self.assertEqual(calificaciones, ['A+', 'B', 'D'])
+
+
+class CalificacionAlmacenadaTests(TestCase):
+    """Las columnas de calificación de Proyecto se mantienen al día con sus muros y materiales."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nombre="Cliente", contacto="cliente@example.com")
+        cls.tipo = TipoProyecto.objects.create(nombre="Casa")
+
+    def setUp(self):
+        self.material = Material.objects.create(nombre="Lana", conductividad=Decimal('0.400'))
+        self.proyecto = Proyecto.objects.create(cliente=self.cliente, tipo=self.tipo, nombre="Vivienda")
+        self.muro = Muro.objects.create(
+            proyecto=self.proyecto, material_aislante=self.material,
+            ubicacion="Norte", superficie=Decimal('10.00'),
+        )
+
+    def recargar(self):
+        return Proyecto.objects.get(pk=self.proyecto.pk)
+
+    def test_alta_de_muro(self):
+        proyecto = self.recargar()
+        self.assertEqual(proyecto.superficie_total, Decimal('10.00'))
+        self.assertAlmostEqual(proyecto.conductividad_ponderada, 0.4)
+        self.assertEqual(proyecto.calificacion_estimada, 'A+')
+        self.assertEqual(proyecto.consumo_estimado, 50)
+
+    def test_cambio_de_superficie_y_material(self):
+        otro = Material.objects.create(nombre="Ladrillo", conductividad=Decimal('1.800'))
+        Muro.objects.create(
+            proyecto=self.proyecto, material_aislante=otro, ubicacion="Sur", superficie=Decimal('10.00'),
+        )
+        self.assertEqual(self.recargar().calificacion_estimada, 'B')
+        muro = Muro.objects.get(pk=self.muro.pk)
+        muro.superficie = Decimal('1.00')
+        muro.save()
+        self.assertEqual(self.recargar().calificacion_estimada, 'C')
+        muro.material_aislante = otro
+        muro.save()
+        self.assertEqual(self.recargar().calificacion_estimada, 'C')
+        self.assertAlmostEqual(self.recargar().conductividad_ponderada, 1.8)
+
+    def test_muro_movido_de_proyecto(self):
+        destino = Proyecto.objects.create(cliente=self.cliente, tipo=self.tipo, nombre="Destino")
+        muro = Muro.objects.get(pk=self.muro.pk)
+        muro.proyecto = destino
+        muro.save()
+        self.assertEqual(self.recargar().calificacion_estimada, 'Sin datos')
+        self.assertEqual(self.recargar().superficie_total, 0)
+        self.assertEqual(Proyecto.objects.get(pk=destino.pk).calificacion_estimada, 'A+')
+
+    def test_baja_de_muro(self):
+        self.muro.delete()
+        proyecto = self.recargar()
+        self.assertEqual(proyecto.calificacion_estimada, 'Sin datos')
+        self.assertIsNone(proyecto.conductividad_ponderada)
+
+    def test_borrado_en_cascada_no_recalcula(self):
+        CapaMuro.objects.create(muro=self.muro, material=self.material, espesor=Decimal('0.100'), orden=0)
+        ResultadoCEV.objects.create(proyecto=self.proyecto, calificacion='A', consumo_energia_anual=70)
+        with CaptureQueriesContext(connection) as consultas:
+            Cliente.objects.get(pk=self.cliente.pk).delete()
+        actualizaciones = [c['sql'] for c in consultas if c['sql'].startswith('UPDATE')]
+        self.assertEqual(actualizaciones, [])
+        self.assertFalse(Muro.objects.exists())
+
+    def test_cambio_de_conductividad_en_un_update(self):
+        for i in range(5):
+            proyecto = Proyecto.objects.create(cliente=self.cliente, tipo=self.tipo, nombre=f"P{i}")
+            Muro.objects.create(
+                proyecto=proyecto, material_aislante=self.material, ubicacion="Este", superficie=Decimal('5.00'),
+            )
+        material = Material.objects.get(pk=self.material.pk)
+        material.conductividad = Decimal('2.500')
+        # Material, U de los muros con capas de ese material, proyectos afectados
+        # y versión de los datos de referencia.
+        with self.assertNumQueries(4):
+            material.save()
+        self.assertFalse(Proyecto.objects.exclude(calificacion_estimada='D').exists())
+
+    def test_comando_reconstruye_y_verifica(self):
+        Proyecto.objects.update(calificacion_estimada='D', consumo_estimado=0, superficie_total=0)
+        with self.assertRaises(CommandError):
+            call_command('recalcular_calificaciones', verificar=True, stdout=StringIO())
+        call_command('recalcular_calificaciones', lote=1, stdout=StringIO())
+        self.assertEqual(self.recargar().calificacion_estimada, 'A+')
+        call_command('recalcular_calificaciones', verificar=True, stdout=StringIO())
+
+
+class ProyectoAdminChangelistTests(TestCase):
+    """El listado del admin de proyectos no debe crecer en consultas con los datos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser("admin", "admin@example.com", "clave")
+        cls.cliente = Cliente.objects.create(nombre="Cliente", contacto="cliente@example.com")
+        cls.tipo = TipoProyecto.objects.create(nombre="Casa")
+        cls.materiales = [
+            Material.objects.create(nombre=f"Material {i}", conductividad=Decimal('0.4') * (i + 1))
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def crear_proyectos(self, cantidad, muros_por_proyecto):
+        for i in range(cantidad):
+            proyecto = Proyecto.objects.create(cliente=self.cliente, tipo=self.tipo, nombre=f"Vivienda {i}")
+            Muro.objects.bulk_create([
+                Muro(
+                    proyecto=proyecto,
+                    material_aislante=self.materiales[j % len(self.materiales)],
+                    ubicacion=f"Muro {j}",
+                    superficie=Decimal('10.00'),
+                )
+                for j in range(muros_por_proyecto)
+            ])
+            if i % 2:
+                ResultadoCEV.objects.create(proyecto=proyecto, calificacion='B', consumo_energia_anual=100)
+
+    def contar_consultas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('admin:gestion_proyecto_changelist'))
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas)
+
+    def test_consultas_constantes(self):
+        self.crear_proyectos(2, 1)
+        # La primera petición guarda en caché las organizaciones del usuario.
+        self.contar_consultas()
+        base = self.contar_consultas()
+        self.crear_proyectos(30, 20)
+        self.assertEqual(self.contar_consultas(), base)
+
+    def test_badges(self):
+        self.crear_proyectos(2, 2)
+        respuesta = self.client.get(reverse('admin:gestion_proyecto_changelist'))
+        self.assertContains(respuesta, 'Calificado (B)')
+        self.assertContains(respuesta, 'En Curso')
+
+
+class ImportacionCEVTests(TestCase):
+    """Importación masiva desde CSV y JSONL."""
+
+    CSV = (
+        "proyecto_ref,cliente_contacto,cliente_nombre,proyecto_nombre,fecha_inicio,tipo,sistemas,"
+        "muro_ubicacion,muro_superficie,muro_material,calificacion,consumo_energia_anual\n"
+        "1,ana@example.com,Ana Nueva,Casa 1,2025-01-10,Casa,Bomba|Caldera,Norte,10.00,Lana,B,100\n"
+        "1,ana@example.com,Ana Nueva,Casa 1,2025-01-10,Casa,Bomba|Caldera,Sur,10.00,Lana,,\n"
+        "2,ana@example.com,Ana Nueva,Casa 2,2025-01-11,Casa,,Este,5.00,Desconocido,,\n"
+        "3,beto@example.com,Beto,Casa 3,,Casa,,,,,,\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        Cliente.objects.create(nombre="Ana", contacto="ana@example.com")
+        TipoProyecto.objects.create(nombre="Casa")
+        Material.objects.create(nombre="Lana", conductividad=Decimal('0.040'))
+        SistemaClimatizacion.objects.create(tipo="Bomba")
+        SistemaClimatizacion.objects.create(tipo="Caldera")
+
+    def test_csv(self):
+        errores = StringIO()
+        estadisticas = ImportadorCEV(lote=1).importar(
+            StringIO(self.CSV), 'csv', rechazos=EscritorRechazos(errores, 'csv')
+        )
+        self.assertEqual(estadisticas['filas'], 4)
+        self.assertEqual(estadisticas['proyectos'], 2)
+        self.assertEqual(estadisticas['muros'], 2)
+        self.assertEqual(estadisticas['resultados'], 1)
+        self.assertEqual(estadisticas['rechazados'], 1)
+        self.assertIn("Material desconocido: 'Desconocido'", errores.getvalue())
+        self.assertTrue(errores.getvalue().startswith("proyecto_ref,"))
+
+        # Upsert por contacto: el cliente existente se actualiza, no se duplica.
+        self.assertEqual(Cliente.objects.get(contacto="ana@example.com").nombre, "Ana Nueva")
+        self.assertEqual(Cliente.objects.count(), 2)
+
+        casa = Proyecto.objects.get(nombre="Casa 1")
+        self.assertEqual(casa.sistemas.count(), 2)
+        self.assertEqual(casa.resultados.calificacion, 'B')
+        self.assertEqual(casa.calificacion_estimada, 'A+')
+        self.assertEqual(casa.superficie_total, Decimal('20.00'))
+
+    def test_jsonl(self):
+        lineas = StringIO(
+            '{"cliente": {"contacto": "c@example.com", "nombre": "C"}, '
+            '"proyecto": {"nombre": "Depto", "tipo": "Casa", "sistemas": ["Bomba"]}, '
+            '"muros": [{"ubicacion": "Norte", "superficie": "12.5", "material": "Lana"}]}\n'
+            '\n'
+            '{no es json}\n'
+            '{"cliente": {"contacto": "d@example.com"}, "proyecto": {"nombre": "X", "tipo": "Otro"}}\n'
+        )
+        errores = StringIO()
+        estadisticas = ImportadorCEV().importar(lineas, 'jsonl', rechazos=EscritorRechazos(errores, 'jsonl'))
+        self.assertEqual(estadisticas['proyectos'], 1)
+        self.assertEqual(estadisticas['rechazados'], 2)
+        self.assertEqual(len(errores.getvalue().splitlines()), 2)
+        self.assertEqual(Proyecto.objects.get(nombre="Depto").calificacion_estimada, 'A+')
+
+
+@override_settings(CEV_ORGANIZACION_OBLIGATORIA=False)
+class ExportacionProyectosTests(TestCase):
+    """Exportación en streaming con los filtros del listado."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nombre="Ñuñoa SpA", contacto="n@example.com")
+        otro = Cliente.objects.create(nombre="Otro", contacto="o@example.com")
+        tipo = TipoProyecto.objects.create(nombre="Casa")
+        sistema = SistemaClimatizacion.objects.create(tipo="Bomba de calor")
+        material = Material.objects.create(nombre="Lana", conductividad=Decimal('0.040'))
+        for i in range(12):
+            proyecto = Proyecto.objects.create(
+                cliente=cls.cliente if i % 3 else otro, tipo=tipo, nombre=f"Casa {i}"
+            )
+            proyecto.sistemas.add(sistema)
+            Muro.objects.create(
+                proyecto=proyecto, material_aislante=material, ubicacion="Norte", superficie=Decimal('8.00')
+            )
+        ResultadoCEV.objects.create(proyecto=proyecto, calificacion='A', consumo_energia_anual=70)
+
+    def exportar(self, **params):
+        respuesta = self.client.get(reverse('proyecto-exportar'), params)
+        self.assertTrue(respuesta.streaming)
+        contenido = b''.join(respuesta.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(StringIO(contenido)))
+
+    def test_filtros_del_listado(self):
+        filas = self.exportar(cliente=self.cliente.pk)
+        self.assertEqual(filas[0][0], 'ID')
+        self.assertEqual(len(filas) - 1, 8)
+        self.assertTrue(all(fila[2] == "Ñuñoa SpA" for fila in filas[1:]))
+        self.assertEqual(filas[1][6], "Bomba de calor")
+        self.assertEqual(filas[1][7], '1')
+        self.assertEqual(filas[1][9], 'A+')
+
+    def test_consultas_fijas_por_lote(self):
+        # Una consulta de proyectos + una de sistemas por cada lote de 4.
+        with mock.patch.object(ProyectoExportView, 'chunk_size', 4):
+            with self.assertNumQueries(1 + 3):
+                filas = self.exportar()
+        self.assertEqual(len(filas) - 1, 12)
+        certificado = next(fila for fila in filas if fila[1] == "Casa 11")
+        self.assertEqual(certificado[11], 'A')
+
+
+@override_settings(CEV_ORGANIZACION_OBLIGATORIA=False)
+class ReportesPDFTests(TestCase):
+    """Generación de reportes PDF individual y por lotes, y su caché."""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        configuracion = override_settings(CEV_REPORTES_CACHE_DIR=directorio.name)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        self.directorio_cache = directorio.name
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = Cliente.objects.create(nombre="Cliente", contacto="cliente@example.com")
+        tipo = TipoProyecto.objects.create(nombre="Casa")
+        cls.proyectos = [
+            Proyecto.objects.create(cliente=cliente, tipo=tipo, nombre=f"Casa {i}/B") for i in range(5)
+        ]
+        ResultadoCEV.objects.create(proyecto=cls.proyectos[0], calificacion='A', consumo_energia_anual=70)
+
+    def test_vista_pdf(self):
+        respuesta = self.client.get(reverse('proyecto-pdf', args=[self.proyectos[0].pk]))
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertTrue(respuesta.content.startswith(b'%PDF'))
+
+    def test_cache_y_get_condicional(self):
+        url = reverse('proyecto-pdf', args=[self.proyectos[1].pk])
+        primera = self.client.get(url)
+        etag = primera['ETag']
+        self.assertTrue(primera['Last-Modified'])
+
+        with mock.patch('gestion.reportes.renderizar_pdf') as renderizar:
+            segunda = self.client.get(url)
+            condicional = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            renderizar.assert_not_called()
+        self.assertEqual(segunda.content, primera.content)
+        self.assertEqual(condicional.status_code, 304)
+
+        # Un cambio en los muros cambia la clave: ya no hay 304.
+        Muro.objects.create(
+            proyecto=self.proyectos[1],
+            material_aislante=Material.objects.create(nombre="Lana", conductividad=Decimal('0.040')),
+            ubicacion="Norte",
+            superficie=Decimal('10.00'),
+        )
+        tercera = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(tercera.status_code, 200)
+        self.assertNotEqual(tercera['ETag'], etag)
+
+    def test_desalojo_lru(self):
+        cache = CacheReportes(self.directorio_cache, max_bytes=1000)
+        for i, clave in enumerate(('aa1', 'bb2', 'cc3')):
+            cache.guardar(clave, b'x' * 100)
+            os.utime(cache.ruta(clave), (1000 + i, 1000 + i))
+        cache.obtener('aa1')
+        cache.max_bytes = 250
+        cache.desalojar()
+        self.assertIsNotNone(cache.obtener('aa1'))
+        self.assertIsNone(cache.obtener('bb2'))
+        self.assertIsNotNone(cache.obtener('cc3'))
+
+    def test_desalojo_sin_recorrer_en_cada_escritura(self):
+        cache = CacheReportes(self.directorio_cache, max_bytes=1000)
+        with mock.patch.object(
+            CacheReportes, 'desalojar', autospec=True, side_effect=CacheReportes.desalojar,
+        ) as desalojar:
+            for i in range(9):
+                cache.guardar(f'{i:02d}', b'x' * 100)
+            # Un recorrido inicial; después se lleva la cuenta en memoria.
+            self.assertEqual(desalojar.call_count, 1)
+            cache.guardar('09', b'x' * 100)
+            cache.guardar('10', b'x' * 100)
+            self.assertEqual(desalojar.call_count, 2)
+        self.assertLessEqual(sum(f.stat().st_size for f in Path(self.directorio_cache).rglob('*.pdf')), 1000)
+
+    def test_comando_zip_en_paralelo(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            destino = os.path.join(directorio, 'reportes.zip')
+            call_command('generate_reports', archivo_zip=destino, workers=2, stdout=StringIO())
+            with zipfile.ZipFile(destino) as archivo:
+                nombres = archivo.namelist()
+                self.assertEqual(len(nombres), 5)
+                self.assertIn(f"reporte_{self.proyectos[0].pk}_Casa_0_B.pdf", nombres)
+                self.assertTrue(archivo.read(nombres[0]).startswith(b'%PDF'))
+
+    def test_accion_admin(self):
+        usuario = User.objects.create_superuser("admin", "admin@example.com", "clave")
+        self.client.force_login(usuario)
+        respuesta = self.client.post(reverse('admin:gestion_proyecto_changelist'), {
+            'action': 'generar_reportes_pdf',
+            '_selected_action': [p.pk for p in self.proyectos[:2]],
+        })
+        self.assertEqual(respuesta['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(respuesta.streaming_content))) as archivo:
+            self.assertEqual(len(archivo.namelist()), 2)
+
+        # Por encima del máximo no se renderiza en la petición: se encola una tarea.
+        with override_settings(CEV_REPORTES_MAXIMO_ADMIN=1):
+            respuesta = self.client.post(reverse('admin:gestion_proyecto_changelist'), {
+                'action': 'generar_reportes_pdf',
+                '_selected_action': [p.pk for p in self.proyectos[:2]],
+            })
+        self.assertEqual(respuesta.status_code, 302)
+        tarea = Tarea.objects.get()
+        self.assertEqual((tarea.tipo, tarea.parametros), ('reportes_pdf', {'ids': [p.pk for p in self.proyectos[:2]]}))
+
+
+@override_settings(CEV_ORGANIZACION_OBLIGATORIA=False)
+class DashboardTests(TestCase):
+    """Dashboard con un aggregate condicional y caché invalidado por señales."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = Cliente.objects.create(nombre="Cliente", contacto="c@example.com")
+        tipo = TipoProyecto.objects.create(nombre="Casa")
+        material = Material.objects.create(nombre="Lana", conductividad=Decimal('0.8'))
+        for i in range(6):
+            proyecto = Proyecto.objects.create(cliente=cliente, tipo=tipo, nombre=f"Casa {i}")
+            if i % 2:
+                Muro.objects.create(
+                    proyecto=proyecto, material_aislante=material, ubicacion="Norte", superficie=Decimal('10.00')
+                )
+        ResultadoCEV.objects.create(proyecto=proyecto, calificacion='B', consumo_energia_anual=100)
+        cls.proyecto = proyecto
+
+    def setUp(self):
+        cache.clear()
+
+    def test_conteos_y_distribuciones(self):
+        with self.assertNumQueries(3):
+            datos = calcular_dashboard()
+        self.assertEqual(datos['total_proyectos'], 6)
+        self.assertEqual(datos['total_clientes'], 1)
+        self.assertEqual(datos['proyectos_calificados'], 1)
+        self.assertEqual(datos['proyectos_en_curso'], 5)
+        self.assertEqual(datos['calificaciones'], [{'calificacion': 'B', 'count': 1}])
+        self.assertEqual(datos['calificaciones_estimadas'], [
+            {'calificacion_estimada': 'A', 'count': 3},
+            {'calificacion_estimada': SIN_DATOS, 'count': 3},
+        ])
+        self.assertEqual(len(datos['proyectos_recientes']), 5)
+
+    def test_home_desde_cache_e_invalidacion(self):
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            respuesta = self.client.get(reverse('home'))
+        self.assertEqual(respuesta.context['total_proyectos'], 6)
+
+        self.proyecto.resultados.delete()
+        respuesta = self.client.get(reverse('home'))
+        self.assertEqual(respuesta.context['proyectos_calificados'], 0)
+
+
+@override_settings(CEV_ORGANIZACION_OBLIGATORIA=False)
+class PaginacionKeysetTests(TestCase):
+    """Listado paginado por (fecha_inicio, id) con tokens opacos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = Cliente.objects.create(nombre="Cliente", contacto="c@example.com")
+        tipo = TipoProyecto.objects.create(nombre="Casa")
+        material = Material.objects.create(nombre="Lana", conductividad=Decimal('0.8'))
+        # Fechas repetidas para que el desempate por id importe.
+        for i in range(25):
+            proyecto = Proyecto.objects.create(
+                cliente=cliente, tipo=tipo, nombre=f"Casa {i}", fecha_inicio=date(2024, 1, 1 + i // 4)
+            )
+            if i % 3 == 0:
+                Muro.objects.create(
+                    proyecto=proyecto, material_aislante=material, ubicacion="Norte",
+                    superficie=Decimal(i + 1),
+                )
+
+    def recorrer(self, **params):
+        """Pks de todas las páginas hacia adelante y luego de vuelta hacia atrás."""
+        adelante, urls = [], []
+        url = reverse('proyecto-list') + '?' + '&'.join(f'{k}={v}' for k, v in params.items())
+        while url:
+            respuesta = self.client.get(url)
+            urls.append(url)
+            pagina = respuesta.context['page_obj']
+            adelante.append([p.pk for p in pagina])
+            siguiente = pagina.url_siguiente
+            url = reverse('proyecto-list') + siguiente if siguiente else None
+        atras = [adelante[-1]]
+        pagina = respuesta.context['page_obj']
+        while pagina.url_anterior:
+            pagina = self.client.get(reverse('proyecto-list') + pagina.url_anterior).context['page_obj']
+            atras.append([p.pk for p in pagina])
+        return adelante, atras[::-1]
+
+    def test_recorre_en_orden_por_fecha(self):
+        adelante, atras = self.recorrer()
+        esperado = list(Proyecto.objects.order_by('-fecha_inicio', '-id').values_list('pk', flat=True))
+        self.assertEqual([len(p) for p in adelante], [10, 10, 5])
+        self.assertEqual(sum(adelante, []), esperado)
+        self.assertEqual(atras, adelante)
+
+    def test_recorre_en_orden_por_calificacion(self):
+        adelante, atras = self.recorrer(orden='calificacion')
+        esperado = list(Proyecto.objects.order_by(
+            'rango_calificacion', '-fecha_inicio', '-id'
+        ).values_list('pk', flat=True))
+        self.assertEqual(sum(adelante, []), esperado)
+        self.assertEqual(atras, adelante)
+
+    def test_pagina_profunda_sin_count(self):
+        url = reverse('proyecto-list')
+        siguiente = self.client.get(url).context['page_obj'].url_siguiente
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url + siguiente)
+        self.assertIsNone(respuesta.context['page_obj'].total)
+        self.assertFalse(any('OFFSET' in q['sql'] for q in consultas.captured_queries))
+        # Solo el COUNT del aviso del mes; el listado no cuenta.
+        self.assertEqual(sum('COUNT(' in q['sql'] for q in consultas.captured_queries), 1)
+
+        respuesta = self.client.get(url + siguiente + '&contar=1')
+        self.assertEqual(respuesta.context['page_obj'].total, 25)
+
+    def test_token_invalido(self):
+        respuesta = self.client.get(reverse('proyecto-list'), {'cursor': 'manipulado'})
+        self.assertEqual(respuesta.status_code, 404)
+        token = self.client.get(reverse('proyecto-list')).context['page_obj'].siguiente
+        # Un token del orden por fecha no sirve para el orden por calificación.
+        respuesta = self.client.get(reverse('proyecto-list'), {'cursor': token, 'orden': 'calificacion'})
+        self.assertEqual(respuesta.status_code, 404)
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN es propio de SQLite")
+class PlanesDeConsultaTests(TestCase):
+    """
+    Ejecuta EXPLAIN QUERY PLAN sobre cada consulta de las vistas y del admin y
+    falla si alguna recorre completa una tabla grande (``SCAN tabla`` sin índice).
+    Un SCAN ya en el orden final y cortado por LIMIT (p. ej. ORDER BY id DESC)
+    no es completo. Las tablas de referencia, que se leen enteras para los
+    filtros, se permiten.
+    """
+
+    TABLAS_GRANDES = {
+        Proyecto._meta.db_table,
+        Muro._meta.db_table,
+        ResultadoCEV._meta.db_table,
+        Proyecto.sistemas.through._meta.db_table,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        clientes = [Cliente.objects.create(nombre=f"Cliente {i}", contacto=f"c{i}@example.com") for i in range(3)]
+        tipos = [TipoProyecto.objects.create(nombre=nombre) for nombre in ("Casa", "Depto")]
+        sistema = SistemaClimatizacion.objects.create(tipo="Bomba de calor")
+        materiales = [
+            Material.objects.create(nombre=f"Material {i}", conductividad=Decimal('0.4') * (i + 1))
+            for i in range(3)
+        ]
+        for i in range(40):
+            proyecto = Proyecto.objects.create(
+                cliente=clientes[i % 3], tipo=tipos[i % 2], nombre=f"Proyecto {i}",
+                fecha_inicio=date(2024, 1 + i % 12, 1 + i % 28),
+            )
+            proyecto.sistemas.add(sistema)
+            for j in range(3):
+                Muro.objects.create(
+                    proyecto=proyecto, material_aislante=materiales[(i + j) % 3],
+                    ubicacion="Norte", superficie=Decimal(10 + j),
+                )
+            if i % 4 == 0:
+                ResultadoCEV.objects.create(proyecto=proyecto, calificacion='ABCD'[i // 4 % 4], consumo_energia_anual=90)
+        cls.proyecto = proyecto
+        cls.cliente = clientes[0]
+        cls.tipo = tipos[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def urls(self):
+        lista = reverse('proyecto-list')
+        siguiente = self.client.get(lista).context['page_obj'].url_siguiente
+        yield reverse('home')
+        yield lista
+        yield lista + siguiente
+        yield f"{lista}?cliente={self.cliente.pk}"
+        yield f"{lista}?tipo={self.tipo.pk}"
+        yield f"{lista}?calificacion=A"
+        yield f"{lista}?orden=calificacion"
+        yield f"{lista}?search=proyecto"
+        yield reverse('proyecto-detalle', args=[self.proyecto.pk])
+        yield reverse('admin:gestion_proyecto_changelist')
+        yield reverse('admin:gestion_proyecto_changelist') + f"?cliente__id__exact={self.cliente.pk}"
+        yield reverse('admin:gestion_proyecto_changelist') + f"?tipo__id__exact={self.tipo.pk}"
+        yield reverse('admin:gestion_proyecto_changelist') + "?q=proyecto"
+        yield reverse('admin:gestion_proyecto_change', args=[self.proyecto.pk])
+        yield reverse('admin:gestion_resultadocev_changelist') + "?calificacion__exact=A"
+        yield reverse('admin:gestion_muro_changelist')
+
+    def test_sin_recorridos_completos(self):
+        problemas = []
+        for url in self.urls():
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+            for consulta in consultas.captured_queries:
+                sql = consulta['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                    plan = [detalle for *_, detalle in cursor.fetchall()]
+                acotado = ' LIMIT ' in sql and not any('TEMP B-TREE' in detalle for detalle in plan)
+                for detalle in plan:
+                    tabla = detalle.split()[1] if detalle.startswith('SCAN ') else None
+                    if tabla in self.TABLAS_GRANDES and ' USING ' not in detalle and not acotado:
+                        problemas.append(f"{url}: {detalle}\n    {sql}")
+        self.assertEqual(problemas, [], "\n".join(problemas))
+
+
+@skipUnless(soporta_busqueda(connection), "Requiere SQLite (FTS5) o PostgreSQL")
+@override_settings(CEV_ORGANIZACION_OBLIGATORIA=False)
+class BusquedaTextoCompletoTests(TestCase):
+    """Índice de búsqueda sincronizado por señales y ordenado por relevancia."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        cls.cliente = Cliente.objects.create(nombre="Constructora Andes", contacto="a@example.com")
+        cls.tipo = TipoProyecto.objects.create(nombre="Casa")
+        cls.por_nombre = Proyecto.objects.create(
+            cliente=cls.cliente, tipo=cls.tipo, nombre="Edificio Solar", descripcion="Torre de oficinas"
+        )
+        cls.por_descripcion = Proyecto.objects.create(
+            cliente=cls.cliente, tipo=cls.tipo, nombre="Casa Norte", descripcion="Paneles de energía solar"
+        )
+        Proyecto.objects.create(cliente=cls.cliente, tipo=cls.tipo, nombre="Bodega", descripcion="Sin aislación")
+
+    def buscar(self, texto):
+        return list(buscar_proyectos(Proyecto.objects.all(), texto).order_by('relevancia').values_list('pk', flat=True))
+
+    def test_relevancia_prefijos_y_acentos(self):
+        self.assertEqual(self.buscar("sol"), [self.por_nombre.pk, self.por_descripcion.pk])
+        self.assertEqual(self.buscar("ENERGIA"), [self.por_descripcion.pk])
+        self.assertEqual(len(self.buscar("andes")), 3)
+        self.assertEqual(self.buscar('solar"*'), [self.por_nombre.pk, self.por_descripcion.pk])
+        self.assertEqual(self.buscar("!!"), [])
+
+    def test_sincronizado_por_senales(self):
+        self.por_nombre.nombre = "Edificio Eólico"
+        self.por_nombre.save()
+        self.assertEqual(self.buscar("eolico"), [self.por_nombre.pk])
+        self.assertEqual(self.buscar("solar"), [self.por_descripcion.pk])
+
+        self.cliente.nombre = "Inmobiliaria Pacífico"
+        self.cliente.save()
+        self.assertEqual(self.buscar("andes"), [])
+        self.assertEqual(len(self.buscar("pacifico")), 3)
+
+        self.por_descripcion.delete()
+        self.assertEqual(self.buscar("solar"), [])
+
+    def test_listado_y_admin(self):
+        respuesta = self.client.get(reverse('proyecto-list'), {'search': 'solar'})
+        self.assertEqual([p.pk for p in respuesta.context['proyectos']], [self.por_nombre.pk, self.por_descripcion.pk])
+
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('admin:gestion_proyecto_changelist'), {'q': 'solar'})
+        self.assertEqual(
+            [p.pk for p in respuesta.context['cl'].result_list], [self.por_nombre.pk, self.por_descripcion.pk]
+        )
+
+    def test_importacion_indexa(self):
+        contenido = (
+            "proyecto_ref,cliente_contacto,cliente_nombre,proyecto_nombre,tipo\n"
+            "1,a@example.com,Constructora Cordillera,Refugio Patagónico,Casa\n"
+        )
+        ImportadorCEV().importar(StringIO(contenido), 'csv')
+        self.assertEqual(len(self.buscar("patagonico")), 1)
+        # El upsert renombró al cliente: sus proyectos anteriores también se reindexan.
+        self.assertEqual(len(self.buscar("cordillera")), 4)
+
+
+class ConteosAdminTests(TestCase):
+    """Columnas agregadas de los admins de referencia: anotadas y ordenables."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        cls.tipo = TipoProyecto.objects.create(nombre="Casa")
+        cls.sistema = SistemaClimatizacion.objects.create(tipo="Bomba de calor")
+        cls.lana = Material.objects.create(nombre="Lana", conductividad=Decimal('0.040'))
+        cls.eps = Material.objects.create(nombre="EPS", conductividad=Decimal('0.035'))
+        cls.cliente = Cliente.objects.create(nombre="Con proyectos", contacto="a@example.com")
+        Cliente.objects.create(nombre="Sin proyectos", contacto="b@example.com")
+        for i in range(3):
+            proyecto = Proyecto.objects.create(cliente=cls.cliente, tipo=cls.tipo, nombre=f"Casa {i}")
+            proyecto.sistemas.add(cls.sistema)
+            for superficie in ('10.00', '5.50'):
+                Muro.objects.create(
+                    proyecto=proyecto, material_aislante=cls.lana, ubicacion="Norte", superficie=Decimal(superficie)
+                )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def changelist(self, modelo, **params):
+        respuesta = self.client.get(reverse(f'admin:gestion_{modelo}_changelist'), params)
+        self.assertEqual(respuesta.status_code, 200)
+        return list(respuesta.context['cl'].result_list)
+
+    def test_valores_anotados(self):
+        clientes = {c.nombre: c.num_proyectos for c in self.changelist('cliente')}
+        self.assertEqual(clientes, {"Con proyectos": 3, "Sin proyectos": 0})
+        self.assertEqual(self.changelist('tipoproyecto')[0].num_proyectos, 3)
+        self.assertEqual(self.changelist('sistemaclimatizacion')[0].num_proyectos, 3)
+
+        lana = next(m for m in self.changelist('material') if m.pk == self.lana.pk)
+        self.assertEqual((lana.num_muros, lana.superficie_muros, lana.num_proyectos), (6, Decimal('46.50'), 3))
+        eps = next(m for m in self.changelist('material') if m.pk == self.eps.pk)
+        self.assertEqual((eps.num_muros, eps.superficie_muros, eps.num_proyectos), (0, 0, 0))
+
+    def test_ordenable_y_consultas_fijas(self):
+        # Columna 3 (total de proyectos), descendente.
+        self.assertEqual([c.nombre for c in self.changelist('cliente', o='-3')], ["Con proyectos", "Sin proyectos"])
+        self.assertEqual([c.nombre for c in self.changelist('cliente', o='3')], ["Sin proyectos", "Con proyectos"])
+
+        with CaptureQueriesContext(connection) as antes:
+            self.changelist('material')
+        for i in range(10):
+            Material.objects.create(nombre=f"Material {i}", conductividad=Decimal('0.5'))
+        with self.assertNumQueries(len(antes)):
+            self.changelist('material')
+
+
+@override_settings(CEV_ORGANIZACION_OBLIGATORIA=False)
+class APIv1Tests(TestCase):
+    """API JSON de solo lectura: campos, include, cursor y ETag."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nombre="Cliente", contacto="c@example.com")
+        tipo = TipoProyecto.objects.create(nombre="Casa")
+        material = Material.objects.create(nombre="Lana", conductividad=Decimal('0.040'))
+        cls.proyectos = []
+        for i in range(5):
+            proyecto = Proyecto.objects.create(cliente=cls.cliente, tipo=tipo, nombre=f"Casa {i}")
+            for ubicacion in ("Norte", "Sur"):
+                Muro.objects.create(
+                    proyecto=proyecto, material_aislante=material, ubicacion=ubicacion, superficie=Decimal('10.00')
+                )
+            cls.proyectos.append(proyecto)
+        ResultadoCEV.objects.create(proyecto=proyecto, calificacion='A', consumo_energia_anual=70)
+
+    def test_campos_include_y_cursor(self):
+        url = reverse('api-v1-proyectos')
+        # Página, muros de la página (una consulta) y nada más.
+        with self.assertNumQueries(2):
+            datos = self.client.get(url, {'fields': 'nombre,cliente', 'include': 'muros', 'limite': 2}).json()
+        self.assertEqual(datos['resultados'][0], {
+            'id': self.proyectos[0].pk, 'nombre': "Casa 0", 'cliente': self.cliente.pk,
+            'muros': datos['resultados'][0]['muros'],
+        })
+        self.assertEqual([m['ubicacion'] for m in datos['resultados'][0]['muros']], ["Norte", "Sur"])
+        self.assertIsNone(datos['anterior'])
+
+        ids = [fila['id'] for fila in datos['resultados']]
+        while datos['siguiente']:
+            datos = self.client.get(datos['siguiente']).json()
+            ids += [fila['id'] for fila in datos['resultados']]
+        self.assertEqual(ids, [p.pk for p in self.proyectos])
+
+        detalle = self.client.get(reverse('api-v1-proyecto', args=[self.proyectos[-1].pk])).json()
+        self.assertEqual((detalle['calificacion'], detalle['superficie_total']), ('A', '20.00'))
+
+    def test_etag_y_errores(self):
+        url = reverse('api-v1-clientes')
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.json()['resultados'], [
+            {'id': self.cliente.pk, 'nombre': "Cliente", 'contacto': "c@example.com"}
+        ])
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+
+        self.assertEqual(self.client.get(url, {'fields': 'clave'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'cursor': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api-v1-proyectos'), {'include': 'clientes'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api-v1-proyecto', args=[0])).status_code, 404)
+        self.assertEqual(self.client.post(url).status_code, 405)
+
+        # Filtros con valores que el campo no acepta: 400, no 500.
+        respuesta = self.client.get(reverse('api-v1-muros'), {'proyecto': 'abc'})
+        self.assertEqual((respuesta.status_code, respuesta.json()['error']), (400, "Valor inválido para proyecto: 'abc'"))
+        self.assertEqual(self.client.get(reverse('api-v1-proyectos'), {'cliente': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('proyecto-list'), {'tipo': '1.5'}).status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='CEVProject.urls_asgi', CEV_ORGANIZACION_OBLIGATORIA=False)
+class VistasAsyncTests(TestCase):
+    """Las vistas async del perfil ASGI muestran lo mismo que las sync."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = Cliente.objects.create(nombre="Cliente", contacto="c@example.com")
+        tipo = TipoProyecto.objects.create(nombre="Casa")
+        material = Material.objects.create(nombre="Lana", conductividad=Decimal('0.8'))
+        for i in range(12):
+            cls.proyecto = Proyecto.objects.create(cliente=cliente, tipo=tipo, nombre=f"Casa {i}")
+            Muro.objects.create(
+                proyecto=cls.proyecto, material_aislante=material, ubicacion="Norte", superficie=Decimal('10.00')
+            )
+        ResultadoCEV.objects.create(proyecto=cls.proyecto, calificacion='A', consumo_energia_anual=70)
+
+    def setUp(self):
+        cache.clear()
+
+    async def comparar(self, url, claves):
+        respuesta = await self.async_client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        with override_settings(ROOT_URLCONF='CEVProject.urls'):
+            esperada = await sync_to_async(self.client.get)(url)
+        for clave in claves:
+            self.assertEqual(
+                await sync_to_async(list)(respuesta.context[clave]),
+                await sync_to_async(list)(esperada.context[clave]),
+                clave,
+            )
+        return respuesta
+
+    async def test_dashboard(self):
+        respuesta = await self.comparar(reverse('home'), ['proyectos_recientes', 'calificaciones'])
+        self.assertEqual(respuesta.context['total_proyectos'], 12)
+
+    async def test_listado_y_paginas(self):
+        respuesta = await self.comparar(reverse('proyecto-list'), ['proyectos', 'clientes', 'tipos'])
+        siguiente = respuesta.context['page_obj'].url_siguiente
+        respuesta = await self.comparar(reverse('proyecto-list') + siguiente, ['proyectos'])
+        self.assertEqual(len(respuesta.context['proyectos']), 2)
+        respuesta = await self.async_client.get(reverse('proyecto-list'), {'cursor': 'x'})
+        self.assertEqual(respuesta.status_code, 404)
+
+    async def test_detalle(self):
+        respuesta = await self.comparar(reverse('proyecto-detalle', args=[self.proyecto.pk]), ['muros'])
+        self.assertEqual(respuesta.context['proyecto'], self.proyecto)
+        respuesta = await self.async_client.get(reverse('proyecto-detalle', args=[0]))
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class DatosSinteticosYBenchmarkTests(TestCase):
+    """seed_cev genera datos reproducibles y benchmark_cev respeta los presupuestos."""
+
+    def sembrar(self, semilla):
+        call_command('seed_cev', clientes=3, proyectos=25, muros=4, semilla=semilla, lote=10, stdout=StringIO())
+        return list(
+            Proyecto.objects.filter(cliente__contacto__startswith=f"semilla{semilla}-")
+            .order_by('pk').values_list('nombre', 'fecha_inicio', 'superficie_total', 'calificacion_estimada')
+        )
+
+    def test_semilla_determinista(self):
+        datos = self.sembrar(7)
+        self.assertEqual(len(datos), 25)
+        self.assertEqual(Muro.objects.count(), 100)
+        self.assertFalse(Proyecto.objects.con_calificacion_desactualizada().exists())
+        with self.assertRaises(CommandError):
+            self.sembrar(7)
+
+        Proyecto.objects.all().delete()
+        Cliente.objects.all().delete()
+        self.assertEqual(self.sembrar(7), datos)
+        self.assertNotEqual(self.sembrar(8), datos)
+
+    def test_benchmark_json_y_presupuestos(self):
+        self.sembrar(1)
+        with tempfile.TemporaryDirectory() as directorio:
+            salida = os.path.join(directorio, 'benchmark.json')
+            call_command('benchmark_cev', repeticiones=1, salida=salida, stdout=StringIO())
+            with open(salida, encoding='utf-8') as archivo:
+                informe = json.load(archivo)
+        self.assertEqual(informe['datos']['proyectos'], 25)
+        for nombre in ('home', 'proyecto_list_profunda', 'proyecto_detalle', 'admin_muro', 'calificacion_python'):
+            resultado = informe['escenarios'][nombre]
+            self.assertLessEqual(resultado['consultas'], resultado['presupuesto'], nombre)
+            self.assertGreater(resultado['segundos_mediana'], 0)
+        # El usuario del admin se descarta al terminar.
+        self.assertFalse(User.objects.exists())
+
+        with self.assertRaisesMessage(CommandError, 'proyecto_list (4 > 1)'):
+            call_command(
+                'benchmark_cev', repeticiones=1, escenarios=['proyecto_list'],
+                presupuesto=['proyecto_list=1'], stdout=StringIO(),
+            )
+
+    @skipUnless(connection.vendor == 'sqlite', "perfil SQLite")
+    def test_perfil_sqlite_produccion(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            ajustes = {
+                **connection.settings_dict, **settings.CEV_SQLITE_PRODUCCION,
+                'NAME': os.path.join(directorio, 'produccion.sqlite3'),
+            }
+            conexion = type(connections['default'])(ajustes, 'produccion')
+            try:
+                with conexion.cursor() as cursor:
+                    pragmas = [
+                        cursor.execute(f'PRAGMA {pragma}').fetchone()[0]
+                        for pragma in ('journal_mode', 'synchronous', 'temp_store', 'busy_timeout')
+                    ]
+            finally:
+                conexion.close()
+        # synchronous=NORMAL es 1 y temp_store=MEMORY es 2.
+        self.assertEqual(pragmas, ['wal', 1, 2, 5000])
+
+
+@skipUnless(connection.vendor == 'sqlite', "benchmark de SQLite")
+class BenchmarkSQLiteTests(TransactionTestCase):
+    """benchmark_sqlite copia la base (fuera de una transacción abierta) y mide ambos perfiles."""
+
+    def test_compara_perfiles(self):
+        call_command('seed_cev', clientes=2, proyectos=10, muros=2, semilla=3, stdout=StringIO())
+        salida = StringIO()
+        call_command('benchmark_sqlite', trabajadores=2, segundos=0.2, stdout=salida)
+        lineas = salida.getvalue().splitlines()
+        self.assertTrue(lineas[2].startswith('desarrollo') and lineas[3].startswith('produccion'), lineas)
+        self.assertIn("peticiones por segundo", lineas[4])
+
+
+class BenchmarkASGITests(TransactionTestCase):
+    """benchmark_asgi mide con una sesión: sin ella el middleware de organizaciones responde 403."""
+
+    def test_mide_wsgi_y_asgi(self):
+        call_command('seed_cev', clientes=2, proyectos=5, muros=2, semilla=4, stdout=StringIO())
+        salida = StringIO()
+        call_command('benchmark_asgi', concurrencia=2, peticiones=4, urls=['/', '/proyectos/'], stdout=salida)
+        lineas = salida.getvalue().splitlines()
+        self.assertEqual([linea.split()[:2] for linea in lineas[2:]], [
+            ['/', 'wsgi'], ['/', 'asgi'], ['/proyectos/', 'wsgi'], ['/proyectos/', 'asgi'],
+        ])
+        # El usuario de la sesión se borra al terminar.
+        self.assertFalse(User.objects.exists())
+
+
+@override_settings(CEV_METRICAS_DETALLE_SQL=True, CEV_ORGANIZACION_OBLIGATORIA=False)
+class MetricasTests(TestCase):
+    """Middleware de métricas, detección de N+1 y exposición en /metrics."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = Cliente.objects.create(nombre="Cliente", contacto="c@example.com")
+        tipo = TipoProyecto.objects.create(nombre="Casa")
+        material = Material.objects.create(nombre="Lana", conductividad=Decimal('0.8'))
+        cls.proyecto = Proyecto.objects.create(cliente=cliente, tipo=tipo, nombre="Casa")
+        for i in range(6):
+            Muro.objects.create(
+                proyecto=cls.proyecto, material_aislante=material, ubicacion=f"Muro {i}", superficie=Decimal('10.00')
+            )
+        cls.usuario = User.objects.create_superuser("admin", "admin@example.com", "clave")
+
+    def setUp(self):
+        cache.clear()
+        precargar_referencias()
+
+    def test_consultas_y_latencia_por_vista(self):
+        peticiones = PETICIONES.valor('proyecto-detalle', 'GET', 200)
+        latencias = DURACION_PETICION.total('proyecto-detalle')
+        respuesta = self.client.get(reverse('proyecto-detalle', args=[self.proyecto.pk]))
+        # Proyecto, versión de los datos de referencia, sistemas y muros.
+        self.assertTrue(respuesta['X-CEV-SQL'].startswith('consultas=4;'))
+        self.assertEqual(PETICIONES.valor('proyecto-detalle', 'GET', 200), peticiones + 1)
+        self.assertEqual(DURACION_PETICION.total('proyecto-detalle'), latencias + 1)
+
+        with self.assertLogs('gestion.metricas', 'INFO') as logs:
+            self.client.get('/no-existe/')
+        self.assertIn('vista=sin_ruta', logs.output[0])
+
+    def test_detecta_n_mas_1(self):
+        self.client.force_login(self.usuario)
+        vista = 'admin:gestion_muro_changelist'
+        antes = PETICIONES_N_MAS_1.valor(vista)
+        self.client.get(reverse(vista))
+        self.assertEqual(PETICIONES_N_MAS_1.valor(vista), antes)
+
+        # Sin select_related, str(muro.proyecto) consulta una vez por fila.
+        with mock.patch.object(MuroAdmin, 'list_select_related', False):
+            respuesta = self.client.get(reverse(vista))
+        self.assertEqual(PETICIONES_N_MAS_1.valor(vista), antes + 1)
+        self.assertIn('6x SELECT', respuesta['X-CEV-SQL'])
+
+    def test_streaming_se_registra_al_terminar_el_flujo(self):
+        vista = 'proyecto-exportar'
+        peticiones = PETICIONES.valor(vista, 'GET', 200)
+        respuesta = self.client.get(reverse(vista))
+        self.assertTrue(respuesta.streaming)
+        # La vista solo arma el generador: las consultas del CSV aún no corrieron.
+        self.assertEqual(PETICIONES.valor(vista, 'GET', 200), peticiones)
+
+        with CaptureQueriesContext(connection) as consultas, self.assertLogs('gestion.metricas', 'INFO') as logs:
+            b''.join(respuesta.streaming_content)
+        self.assertGreater(len(consultas), 0)
+        self.assertEqual(PETICIONES.valor(vista, 'GET', 200), peticiones + 1)
+        self.assertIn(f"vista={vista}", logs.output[0])
+        self.assertIn(f", {len(consultas)} consultas", logs.output[0])
+        self.assertNotIn('X-CEV-SQL', respuesta)
+
+    @override_settings(ROOT_URLCONF='CEVProject.urls_asgi')
+    async def test_vistas_async(self):
+        respuesta = await self.async_client.get(reverse('proyecto-detalle', args=[self.proyecto.pk]))
+        # Las consultas corren en el hilo de sync_to_async y se cuentan igual.
+        self.assertTrue(respuesta['X-CEV-SQL'].startswith('consultas=4;'))
+
+    def test_exposicion_prometheus(self):
+        renders = RENDER_PDF.total()
+        with tempfile.TemporaryDirectory() as directorio, override_settings(CEV_REPORTES_CACHE_DIR=directorio):
+            self.client.get(reverse('proyecto-pdf', args=[self.proyecto.pk]))
+        self.assertEqual(RENDER_PDF.total(), renders + 1)
+
+        # Solo staff o Prometheus con el token; nunca anónimo.
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+        with override_settings(CEV_METRICAS_TOKEN='secreto', CEV_ORGANIZACION_OBLIGATORIA=True):
+            self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+            malo = self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer otro')
+            self.assertEqual(malo.status_code, 403)
+            respuesta = self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer secreto')
+            self.assertEqual(respuesta.status_code, 200)
+            # El token no abre otras rutas.
+            self.assertEqual(
+                self.client.get(reverse('proyecto-list'), HTTP_AUTHORIZATION='Bearer secreto').status_code, 403
+            )
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('metricas'))
+        self.assertEqual(respuesta['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        texto = respuesta.content.decode()
+        self.assertIn('# TYPE cev_peticion_segundos histogram', texto)
+        self.assertIn('cev_peticion_segundos_bucket{vista="proyecto-pdf",le="+Inf"}', texto)
+        self.assertIn('cev_peticiones_total{vista="proyecto-pdf",metodo="GET",estado="200"}', texto)
+        self.assertIn('cev_pdf_render_segundos_count', texto)
+
+
+@override_settings(CEV_ORGANIZACION_OBLIGATORIA=False)
+class FragmentosCacheTests(TestCase):
+    """Versión de proyectos y fragmentos de plantilla en caché."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nombre="Cliente", contacto="c@example.com")
+        cls.tipo = TipoProyecto.objects.create(nombre="Casa")
+        cls.material = Material.objects.create(nombre="Lana", conductividad=Decimal('0.8'))
+        cls.sistema = SistemaClimatizacion.objects.create(tipo="Caldera")
+        cls.proyecto = Proyecto.objects.create(cliente=cls.cliente, tipo=cls.tipo, nombre="Casa Norte")
+        cls.muro = Muro.objects.create(
+            proyecto=cls.proyecto, material_aislante=cls.material, ubicacion="Norte", superficie=Decimal('10.00')
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def assertSubeVersion(self, cambio):
+        antes = Proyecto.objects.values_list('version', flat=True).get(pk=self.proyecto.pk)
+        cambio()
+        despues = Proyecto.objects.values_list('version', flat=True).get(pk=self.proyecto.pk)
+        self.assertGreater(despues, antes)
+
+    def test_version_sube_con_cada_cambio(self):
+        proyecto = Proyecto.objects.get(pk=self.proyecto.pk)
+        version = proyecto.version
+        proyecto.nombre = "Casa Sur"
+        proyecto.save()
+        self.assertEqual(proyecto.version, version + 1)
+
+        def mover_muro():
+            self.muro.ubicacion = "Sur"
+            self.muro.save()
+
+        def renombrar(objeto, campo):
+            def cambio():
+                setattr(objeto, campo, "Otro nombre")
+                objeto.save()
+            return cambio
+
+        self.assertSubeVersion(mover_muro)
+        self.assertSubeVersion(lambda: ResultadoCEV.objects.create(
+            proyecto=self.proyecto, calificacion='B', consumo_energia_anual=100
+        ))
+        self.assertSubeVersion(lambda: self.proyecto.sistemas.add(self.sistema))
+        self.assertSubeVersion(lambda: self.sistema.proyectos.clear())
+        self.assertSubeVersion(renombrar(self.cliente, 'nombre'))
+
+        # Guardar sin cambios visibles no reescribe los proyectos.
+        with CaptureQueriesContext(connection) as consultas:
+            Cliente.objects.get(pk=self.cliente.pk).save()
+            Material.objects.get(pk=self.material.pk).save()
+        self.assertFalse([c for c in consultas if c['sql'].startswith('UPDATE "gestion_proyecto"')])
+
+    def test_catalogo_cambia_la_clave_sin_reescribir_proyectos(self):
+        url_detalle = reverse('proyecto-detalle', args=[self.proyecto.pk])
+        self.proyecto.sistemas.add(self.sistema)
+        self.assertContains(self.client.get(url_detalle), "Caldera")
+        version = Proyecto.objects.values_list('version', flat=True).get(pk=self.proyecto.pk)
+
+        material = Material.objects.get(pk=self.material.pk)
+        material.nombre = "Lana de roca"
+        material.save()
+        tipo = TipoProyecto.objects.get(pk=self.tipo.pk)
+        tipo.nombre = "Departamento"
+        tipo.save()
+        respuesta = self.client.get(url_detalle)
+        self.assertContains(respuesta, "Lana de roca")
+        self.assertContains(respuesta, "Departamento")
+
+        SistemaClimatizacion.objects.get(pk=self.sistema.pk).delete()
+        self.assertNotContains(self.client.get(url_detalle), "Caldera")
+        self.assertEqual(Proyecto.objects.values_list('version', flat=True).get(pk=self.proyecto.pk), version)
+
+    def test_paginas_tibias_casi_sin_consultas(self):
+        url_detalle = reverse('proyecto-detalle', args=[self.proyecto.pk])
+        self.client.get(reverse('proyecto-list'))
+        self.client.get(url_detalle)
+        # Listado: la página, el conteo del mes y la versión de los datos de
+        # referencia (tipos); detalle: solo el proyecto.
+        with self.assertNumQueries(3):
+            self.client.get(reverse('proyecto-list'))
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(url_detalle)
+        self.assertContains(respuesta, "Norte")
+
+        # Un cambio en un muro sube la versión y el detalle se vuelve a renderizar.
+        self.muro.ubicacion = "Poniente"
+        self.muro.save()
+        respuesta = self.client.get(url_detalle)
+        self.assertContains(respuesta, "Poniente")
+        self.assertNotContains(respuesta, "<strong>Norte</strong>")
+
+        ResultadoCEV.objects.create(proyecto=self.proyecto, calificacion='A', consumo_energia_anual=70)
+        self.assertContains(self.client.get(reverse('proyecto-list')), "Calificado (A)")
+
+    def test_filtros_por_version_de_referencias(self):
+        self.client.get(reverse('proyecto-list'))
+        Cliente.objects.create(nombre="Cliente Nuevo", contacto="nuevo@example.com")
+        respuesta = self.client.get(reverse('proyecto-list'))
+        self.assertIn("Cliente Nuevo", [cliente.nombre for cliente in respuesta.context['clientes']])
+
+
+class CertificacionTests(TestCase):
+    """Certificación masiva con bulk_create(update_conflicts=True) y simulación."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nombre="Cliente", contacto="c@example.com")
+        otro = Cliente.objects.create(nombre="Otro", contacto="o@example.com")
+        tipo = TipoProyecto.objects.create(nombre="Casa")
+        cls.lana = Material.objects.create(nombre="Lana", conductividad=Decimal('0.3'))
+        cls.proyectos = []
+        for i in range(5):
+            proyecto = Proyecto.objects.create(
+                cliente=cls.cliente if i < 4 else otro, tipo=tipo, nombre=f"Casa {i}"
+            )
+            if i < 3:
+                Muro.objects.create(
+                    proyecto=proyecto, material_aislante=cls.lana, ubicacion="Norte", superficie=Decimal('10')
+                )
+            cls.proyectos.append(proyecto)
+        # Proyecto 0 ya certificado, con una calificación que ya no corresponde.
+        ResultadoCEV.objects.create(
+            proyecto=cls.proyectos[0], calificacion='C', consumo_energia_anual=150,
+            fecha_calificacion=date(2020, 1, 1),
+        )
+
+    def certify(self, *args):
+        salida = StringIO()
+        call_command('certify', *args, stdout=salida)
+        return salida.getvalue()
+
+    def test_pendientes_en_un_lote(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.certify('--pending', '--lote', '100')
+        # Lectura del lote + fin, upsert y versión (más savepoints de la transacción).
+        self.assertLessEqual(len([c for c in consultas if 'SAVEPOINT' not in c['sql']]), 4)
+        self.assertEqual(
+            sorted(ResultadoCEV.objects.values_list('proyecto__nombre', 'calificacion')),
+            [('Casa 0', 'C'), ('Casa 1', 'A+'), ('Casa 2', 'A+')],
+        )
+        self.assertEqual(ResultadoCEV.objects.get(proyecto=self.proyectos[1]).consumo_energia_anual, 50)
+
+    def test_simulacion_informa_sin_escribir(self):
+        salida = self.certify('--all', '--dry-run')
+        self.assertIn(f"#{self.proyectos[0].pk}: C (150.00 kWh/m²) -> A+ (50 kWh/m²)", salida)
+        self.assertIn("2 resultados se crearían, 1 se actualizarían", salida)
+        self.assertEqual(ResultadoCEV.objects.count(), 1)
+        self.assertEqual(ResultadoCEV.objects.get().calificacion, 'C')
+
+    def test_recertifica_solo_lo_que_cambia(self):
+        version = Proyecto.objects.get(pk=self.proyectos[0].pk).version
+        salida = self.certify('--cliente', str(self.cliente.pk), '--lote', '2')
+        self.assertIn("2 resultados creados, 1 actualizados, 0 sin cambios, 1 sin muros", salida)
+        resultado = ResultadoCEV.objects.get(proyecto=self.proyectos[0])
+        self.assertEqual((resultado.calificacion, resultado.fecha_calificacion), ('A+', date.today()))
+        self.assertGreater(Proyecto.objects.get(pk=self.proyectos[0].pk).version, version)
+
+        self.assertIn("0 resultados creados, 0 actualizados, 3 sin cambios", self.certify('--all'))
+        with self.assertRaises(CommandError):
+            self.certify('--cliente', '999')
+
+    def test_accion_admin(self):
+        usuario = User.objects.create_superuser("admin", "admin@example.com", "clave")
+        self.client.force_login(usuario)
+        self.client.post(reverse('admin:gestion_proyecto_changelist'), {
+            'action': 'certificar',
+            '_selected_action': [p.pk for p in self.proyectos[:2]],
+        })
+        self.assertEqual(
+            sorted(ResultadoCEV.objects.values_list('proyecto__nombre', 'calificacion')),
+            [('Casa 0', 'A+'), ('Casa 1', 'A+')],
+        )
+
+
+@override_settings(CEV_ORGANIZACION_OBLIGATORIA=False)
+class TareasTests(TestCase):
+    """Cola de tareas en la base de datos: reclamo, reintentos, resultados y traspaso desde vistas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = Cliente.objects.create(nombre="Cliente", contacto="c@example.com")
+        tipo = TipoProyecto.objects.create(nombre="Casa")
+        material = Material.objects.create(nombre="Lana", conductividad=Decimal('0.3'))
+        cls.proyectos = [
+            Proyecto.objects.create(cliente=cliente, tipo=tipo, nombre=f"Casa {i}") for i in range(3)
+        ]
+        for proyecto in cls.proyectos:
+            Muro.objects.create(proyecto=proyecto, material_aislante=material, ubicacion="Norte", superficie=10)
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(
+            CEV_TAREAS_DIR=os.path.join(directorio.name, 'tareas'),
+            CEV_REPORTES_CACHE_DIR=os.path.join(directorio.name, 'reportes'),
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def run_workers(self):
+        call_command('run_workers', una_vez=True, stdout=StringIO())
+
+    def test_reclamo_exclusivo(self):
+        from .tareas import encolar, reclamar
+
+        tarea = encolar('recalcular_calificaciones')
+        reclamada = reclamar('uno')
+        self.assertEqual((reclamada.pk, reclamada.estado, reclamada.intentos), (tarea.pk, Tarea.EN_CURSO, 1))
+        self.assertIsNone(reclamar('dos'))
+
+    def test_reintentos_y_fallo_definitivo(self):
+        from .tareas import TIPOS, encolar, recuperar_abandonadas
+
+        def falla(ejecucion):
+            raise RuntimeError("sin conexión")
+
+        with mock.patch.dict(TIPOS, {'falla': falla}), self.assertLogs('gestion.tareas', 'WARNING'):
+            tarea = encolar('falla', max_intentos=2)
+            self.run_workers()
+            tarea.refresh_from_db()
+            self.assertEqual((tarea.estado, tarea.intentos), (Tarea.PENDIENTE, 1))
+            self.assertIn("RuntimeError: sin conexión", tarea.error)
+            self.assertGreater(tarea.disponible_desde, tarea.creada)
+
+            # Aún no toca reintentar; se adelanta la espera.
+            self.run_workers()
+            Tarea.objects.filter(pk=tarea.pk).update(disponible_desde=tarea.creada)
+            self.run_workers()
+            tarea.refresh_from_db()
+            self.assertEqual((tarea.estado, tarea.intentos), (Tarea.FALLIDA, 2))
+
+        # Una tarea en curso sin latido vuelve a la cola.
+        abandonada = encolar('recalcular_calificaciones')
+        Tarea.objects.filter(pk=abandonada.pk).update(estado=Tarea.EN_CURSO, latido=abandonada.creada.replace(year=2020))
+        self.assertEqual(recuperar_abandonadas(), 1)
+        abandonada.refresh_from_db()
+        self.assertEqual(abandonada.estado, Tarea.PENDIENTE)
+
+    def test_resultado_de_un_trabajador_que_perdio_la_tarea(self):
+        from .tareas import TIPOS, ejecutar, encolar, reclamar
+
+        def reclamada_por_otro(ejecucion):
+            # Como si el latido hubiera vencido y otro trabajador la reclamara.
+            Tarea.objects.filter(pk=ejecucion.tarea.pk).update(trabajador='dos', intentos=F('intentos') + 1)
+            return "Hecho por uno."
+
+        with mock.patch.dict(TIPOS, {'lenta': reclamada_por_otro}):
+            tarea = encolar('lenta')
+            with self.assertLogs('gestion.tareas', 'WARNING') as logs:
+                ejecutar(reclamar('uno'))
+        self.assertIn("se descarta su resultado", logs.output[0])
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.trabajador, tarea.mensaje), (Tarea.EN_CURSO, 'dos', ''))
+
+    def test_pdf_en_segundo_plano(self):
+        url = reverse('proyecto-pdf', args=[self.proyectos[0].pk])
+        self.assertEqual(self.client.get(url, {'segundo_plano': 1}).status_code, 403)
+        self.client.force_login(User.objects.create_user("ana"))
+        respuesta = self.client.get(url, {'segundo_plano': 1})
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(respuesta.json()['estado'], Tarea.PENDIENTE)
+
+        self.run_workers()
+        estado = self.client.get(respuesta['Location']).json()
+        self.assertEqual((estado['estado'], estado['progreso']), (Tarea.COMPLETADA, 100))
+        descarga = self.client.get(estado['url_resultado'])
+        self.assertTrue(b''.join(descarga.streaming_content).startswith(b'%PDF'))
+
+        # Otro usuario no ve la tarea ni su archivo; sin sesión, 403.
+        self.client.force_login(User.objects.create_user("beto"))
+        self.assertEqual(self.client.get(respuesta['Location']).status_code, 404)
+        self.assertEqual(self.client.get(estado['url_resultado']).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(respuesta['Location']).status_code, 403)
+
+    def test_exportacion_y_certificacion_en_segundo_plano(self):
+        self.assertEqual(
+            self.client.get(reverse('proyecto-exportar'), {'segundo_plano': 1}).status_code, 403
+        )
+        usuario = User.objects.create_superuser("admin", "admin@example.com", "clave")
+        self.client.force_login(usuario)
+        respuesta = self.client.get(reverse('proyecto-exportar'), {'search': '', 'segundo_plano': 1})
+        self.assertEqual(Tarea.objects.get().parametros, {'query': 'search=', 'formato': 'csv'})
+
+        self.client.post(reverse('admin:gestion_proyecto_changelist'), {
+            'action': 'certificar_segundo_plano',
+            '_selected_action': [p.pk for p in self.proyectos[:2]],
+        })
+        self.assertEqual(ResultadoCEV.objects.count(), 0)
+
+        self.run_workers()
+        estado = self.client.get(respuesta['Location']).json()
+        contenido = b''.join(self.client.get(estado['url_resultado']).streaming_content).decode('utf-8-sig')
+        self.assertEqual(len(list(csv.reader(io.StringIO(contenido)))), 4)
+        self.assertEqual(ResultadoCEV.objects.count(), 2)
+        self.assertEqual(Tarea.objects.filter(estado=Tarea.COMPLETADA).count(), 2)
+
+    def test_encolar_requiere_staff(self):
+        url = reverse('tarea-crear')
+        self.assertEqual(self.client.post(url, {'tipo': 'certificar'}).status_code, 403)
+        self.client.force_login(User.objects.create_user("staff", password="clave", is_staff=True))
+        self.assertEqual(self.client.post(url, {'tipo': 'desconocida'}).status_code, 400)
+        respuesta = self.client.post(url, {'tipo': 'certificar', 'parametros': '{"pendientes": true}'})
+        self.assertEqual(respuesta.status_code, 202)
+        self.run_workers()
+        self.assertEqual(ResultadoCEV.objects.count(), 3)
+
+        # La importación no se encola por HTTP: leería archivos del servidor.
+        respuesta = self.client.post(url, {'tipo': 'importar', 'parametros': '{"archivo": "/etc/passwd"}'})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_importar_solo_lee_entradas(self):
+        from .tareas import directorio_tareas, encolar, purgar_tareas
+
+        secreto = directorio_tareas().parent / 'secreto.csv'
+        secreto.parent.mkdir(parents=True, exist_ok=True)
+        secreto.write_text("cliente\nx\n")
+        tareas = [
+            encolar('importar', archivo=archivo, formato='csv')
+            for archivo in ('../secreto.csv', 'entradas/../../secreto.csv', str(secreto))
+        ]
+        with self.assertLogs('gestion.tareas', 'WARNING'):
+            self.run_workers()
+        for tarea in tareas:
+            tarea.refresh_from_db()
+            self.assertEqual(tarea.estado, Tarea.FALLIDA)
+            self.assertIn("no es una entrada de tareas", tarea.mensaje)
+            self.assertEqual(tarea.archivo, '')
+
+        # La purga tampoco borra fuera de entradas/.
+        Tarea.objects.update(terminada=timezone.now() - timedelta(days=365))
+        self.assertEqual(purgar_tareas(), 3)
+        self.assertTrue(secreto.exists())
+
+
+@override_settings(CEV_TAREAS_ABANDONO_SEGUNDOS=0.3)
+class LatidoTareasTests(TransactionTestCase):
+    """El hilo de latido mantiene reclamada una tarea que dura más que el plazo de abandono."""
+
+    def test_tarea_mas_larga_que_el_plazo(self):
+        from .tareas import TIPOS, ejecutar, encolar, reclamar, recuperar_abandonadas
+
+        recuperadas = []
+
+        def lenta(ejecucion):
+            # Sin llamar a ejecucion.avance, como un PDF grande.
+            time.sleep(1)
+            recuperadas.append(recuperar_abandonadas())
+            return "Hecho."
+
+        with mock.patch.dict(TIPOS, {'lenta': lenta}):
+            tarea = encolar('lenta')
+            ejecutar(reclamar('uno'))
+        tarea.refresh_from_db()
+        self.assertEqual(recuperadas, [0])
+        self.assertEqual((tarea.estado, tarea.intentos), (Tarea.COMPLETADA, 1))
+        self.assertGreater(tarea.latido, tarea.iniciada)
+
+
+class TransmitanciaTests(TestCase):
+    """Capas de muro, U = 1 / (Rsi + Σ e/λ + Rse) en SQL y NumPy, y su efecto en la calificación."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = Cliente.objects.create(nombre="Cliente", contacto="c@example.com")
+        tipo = TipoProyecto.objects.create(nombre="Casa")
+        cls.ladrillo = Material.objects.create(nombre="Ladrillo", conductividad=Decimal('0.8'))
+        cls.lana = Material.objects.create(nombre="Lana", conductividad=Decimal('0.04'))
+        cls.proyecto = Proyecto.objects.create(cliente=cliente, tipo=tipo, nombre="Casa")
+        cls.otro = Proyecto.objects.create(cliente=cliente, tipo=tipo, nombre="Sin capas")
+        cls.norte = Muro.objects.create(
+            proyecto=cls.proyecto, material_aislante=cls.ladrillo, ubicacion="Norte", superficie=Decimal('30')
+        )
+        cls.sur = Muro.objects.create(
+            proyecto=cls.proyecto, material_aislante=cls.ladrillo, ubicacion="Sur", superficie=Decimal('10')
+        )
+        for conductividad, superficie in (('0.4', '20'), ('1.6', '5')):
+            material = Material.objects.create(nombre=f"M {conductividad}", conductividad=Decimal(conductividad))
+            Muro.objects.create(
+                proyecto=cls.otro, material_aislante=material, ubicacion="Este", superficie=Decimal(superficie)
+            )
+
+    def capas(self, muro, *capas):
+        for orden, (material, espesor) in enumerate(capas):
+            CapaMuro.objects.create(muro=muro, material=material, espesor=Decimal(espesor), orden=orden)
+
+    def test_formula_y_calificacion_por_transmitancia(self):
+        self.capas(self.norte, (self.ladrillo, '0.140'), (self.lana, '0.080'))
+        self.norte.refresh_from_db()
+        # 1 / (0.13 + 0.14/0.8 + 0.08/0.04 + 0.04) = 1 / 2.345
+        self.assertAlmostEqual(self.norte.transmitancia, 1 / 2.345)
+        # Con un muro sin capas se sigue calificando por conductividad (0.8 -> A).
+        self.assertEqual(Proyecto.objects.get(pk=self.proyecto.pk).calificacion_estimada, 'A')
+
+        self.capas(self.sur, (self.ladrillo, '0.140'))
+        # (30 × 0.4264 + 10 × 1/0.345) / 40 = 1.04 -> C por transmitancia
+        proyecto = Proyecto.objects.get(pk=self.proyecto.pk)
+        sql = Proyecto.objects.with_rating().get(pk=self.proyecto.pk)
+        self.assertEqual(proyecto.calificacion_estimada, 'C')
+        self.assertEqual(sql.calificacion_calculada, 'C')
+        self.assertEqual(proyecto.calcular_calificacion_energetica(), 'C')
+
+    @override_settings(CEV_ORGANIZACION_OBLIGATORIA=False)
+    def test_orden_por_calificacion_sigue_la_transmitancia(self):
+        tercero = Proyecto.objects.create(cliente=self.proyecto.cliente, tipo=self.proyecto.tipo, nombre="Tercero")
+        material = Material.objects.create(nombre="M 0.9", conductividad=Decimal('0.9'))
+        Muro.objects.create(proyecto=tercero, material_aislante=material, ubicacion="Este", superficie=Decimal('10'))
+        self.capas(self.norte, (self.ladrillo, '0.140'), (self.lana, '0.080'))
+        self.capas(self.sur, (self.ladrillo, '0.140'))
+        # Casa (0.8 W/mK, pero C por transmitancia) va después de Tercero (0.9 W/mK, A).
+        proyectos = self.client.get(reverse('proyecto-list'), {'orden': 'calificacion'}).context['proyectos']
+        self.assertEqual(
+            [(p.nombre, p.calificacion_estimada) for p in proyectos],
+            [("Tercero", 'A'), ("Sin capas", 'A'), ("Casa", 'C')],
+        )
+
+    def test_senales_de_capa_y_material(self):
+        self.capas(self.norte, (self.lana, '0.100'))
+        capa = self.norte.capas.get()
+        self.lana.conductividad = Decimal('0.05')
+        self.lana.save()
+        self.norte.refresh_from_db()
+        self.assertAlmostEqual(self.norte.transmitancia, 1 / (0.17 + 2.0))
+
+        capa.delete()
+        self.norte.refresh_from_db()
+        self.assertIsNone(self.norte.transmitancia)
+
+    @skipUnless(importlib.util.find_spec('numpy'), "Requiere numpy")
+    def test_paridad_numpy(self):
+        from .transmitancia import actualizar_transmitancias, calificaciones
+
+        self.capas(self.norte, (self.ladrillo, '0.140'), (self.lana, '0.080'))
+        self.capas(self.sur, (self.ladrillo, '0.240'))
+        sql = dict(Muro.objects.values_list('pk', 'transmitancia'))
+
+        Muro.objects.update(transmitancia=None)
+        self.assertEqual(actualizar_transmitancias(lote=2), {self.proyecto.pk})
+        for pk, transmitancia in Muro.objects.values_list('pk', 'transmitancia'):
+            with self.subTest(muro=pk):
+                if sql[pk] is None:
+                    self.assertIsNone(transmitancia)
+                else:
+                    self.assertAlmostEqual(transmitancia, sql[pk])
+        # Sin cambios no se escribe nada.
+        self.assertEqual(actualizar_transmitancias(), set())
+
+        esperado = {
+            p.pk: (p.calificacion_calculada, p.consumo_calculado, p.conductividad_media)
+            for p in Proyecto.objects.with_rating()
+        }
+        with self.assertNumQueries(3):
+            obtenido = list(calificaciones(Proyecto.objects.all()))
+        self.assertEqual(len(obtenido), len(esperado))
+        for pk, _, conductividad, calificacion, consumo in obtenido:
+            self.assertEqual((calificacion, consumo), esperado[pk][:2])
+            self.assertAlmostEqual(conductividad, esperado[pk][2])
+
+
+@override_settings(CEV_ORGANIZACION_OBLIGATORIA=False)
+class ReferenciasCacheTests(TestCase):
+    """Caché en memoria de Material, TipoProyecto y SistemaClimatizacion con versión en la base de datos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cliente = Cliente.objects.create(nombre="Cliente", contacto="c@example.com")
+        cls.tipo = TipoProyecto.objects.create(nombre="Casa")
+        cls.lana = Material.objects.create(nombre="Lana", conductividad=Decimal('0.8'))
+        cls.bomba = SistemaClimatizacion.objects.create(tipo="Bomba de calor", eficiencia_nominal=Decimal('3.5'))
+        cls.proyecto = Proyecto.objects.create(cliente=cliente, tipo=cls.tipo, nombre="Casa")
+        cls.proyecto.sistemas.add(cls.bomba)
+        Muro.objects.create(
+            proyecto=cls.proyecto, material_aislante=cls.lana, ubicacion="Norte", superficie=Decimal('10')
+        )
+
+    def setUp(self):
+        cache.clear()
+        precargar_referencias()
+
+    def test_resuelve_relaciones_sin_joins(self):
+        aciertos = REFERENCIAS.estadisticas()['material']['acierto']
+        proyecto = Proyecto.objects.get(pk=self.proyecto.pk)
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(proyecto.calcular_calificacion_energetica(), 'A')
+            self.assertEqual(REFERENCIAS.relacionados(proyecto, 'sistemas'), [self.bomba])
+        # Solo muros y tabla intermedia, sin JOIN con las tablas de referencia.
+        self.assertEqual(len(consultas), 2)
+        self.assertFalse(any('JOIN' in consulta['sql'] for consulta in consultas.captured_queries))
+        self.assertEqual(REFERENCIAS.estadisticas()['material']['acierto'], aciertos + 1)
+
+    def test_guardar_sube_la_version(self):
+        version = REFERENCIAS.version()
+        self.lana.nombre = "Lana de roca"
+        self.lana.save()
+        self.assertEqual(REFERENCIAS.version(), version + 1)
+        fallos = REFERENCIAS.estadisticas()['material']['fallo']
+        self.assertEqual(REFERENCIAS.obtener(Material, self.lana.pk).nombre, "Lana de roca")
+        self.assertEqual(REFERENCIAS.estadisticas()['material']['fallo'], fallos + 1)
+
+    def test_cambio_en_otro_proceso_se_ve_en_la_siguiente_peticion(self):
+        url = reverse('proyecto-detalle', args=[self.proyecto.pk])
+        self.assertContains(self.client.get(url), "Bomba de calor")
+        # Otro proceso cambia el sistema y sube la versión; esta copia queda vieja.
+        SistemaClimatizacion.objects.filter(pk=self.bomba.pk).update(tipo="Caldera")
+        ContadorVersion.objects.filter(clave=REFERENCIAS.clave).update(valor=F('valor') + 1)
+        Proyecto.objects.filter(pk=self.proyecto.pk).tocar()
+        self.assertContains(self.client.get(url), "Caldera")
+
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        respuesta = self.client.get(reverse('metricas'))
+        self.assertIn(
+            'cev_referencias_cache_total{modelo="sistemaclimatizacion",resultado="fallo"}', respuesta.content.decode()
+        )
+
+
+@override_settings(CEV_ORGANIZACION_OBLIGATORIA=False)
+class ClonacionTests(TestCase):
+    """Clonación profunda de proyectos: muros con capas, sistemas y calificación almacenada."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nombre="Cliente", contacto="c@example.com")
+        cls.otro_cliente = Cliente.objects.create(nombre="Otro", contacto="o@example.com")
+        tipo = TipoProyecto.objects.create(nombre="Casa")
+        cls.lana = Material.objects.create(nombre="Lana", conductividad=Decimal('0.04'))
+        cls.ladrillo = Material.objects.create(nombre="Ladrillo", conductividad=Decimal('0.8'))
+        cls.bomba = SistemaClimatizacion.objects.create(tipo="Bomba de calor", eficiencia_nominal=Decimal('3.5'))
+        cls.proyecto = Proyecto.objects.create(
+            cliente=cls.cliente, tipo=tipo, nombre="Casa tipo", fecha_inicio=date(2020, 1, 1)
+        )
+        cls.proyecto.sistemas.add(cls.bomba)
+        for ubicacion, espesor in (("Norte", '0.080'), ("Sur", '0.050')):
+            muro = Muro.objects.create(
+                proyecto=cls.proyecto, material_aislante=cls.lana, ubicacion=ubicacion, superficie=Decimal('10')
+            )
+            CapaMuro.objects.create(muro=muro, material=cls.ladrillo, espesor=Decimal('0.140'), orden=0)
+            CapaMuro.objects.create(muro=muro, material=cls.lana, espesor=Decimal(espesor), orden=1)
+        cls.proyecto.refresh_from_db()
+
+    def muros(self, proyecto):
+        return [
+            (muro.ubicacion, muro.transmitancia, list(muro.capas.order_by('orden').values_list(
+                'material_id', 'espesor', 'orden',
+            )))
+            for muro in proyecto.muros.order_by('ubicacion')
+        ]
+
+    def test_copia_muros_capas_sistemas_y_calificacion(self):
+        copia, = clonar_proyecto(self.proyecto)
+        copia = Proyecto.objects.get(pk=copia.pk)
+        self.assertEqual(copia.nombre, "Casa tipo (copia)")
+        self.assertEqual(copia.fecha_inicio, date.today())
+        self.assertEqual(copia.cliente, self.cliente)
+        self.assertEqual(self.muros(copia), self.muros(self.proyecto))
+        self.assertEqual(list(copia.sistemas.all()), [self.bomba])
+        self.assertEqual(
+            (copia.calificacion_estimada, copia.consumo_estimado, copia.conductividad_ponderada),
+            (self.proyecto.calificacion_estimada, self.proyecto.consumo_estimado, self.proyecto.conductividad_ponderada),
+        )
+        self.assertEqual(copia.calificacion_estimada, copia.calcular_calificacion_energetica())
+        self.assertEqual(self.proyecto.muros.count(), 2)
+
+    def test_consultas_no_dependen_de_los_muros(self):
+        with CaptureQueriesContext(connection) as pocas:
+            clonar_proyecto(self.proyecto, copias=3)
+        for numero in range(20):
+            Muro.objects.create(
+                proyecto=self.proyecto, material_aislante=self.lana, ubicacion=f"M{numero}", superficie=Decimal('1')
+            )
+        with CaptureQueriesContext(connection) as muchas:
+            nuevos = clonar_proyecto(self.proyecto, copias=3, cliente=self.otro_cliente, nombre="Modelo")
+        self.assertEqual(len(muchas), len(pocas))
+        self.assertEqual([p.nombre for p in nuevos], ["Modelo (copia 1)", "Modelo (copia 2)", "Modelo (copia 3)"])
+        self.assertEqual(Muro.objects.filter(proyecto__cliente=self.otro_cliente).count(), 3 * 22)
+        self.assertEqual(CapaMuro.objects.filter(muro__proyecto__cliente=self.otro_cliente).count(), 3 * 4)
+
+    def test_clonar_varios_en_bloque(self):
+        from .clonacion import clonar_proyectos
+
+        otro = Proyecto.objects.create(cliente=self.otro_cliente, tipo=self.proyecto.tipo, nombre="Otra casa")
+        Muro.objects.create(proyecto=otro, material_aislante=self.ladrillo, ubicacion="Este", superficie=Decimal('5'))
+        with CaptureQueriesContext(connection) as uno:
+            clonar_proyectos(Proyecto.objects.filter(pk=self.proyecto.pk))
+        with CaptureQueriesContext(connection) as dos:
+            copia, copia_otro = clonar_proyectos(Proyecto.objects.filter(pk__in=[self.proyecto.pk, otro.pk]))
+        self.assertEqual(len(dos), len(uno))
+
+        copia, copia_otro = Proyecto.objects.get(pk=copia.pk), Proyecto.objects.get(pk=copia_otro.pk)
+        self.assertEqual((copia.nombre, copia.cliente), ("Casa tipo (copia)", self.cliente))
+        self.assertEqual(self.muros(copia), self.muros(self.proyecto))
+        self.assertEqual(list(copia.sistemas.all()), [self.bomba])
+        self.assertEqual((copia_otro.nombre, copia_otro.cliente), ("Otra casa (copia)", self.otro_cliente))
+        self.assertEqual(self.muros(copia_otro), self.muros(otro))
+        otro.refresh_from_db()
+        self.assertEqual(copia_otro.calificacion_estimada, otro.calificacion_estimada)
+        self.assertFalse(copia_otro.sistemas.exists())
+
+    def test_vista_accion_admin_y_comando(self):
+        url = reverse('proyecto-clonar', args=[self.proyecto.pk])
+        self.assertContains(self.client.get(url), "Clonar")
+        respuesta = self.client.post(url, {'copias': 1})
+        copia = Proyecto.objects.latest('pk')
+        self.assertRedirects(respuesta, reverse('proyecto-detalle', args=[copia.pk]))
+        respuesta = self.client.post(url, {'copias': 2, 'cliente': self.otro_cliente.pk})
+        self.assertRedirects(respuesta, f"{reverse('proyecto-list')}?cliente={self.otro_cliente.pk}")
+        with override_settings(CEV_CLONACION_MAX_COPIAS=5):
+            formulario = self.client.post(url, {'copias': 6}).context['form']
+            self.assertFormError(formulario, 'copias', "Como máximo 5 copias por vez.")
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "clave"))
+        self.client.post(reverse('admin:gestion_proyecto_changelist'), {
+            'action': 'clonar', '_selected_action': [self.proyecto.pk],
+        })
+        self.assertEqual(Proyecto.objects.filter(nombre="Casa tipo (copia)", cliente=self.cliente).count(), 2)
+
+        salida = StringIO()
+        call_command(
+            'clone_project', str(self.proyecto.pk), '--copies', '4', '--client', str(self.otro_cliente.pk), stdout=salida,
+        )
+        self.assertIn("4 copias de «Casa tipo» (2 muros cada una)", salida.getvalue())
+        self.assertEqual(Proyecto.objects.filter(cliente=self.otro_cliente).count(), 6)
+        with self.assertRaises(CommandError):
+            call_command('clone_project', str(self.proyecto.pk), '--client', '999')
+
+
+@override_settings(CEV_REPLICAS=['default'], CEV_ORGANIZACION_OBLIGATORIA=False)
+class ReplicasTests(TransactionTestCase):
+    """
+    Router de réplicas de lectura. 'default' hace de réplica: se comprueba la
+    base elegida por la petición y su motivo. TransactionTestCase porque dentro
+    de una transacción todas las lecturas van a la primaria.
+    """
+
+    def setUp(self):
+        cache.clear()
+        REPLICAS._revisada = None
+        cliente = Cliente.objects.create(nombre="Cliente", contacto="c@example.com")
+        tipo = TipoProyecto.objects.create(nombre="Casa")
+        self.proyecto = Proyecto.objects.create(cliente=cliente, tipo=tipo, nombre="Casa")
+
+    def peticiones(self, motivo):
+        return REPLICAS_PETICIONES.valor('default', motivo)
+
+    def test_vistas_de_solo_lectura_usan_la_replica(self):
+        replica = self.peticiones('replica')
+        self.assertEqual(self.client.get(reverse('proyecto-list')).status_code, 200)
+        self.assertEqual(REPLICAS.base_de_lectura(), 'default')
+        self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+        self.assertEqual(self.peticiones('replica'), replica + 2)
+        self.assertEqual(REPLICAS.retrasos, {'default': 0.0})
+        # El detalle no está marcado como de solo lectura.
+        self.client.get(reverse('proyecto-detalle', args=[self.proyecto.pk]))
+        self.assertIsNone(REPLICAS.base_de_lectura())
+        self.assertEqual(self.peticiones('replica'), replica + 2)
+
+    def test_lee_lo_propio_despues_de_escribir(self):
+        respuesta = self.client.post(reverse('proyecto-clonar', args=[self.proyecto.pk]), {'copias': 1})
+        self.assertEqual(respuesta.cookies[COOKIE_PRIMARIA]['max-age'], 10)
+        pegajosa = self.peticiones('pegajosa')
+        self.client.get(reverse('proyecto-list'))
+        self.assertEqual(self.peticiones('pegajosa'), pegajosa + 1)
+        with override_settings(CEV_REPLICAS=[]):
+            respuesta = self.client.post(reverse('proyecto-clonar', args=[self.proyecto.pk]), {'copias': 1})
+        self.assertNotIn(COOKIE_PRIMARIA, respuesta.cookies)
+
+    def test_replica_atrasada_vuelve_a_la_primaria(self):
+        # La primaria escribió hace 10 s un latido que la réplica todavía no tiene.
+        hace_10_s = int((time.time() - 10) * 1000)
+        ContadorVersion.objects.create(clave=REPLICAS.clave, valor=hace_10_s - 2000)
+        retraso = self.peticiones('retraso')
+        with mock.patch.object(REPLICAS, 'latido', return_value=hace_10_s):
+            self.client.get(reverse('proyecto-list'))
+        self.assertEqual(self.peticiones('retraso'), retraso + 1)
+        self.assertGreater(REPLICAS.retrasos['default'], 5)
+
+
+class OrganizacionesTests(TestCase):
+    """Aislamiento por organización (tenant): managers, middleware, cachés, tareas e importación."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.a = Organizacion.objects.create(nombre="A", slug='a')
+        cls.b = Organizacion.objects.create(nombre="B", slug='b')
+        cls.ana = User.objects.create_user('ana')
+        cls.a.miembros.add(cls.ana)
+        cls.b.miembros.add(User.objects.create_user('beto'))
+        tipo = TipoProyecto.objects.create(nombre="Casa")
+        # Catálogo común (sin organización)
+        cls.lana = Material.objects.create(nombre="Lana", conductividad=Decimal('0.04'))
+        with en_organizacion(cls.a):
+            Material.objects.create(nombre="Corcho de A", conductividad=Decimal('0.05'))
+            cls.cliente_a = Cliente.objects.create(nombre="Cliente A", contacto="a@example.com")
+            cls.proyecto_a = Proyecto.objects.create(cliente=cls.cliente_a, tipo=tipo, nombre="Casa A")
+        with en_organizacion(cls.b):
+            Material.objects.create(nombre="Corcho de B", conductividad=Decimal('0.05'))
+            cls.cliente_b = Cliente.objects.create(nombre="Cliente B", contacto="b@example.com")
+            cls.proyecto_b = Proyecto.objects.create(cliente=cls.cliente_b, tipo=tipo, nombre="Casa B")
+            Muro.objects.create(proyecto=cls.proyecto_b, material_aislante=cls.lana, ubicacion="Norte", superficie=10)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_managers_filtran_por_organizacion(self):
+        self.assertEqual(self.proyecto_a.organizacion, self.a)
+        with en_organizacion(self.a):
+            self.assertEqual(list(Proyecto.objects.all()), [self.proyecto_a])
+            self.assertFalse(Muro.objects.exists())
+            self.assertEqual(
+                sorted(Material.objects.values_list('nombre', flat=True)), ["Corcho de A", "Lana"]
+            )
+            with self.assertRaises(Cliente.DoesNotExist):
+                Cliente.objects.get(pk=self.cliente_b.pk)
+        self.assertIsNone(organizacion_actual())
+        self.assertEqual(Proyecto.objects.count(), 2)
+
+    def test_catalogo_comun_recalcula_todas_las_organizaciones(self):
+        antes = Proyecto.objects.get(pk=self.proyecto_b.pk)
+        with en_organizacion(self.a):
+            lana = Material.objects.get(pk=self.lana.pk)
+            lana.conductividad = Decimal('1.200')
+            lana.save()
+        despues = Proyecto.objects.get(pk=self.proyecto_b.pk)
+        self.assertAlmostEqual(despues.conductividad_ponderada, 1.2)
+        self.assertEqual((antes.calificacion_estimada, despues.calificacion_estimada), ('A+', 'B'))
+        self.assertGreater(despues.version, antes.version)
+
+        # Solo los superusuarios modifican el catálogo común desde el admin.
+        self.ana.is_staff = True
+        self.ana.save()
+        self.ana.user_permissions.add(*Permission.objects.filter(codename__in=['view_material', 'change_material']))
+        self.client.force_login(self.ana)
+        url = reverse('admin:gestion_material_change', args=[self.lana.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        respuesta = self.client.post(url, {'nombre': "Lana", 'conductividad': '0.010'})
+        self.assertEqual(respuesta.status_code, 403)
+        self.assertEqual(Material.objects.get(pk=self.lana.pk).conductividad, Decimal('1.200'))
+
+    def test_middleware_por_miembro_y_subdominio(self):
+        self.client.force_login(self.ana)
+        respuesta = self.client.get(reverse('proyecto-list'))
+        self.assertContains(respuesta, "Casa A")
+        self.assertNotContains(respuesta, "Casa B")
+        self.assertEqual(self.client.get(reverse('proyecto-detalle', args=[self.proyecto_b.pk])).status_code, 404)
+        self.assertEqual(
+            [fila['nombre'] for fila in self.client.get(reverse('api-v1-proyectos')).json()['resultados']],
+            ["Casa A"],
+        )
+        # Al cerrar la respuesta la organización deja de estar en curso.
+        self.assertIsNone(organizacion_actual())
+
+        with override_settings(CEV_ORGANIZACION_DOMINIO='cev.test', ALLOWED_HOSTS=['.cev.test']):
+            self.assertEqual(self.client.get(reverse('proyecto-list'), HTTP_HOST='b.cev.test').status_code, 403)
+            self.assertEqual(self.client.get(reverse('proyecto-list'), HTTP_HOST='x.cev.test').status_code, 404)
+            self.assertContains(self.client.get(reverse('proyecto-list'), HTTP_HOST='a.cev.test'), "Casa A")
+            self.client.logout()
+            self.assertEqual(self.client.get(reverse('proyecto-list'), HTTP_HOST='b.cev.test').status_code, 403)
+            self.assertEqual(self.client.get(reverse('admin:login'), HTTP_HOST='b.cev.test').status_code, 200)
+
+    def test_sin_organizacion_se_niega_el_acceso(self):
+        self.assertEqual(self.client.get(reverse('proyecto-list')).status_code, 403)
+        sin_organizacion = User.objects.create_user('nadie')
+        self.client.force_login(sin_organizacion)
+        self.assertEqual(self.client.get(reverse('proyecto-list')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('admin:index')).status_code, 403)
+        # Dejar de ser miembro o ser desactivado se nota en la siguiente petición.
+        self.client.force_login(self.ana)
+        self.assertEqual(self.client.get(reverse('proyecto-list')).status_code, 200)
+        self.a.miembros.remove(self.ana)
+        self.assertEqual(self.client.get(reverse('proyecto-list')).status_code, 403)
+        sin_organizacion.is_superuser = True
+        sin_organizacion.save()
+        self.client.force_login(sin_organizacion)
+        self.assertContains(self.client.get(reverse('proyecto-list')), "Casa B")
+        # Instalación de una sola organización: sin organización no se filtra.
+        self.client.logout()
+        with override_settings(CEV_ORGANIZACION_OBLIGATORIA=False):
+            self.assertContains(self.client.get(reverse('proyecto-list')), "Casa B")
+
+    def test_cache_del_dashboard_por_organizacion(self):
+        with en_organizacion(self.a):
+            self.assertEqual(obtener_dashboard()['total_proyectos'], 1)
+        self.assertEqual(obtener_dashboard()['total_proyectos'], 2)
+        # Un proyecto nuevo de B no descarta el dashboard de A.
+        with en_organizacion(self.b):
+            Proyecto.objects.create(cliente=self.cliente_b, tipo=self.proyecto_b.tipo, nombre="Otra B")
+        with en_organizacion(self.a), self.assertNumQueries(0):
+            self.assertEqual(obtener_dashboard()['total_proyectos'], 1)
+        self.assertEqual(obtener_dashboard()['total_proyectos'], 3)
+
+    @skipUnless(connection.vendor == 'sqlite', "plan de consulta de SQLite")
+    def test_consultas_usan_indices_de_la_organizacion(self):
+        with en_organizacion(self.a):
+            plan = Proyecto.objects.order_by('-fecha_inicio', '-id')[:10].explain()
+            self.assertIn('proyecto_org_fecha_idx', plan)
+            self.assertIn('cliente_org_nombre_idx', Cliente.objects.order_by('nombre').explain())
+
+    def test_tareas_e_importacion_dentro_de_la_organizacion(self):
+        from .tareas import encolar
+
+        with en_organizacion(self.a):
+            tarea = encolar('certificar', ids=[self.proyecto_a.pk, self.proyecto_b.pk])
+        self.assertEqual(tarea.organizacion, self.a)
+        call_command('run_workers', una_vez=True, stdout=StringIO())
+        # El proyecto de B no tiene muros, pero además no es de A: no se toca.
+        self.assertFalse(ResultadoCEV.objects.filter(proyecto=self.proyecto_b).exists())
+
+        lineas = StringIO(
+            '{"cliente": {"contacto": "b@example.com"}, "proyecto": {"nombre": "Ajeno", "tipo": "Casa"}}\n'
+            '{"cliente": {"contacto": "n@example.com"}, "proyecto": {"nombre": "Nuevo", "tipo": "Casa"}}\n'
+        )
+        errores = StringIO()
+        with en_organizacion(self.a):
+            estadisticas = ImportadorCEV().importar(lineas, 'jsonl', rechazos=EscritorRechazos(errores, 'jsonl'))
+        self.assertEqual((estadisticas['proyectos'], estadisticas['rechazados']), (1, 1))
+        self.assertIn("otra organización", errores.getvalue())
+        self.assertEqual(Proyecto.objects.get(nombre="Nuevo").organizacion, self.a)
+        self.assertEqual(Cliente.objects.get(contacto="b@example.com").nombre, "Cliente B")
@@ -0,0 +1,182 @@
+# gestion/transmitancia.py
+"""
+Motor por lotes de transmitancia térmica (U) y calificación con NumPy.
+
+Cada lote carga los muros × capas (o proyectos × muros) como arreglos y
+resuelve las sumas por muro o por proyecto con ``numpy.bincount``; no hay
+bucles de Python por fila. Sirve para recalcular millones de muros después de
+una carga masiva o un cambio de criterios:
+
+* ``transmitancias(muros)``: U = 1 / (Rsi + Σ espesor/λ + Rse) de cada muro
+  (NaN si no tiene capas).
+* ``actualizar_transmitancias(muros)``: escribe solo las U que cambiaron.
+* ``calificaciones(proyectos)``: lo mismo que ``ProyectoQuerySet.with_rating``
+  (superficie, conductividad ponderada, calificación y consumo), calculado en
+  memoria. Un proyecto cuyos muros no tienen capas sigue el camino por
+  conductividad del material aislante.
+
+Los cambios de a un muro los cubren las señales con
+``MuroQuerySet.actualizar_transmitancia`` (SQL), que no requiere NumPy.
+"""
+from django.db import connection, transaction
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .models import (
+    CALIFICACION_MAXIMA,
+    CONSUMOS_ESTIMADOS,
+    RESISTENCIA_SUPERFICIAL_EXTERIOR,
+    RESISTENCIA_SUPERFICIAL_INTERIOR,
+    SIN_DATOS,
+    UMBRALES_CALIFICACION,
+    UMBRALES_TRANSMITANCIA,
+    CapaMuro,
+    Muro,
+)
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Instala numpy: pip install numpy")
+    return numpy
+
+
+def _lotes(queryset, campos, tamano):
+    """Recorre ``queryset`` por rangos de pk (keyset) como listas de tuplas ``campos``."""
+    ultimo = 0
+    while True:
+        filas = list(queryset.filter(pk__gt=ultimo).order_by('pk').values_list('pk', *campos)[:tamano])
+        if not filas:
+            return
+        yield filas
+        ultimo = filas[-1][0]
+
+
+def _arreglo(np, filas, columnas):
+    """Tuplas de la base de datos como matriz float (None pasa a NaN)."""
+    return np.array(filas, dtype=float).reshape(len(filas), columnas)
+
+
+def _transmitancias_lote(np, muros, ids):
+    """U de los muros ``ids`` (ordenados) en un arreglo alineado con ellos."""
+    capas = CapaMuro.objects.filter(
+        muro__in=muros.filter(pk__gte=int(ids[0]), pk__lte=int(ids[-1]))
+    ).values_list(
+        'muro_id', Cast('espesor', FloatField()), Cast('material__conductividad', FloatField()),
+    )
+    datos = _arreglo(np, list(capas), 3)
+    posiciones = np.searchsorted(ids, datos[:, 0].astype(np.int64))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Como el NULLIF de la versión SQL: una capa con λ = 0 no suma resistencia.
+        capa = np.where(datos[:, 2] > 0, datos[:, 1] / datos[:, 2], 0.0)
+        resistencia = np.bincount(posiciones, weights=capa, minlength=len(ids))
+        con_capas = np.bincount(posiciones, minlength=len(ids)) > 0
+        return np.where(
+            con_capas,
+            1.0 / (RESISTENCIA_SUPERFICIAL_INTERIOR + resistencia + RESISTENCIA_SUPERFICIAL_EXTERIOR),
+            np.nan,
+        )
+
+
+def transmitancias(muros=None, lote=100_000):
+    """
+    Genera ``(ids, u)`` por lote: pk de los muros y su transmitancia U
+    (W/m²K), NaN para los muros sin capas. Dos consultas por lote.
+    """
+    np = _numpy()
+    muros = Muro.objects.all() if muros is None else muros
+    for filas in _lotes(muros, (), lote):
+        ids = np.array([fila[0] for fila in filas], dtype=np.int64)
+        yield ids, _transmitancias_lote(np, muros, ids)
+
+
+def actualizar_transmitancias(muros=None, lote=100_000, progreso=None):
+    """
+    Recalcula y guarda la transmitancia de los muros; solo escribe las que
+    cambiaron. Devuelve el conjunto de pk de proyectos afectados (sus
+    calificaciones deben recalcularse con ``actualizar_calificacion``).
+    """
+    np = _numpy()
+    muros = Muro.objects.all() if muros is None else muros
+    tabla = connection.ops.quote_name(Muro._meta.db_table)
+    columna = connection.ops.quote_name('transmitancia')
+    sentencia = f"UPDATE {tabla} SET {columna} = %s WHERE {connection.ops.quote_name('id')} = %s"
+    proyectos = set()
+    procesados = 0
+
+    for filas in _lotes(muros, ('proyecto_id', 'transmitancia'), lote):
+        datos = _arreglo(np, filas, 3)
+        ids = datos[:, 0].astype(np.int64)
+        nuevas = _transmitancias_lote(np, muros, ids)
+        actuales = datos[:, 2]
+        cambiadas = ~(np.isclose(nuevas, actuales, rtol=1e-9, atol=0) | (np.isnan(nuevas) & np.isnan(actuales)))
+        if cambiadas.any():
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sentencia, [
+                    (None if np.isnan(u) else float(u), int(pk))
+                    for pk, u in zip(ids[cambiadas], nuevas[cambiadas])
+                ])
+            proyectos.update(datos[cambiadas, 1].astype(np.int64).tolist())
+        procesados += len(filas)
+        if progreso:
+            progreso(procesados)
+    return proyectos
+
+
+def _calificar(np, valores, umbrales):
+    """Índice de calificación (0 = mejor … len(umbrales) = máxima) por valor."""
+    return np.searchsorted(np.array([limite for limite, _ in umbrales]), valores, side='right')
+
+
+def calificaciones(proyectos, lote=20_000):
+    """
+    Genera ``(pk, superficie_total, conductividad_ponderada, calificación,
+    consumo)`` de cada proyecto, con los mismos criterios que
+    ``ProyectoQuerySet.with_rating``. Dos consultas por lote.
+    """
+    np = _numpy()
+    etiquetas_conductividad = np.array([c for _, c in UMBRALES_CALIFICACION] + [CALIFICACION_MAXIMA], dtype=object)
+    etiquetas_transmitancia = np.array([c for _, c in UMBRALES_TRANSMITANCIA] + [CALIFICACION_MAXIMA], dtype=object)
+
+    for filas in _lotes(proyectos, (), lote):
+        pks = np.array([fila[0] for fila in filas], dtype=np.int64)
+        muros = Muro.objects.filter(
+            proyecto__in=proyectos.filter(pk__gte=int(pks[0]), pk__lte=int(pks[-1]))
+        ).values_list(
+            'proyecto_id',
+            Cast('superficie', FloatField()),
+            Cast('material_aislante__conductividad', FloatField()),
+            'transmitancia',
+        )
+        datos = _arreglo(np, list(muros), 4)
+        posiciones = np.searchsorted(pks, datos[:, 0].astype(np.int64))
+        superficie, conductividad, transmitancia = datos[:, 1], datos[:, 2], datos[:, 3]
+        sin_capas = np.isnan(transmitancia)
+
+        def suma(pesos=None):
+            return np.bincount(posiciones, weights=pesos, minlength=len(pks))
+
+        total = suma(superficie)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            conductividad_media = np.where(total > 0, suma(superficie * conductividad) / total, np.nan)
+            transmitancia_media = np.where(
+                (total > 0) & (suma(sin_capas.astype(float)) == 0),
+                suma(superficie * np.nan_to_num(transmitancia)) / total,
+                np.nan,
+            )
+        calificacion = np.where(
+            ~np.isnan(transmitancia_media),
+            etiquetas_transmitancia[_calificar(np, np.nan_to_num(transmitancia_media), UMBRALES_TRANSMITANCIA)],
+            np.where(
+                ~np.isnan(conductividad_media),
+                etiquetas_conductividad[_calificar(np, np.nan_to_num(conductividad_media), UMBRALES_CALIFICACION)],
+                SIN_DATOS,
+            ),
+        )
+        conductividad_media = np.where(np.isnan(conductividad_media), None, conductividad_media)
+        for pk, superficie_total, media, nota in zip(
+            pks.tolist(), total.tolist(), conductividad_media.tolist(), calificacion.tolist()
+        ):
+            yield pk, superficie_total, media, nota, CONSUMOS_ESTIMADOS[nota]
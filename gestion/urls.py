@@ -1,14 +1,21 @@
 # gestion/urls.py
 
 from django.urls import path
+from . import api
+from .metricas import vista_metricas
 from .views import (
     HomeView,
     ProyectoListView, 
+    ProyectoExportView,
     ProyectoDetailView, 
     ProyectoCreateView, 
     ProyectoUpdateView, 
     ProyectoDeleteView,
+    ProyectoClonarView,
     ProyectoReportePDFView,  
+    TareaCrearView,
+    TareaEstadoView,
+    TareaResultadoView,
 )
 
 urlpatterns = [
@@ -18,6 +25,9 @@ urlpatterns = [
     # 2. CRUD: LISTADO (con filtros)
     path('proyectos/', ProyectoListView.as_view(), name='proyecto-list'),
     
+    # 2b. EXPORTACIÓN CSV/XLSX (mismos filtros que el listado)
+    path('proyectos/exportar/', ProyectoExportView.as_view(), name='proyecto-exportar'),
+    
     # 3. CREACIÓN
     path('proyectos/crear/', ProyectoCreateView.as_view(), name='proyecto-crear'),
     
@@ -30,6 +40,27 @@ urlpatterns = [
     # 6. ELIMINACIÓN
     path('proyectos/<int:pk>/eliminar/', ProyectoDeleteView.as_view(), name='proyecto-eliminar'),
     
+    # 6b. CLONACIÓN (una o varias copias con muros y sistemas)
+    path('proyectos/<int:pk>/clonar/', ProyectoClonarView.as_view(), name='proyecto-clonar'),
+    
     # 7. GENERAR PDF 📄 (NUEVA FUNCIONALIDAD)
     path('proyectos/<int:pk>/pdf/', ProyectoReportePDFView.as_view(), name='proyecto-pdf'),
-]
\ No newline at end of file
+    
+    # 8. API JSON DE SOLO LECTURA (v1)
+    path('api/v1/proyectos/', api.ProyectoAPIView.as_view(), name='api-v1-proyectos'),
+    path('api/v1/proyectos/<int:pk>/', api.ProyectoAPIView.as_view(), name='api-v1-proyecto'),
+    path('api/v1/muros/', api.MuroAPIView.as_view(), name='api-v1-muros'),
+    path('api/v1/resultados/', api.ResultadoAPIView.as_view(), name='api-v1-resultados'),
+    path('api/v1/clientes/', api.ClienteAPIView.as_view(), name='api-v1-clientes'),
+    path('api/v1/materiales/', api.MaterialAPIView.as_view(), name='api-v1-materiales'),
+    path('api/v1/tipos/', api.TipoProyectoAPIView.as_view(), name='api-v1-tipos'),
+    path('api/v1/sistemas/', api.SistemaClimatizacionAPIView.as_view(), name='api-v1-sistemas'),
+    
+    # 9. TAREAS EN SEGUNDO PLANO (encolar, consultar estado, descargar resultado)
+    path('tareas/', TareaCrearView.as_view(), name='tarea-crear'),
+    path('tareas/<uuid:uuid>/', TareaEstadoView.as_view(), name='tarea-estado'),
+    path('tareas/<uuid:uuid>/resultado/', TareaResultadoView.as_view(), name='tarea-resultado'),
+    
+    # 10. MÉTRICAS PARA PROMETHEUS
+    path('metrics', vista_metricas, name='metricas'),
+]
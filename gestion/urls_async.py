@@ -0,0 +1,21 @@
+# gestion/urls_async.py
+"""
+Mismas rutas que gestion/urls.py, con las vistas async (views_async.py) para
+el dashboard, el listado y el detalle. Las incluye CEVProject/urls_asgi.py.
+"""
+from django.urls import path
+
+from .urls import urlpatterns as urlpatterns_sync
+from .views_async import HomeAsyncView, ProyectoDetailAsyncView, ProyectoListAsyncView
+
+VISTAS_ASYNC = {
+    'home': HomeAsyncView.as_view(),
+    'proyecto-list': ProyectoListAsyncView.as_view(),
+    'proyecto-detalle': ProyectoDetailAsyncView.as_view(),
+}
+
+urlpatterns = [
+    path(str(patron.pattern), VISTAS_ASYNC[patron.name], name=patron.name)
+    if patron.name in VISTAS_ASYNC else patron
+    for patron in urlpatterns_sync
+]
@@ -1,94 +1,307 @@
 # gestion/views.py
 
+import csv
+import json
+import tempfile
+
+from django.contrib import messages
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import BadRequest, ObjectDoesNotExist, PermissionDenied, ValidationError
 from django.views.generic import (
+    View,
     TemplateView,
+    FormView,
     ListView, 
     DetailView, 
     CreateView, 
     UpdateView, 
     DeleteView
 )
-from django.urls import reverse_lazy
-from django.db.models import Count, Avg
-from .models import Proyecto, Cliente, Muro, ResultadoCEV
+from django.urls import reverse, reverse_lazy
+from .models import (
+    Proyecto, Muro, Tarea, TipoProyecto, ORDEN_CALIFICACIONES,
+)
+from .busqueda import buscar_proyectos
+from .clonacion import clonar_proyecto
+from .dashboard import obtener_dashboard
+from .forms import ClonarProyectoForm
+from .fragmentos import opciones_filtros
+from .paginacion import CursorInvalido, PaginadorKeyset, estimar_total
+from .referencias import REFERENCIAS
+from .replicas import LecturaEnReplicaMixin
+from .reportes import CacheReportes, clave_reporte, datos_reporte, muros_reporte
+from .tareas import encolar, ruta_resultado
 from datetime import date
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.cache import get_conditional_response
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import http_date
 
 
 # --- VISTA HOME CON DASHBOARD ---
-class HomeView(TemplateView):
+class HomeView(LecturaEnReplicaMixin, TemplateView):
     """Vista mejorada con estadísticas del dashboard."""
     template_name = 'gestion/home.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        
-        # Estadísticas generales
-        context['total_proyectos'] = Proyecto.objects.count()
-        context['total_clientes'] = Cliente.objects.count()
-        
-        # Proyectos con resultados vs sin resultados
-        context['proyectos_calificados'] = Proyecto.objects.filter(resultados__isnull=False).count()
-        context['proyectos_en_curso'] = Proyecto.objects.filter(resultados__isnull=True).count()
-        
-        # Distribución de calificaciones
-        context['calificaciones'] = ResultadoCEV.objects.values('calificacion').annotate(
-            count=Count('id')
-        ).order_by('calificacion')
-        
-        # Proyectos recientes (últimos 5)
-        context['proyectos_recientes'] = Proyecto.objects.select_related(
-            'cliente', 'tipo'
-        ).order_by('-fecha_inicio')[:5]
-        
+        # Conteos, distribuciones y recientes salen del caché (ver dashboard.py)
+        context.update(obtener_dashboard())
         return context
 
 
 # --- VISTAS CRUD PARA PROYECTOS ---
 
-class ProyectoListView(ListView):
-    """Lista de proyectos con filtros."""
-    model = Proyecto
-    template_name = 'gestion/proyecto_list.html'
-    context_object_name = 'proyectos'
-    paginate_by = 10
+class ValorFiltroMixin:
+    """Valores de los filtros de la URL convertidos por el campo del modelo al que se aplican."""
     
-    def get_queryset(self):
-        queryset = super().get_queryset().select_related('cliente', 'tipo').prefetch_related('sistemas')
-        
-        # Filtro por búsqueda
+    def valor_filtro(self, parametro, modelo, campo):
+        """
+        ``?parametro=`` convertido con el ``to_python`` de ``campo``, o None si
+        no viene. Un valor inválido (``?cliente=abc``) responde 400, no 500.
+        """
+        valor = self.request.GET.get(parametro)
+        if not valor:
+            return None
+        try:
+            return modelo._meta.get_field(campo).to_python(valor)
+        except (ValueError, ValidationError):
+            self.filtro_invalido(parametro, valor)
+    
+    def filtro_invalido(self, parametro, valor):
+        raise BadRequest(f"Valor inválido para {parametro}: {valor!r}")
+
+
+class ProyectoFiltrosMixin(ValorFiltroMixin):
+    """Filtros de la URL (search, cliente, tipo, calificacion, orden) compartidos por listado y exportación."""
+    
+    def orden_listado(self):
+        """'calificacion' si se pidió, 'relevancia' si hay búsqueda, o 'fecha'."""
+        if self.request.GET.get('orden') == 'calificacion':
+            return 'calificacion'
+        if self.request.GET.get('search'):
+            return 'relevancia'
+        return 'fecha'
+    
+    def filtrar_proyectos(self, queryset):
+        # Búsqueda de texto completo en nombre, cliente y descripción
         search = self.request.GET.get('search')
         if search:
-            queryset = queryset.filter(nombre__icontains=search)
+            queryset = buscar_proyectos(queryset, search)
         
         # Filtro por cliente
-        cliente_id = self.request.GET.get('cliente')
-        if cliente_id:
+        cliente_id = self.valor_filtro('cliente', Proyecto, 'cliente_id')
+        if cliente_id is not None:
             queryset = queryset.filter(cliente_id=cliente_id)
         
         # Filtro por tipo
-        tipo_id = self.request.GET.get('tipo')
-        if tipo_id:
+        tipo_id = self.valor_filtro('tipo', Proyecto, 'tipo_id')
+        if tipo_id is not None:
             queryset = queryset.filter(tipo_id=tipo_id)
         
+        # Filtro por calificación estimada
+        calificacion = self.valor_filtro('calificacion', Proyecto, 'calificacion_estimada')
+        if calificacion:
+            queryset = queryset.filter(calificacion_estimada=calificacion)
+        
+        # Orden por calificación (de mejor a peor), por relevancia o por fecha
+        orden = self.orden_listado()
+        if orden == 'calificacion':
+            return queryset.order_by('rango_calificacion', '-fecha_inicio')
+        if orden == 'relevancia':
+            return queryset.order_by('relevancia', '-id')
         return queryset.order_by('-fecha_inicio')
+
+
+class ProyectoListView(LecturaEnReplicaMixin, ProyectoFiltrosMixin, ListView):
+    """Lista de proyectos con filtros y paginación por clave (keyset)."""
+    model = Proyecto
+    template_name = 'gestion/proyecto_list.html'
+    context_object_name = 'proyectos'
+    paginate_by = 10
+    
+    # Orden total de cada modo de listado; siempre termina en id (ver paginacion.py)
+    ORDENES_KEYSET = {
+        'fecha': [('fecha_inicio', True), ('id', True)],
+        'calificacion': [('rango_calificacion', False), ('fecha_inicio', True), ('id', True)],
+        'relevancia': [('relevancia', False), ('id', True)],
+    }
+    
+    # Opciones del filtro de calificación estimada
+    CALIFICACIONES = list(ORDEN_CALIFICACIONES)
+    
+    def get_queryset(self):
+        # El tipo sale del caché de datos de referencia (ver get_context_data)
+        queryset = super().get_queryset().select_related('cliente', 'resultados')
+        return self.filtrar_proyectos(queryset)
+    
+    def paginate_queryset(self, queryset, page_size):
+        # Los enlaces antiguos con ?page=N siguen funcionando con OFFSET.
+        if self.page_kwarg in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+        
+        try:
+            pagina = self.paginador(queryset, page_size).pagina(self.request.GET.get('cursor'))
+        except CursorInvalido:
+            raise Http404("Página inválida.")
+        
+        # El COUNT(*) exacto solo se hace si se pide (?contar=1)
+        if self.request.GET.get('contar'):
+            pagina.total = queryset.count()
+        else:
+            pagina.total = estimar_total(queryset)
+            pagina.total_estimado = pagina.total is not None
+        return self.enlazar(pagina)
+    
+    def paginador(self, queryset, page_size):
+        nombre = self.orden_listado()
+        return PaginadorKeyset(queryset, self.ORDENES_KEYSET[nombre], page_size, nombre)
+    
+    def enlazar(self, pagina):
+        """Agrega los enlaces anterior/siguiente y devuelve la tupla de paginate_queryset."""
+        pagina.url_siguiente = self.url_cursor(pagina.siguiente)
+        pagina.url_anterior = self.url_cursor(pagina.anterior)
+        return (None, pagina, pagina.object_list, pagina.has_other_pages())
+    
+    def url_cursor(self, token):
+        if token is None:
+            return None
+        parametros = self.request.GET.copy()
+        parametros.pop(self.page_kwarg, None)
+        parametros['cursor'] = token
+        return f"?{parametros.urlencode()}"
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        REFERENCIAS.resolver(context['object_list'], 'tipo')
         
-        # Proyectos recientes del mes
-        today = date.today()
-        first_day_of_month = today.replace(day=1)
-        context['proyectos_recientes'] = Proyecto.objects.filter(
-            fecha_inicio__gte=first_day_of_month
-        ).order_by('-fecha_inicio')
+        # Proyectos recientes del mes (un COUNT, sin cargar las filas)
+        context['total_recientes_mes'] = self.recientes_del_mes().count()
         
-        # Para los filtros
-        from .models import TipoProyecto
-        context['clientes'] = Cliente.objects.all()
-        context['tipos'] = TipoProyecto.objects.all()
+        # Para los filtros (en caché por versión de los datos de referencia)
+        context.update(opciones_filtros())
+        context['calificaciones'] = self.CALIFICACIONES
         
         return context
+    
+    def recientes_del_mes(self):
+        first_day_of_month = date.today().replace(day=1)
+        return Proyecto.objects.filter(fecha_inicio__gte=first_day_of_month)
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve cada línea en vez de guardarla."""
+    
+    def write(self, value):
+        return value
+
+
+class ProyectoExportView(LecturaEnReplicaMixin, ProyectoFiltrosMixin, View):
+    """
+    Exporta a CSV o XLSX todos los proyectos que cumplen los filtros del listado.
+    Lee el queryset con .iterator(chunk_size=...) para que la memoria y las
+    consultas por lote (proyectos + sistemas) no dependan del total.
+    """
+    chunk_size = 2000
+    encabezados = (
+        'ID', 'Proyecto', 'Cliente', 'Contacto', 'Tipo', 'Fecha Inicio', 'Sistemas',
+        'Muros', 'Superficie Total (m²)', 'Calificación Estimada', 'Consumo Estimado (kWh/m²)',
+        'Calificación Certificada', 'Consumo Certificado (kWh/m²)', 'Fecha Calificación',
+    )
+    
+    def get(self, request, *args, **kwargs):
+        if request.GET.get('segundo_plano'):
+            # Exportaciones grandes: la tarea escribe el archivo (ver tareas.py)
+            if not request.user.is_authenticated:
+                raise PermissionDenied
+            # Los filtros inválidos se rechazan aquí y no en el trabajador.
+            self.queryset_exportacion()
+            query = request.GET.copy()
+            del query['segundo_plano']
+            return respuesta_tarea(encolar(
+                'exportar', request.user, query=query.urlencode(), formato=request.GET.get('formato', 'csv'),
+            ))
+        queryset = self.queryset_exportacion()
+        if request.GET.get('formato') == 'xlsx':
+            return self.exportar_xlsx(queryset, self.nombre_archivo())
+        return self.exportar_csv(queryset, self.nombre_archivo())
+    
+    def queryset_exportacion(self):
+        return self.filtrar_proyectos(
+            Proyecto.objects.with_total_muros()
+            .select_related('cliente', 'tipo', 'resultados')
+            .prefetch_related('sistemas')
+        )
+    
+    def nombre_archivo(self):
+        return f"proyectos_{date.today():%Y%m%d}"
+    
+    def filas(self, queryset, progreso=None):
+        for numero, proyecto in enumerate(queryset.iterator(chunk_size=self.chunk_size), 1):
+            if progreso and numero % self.chunk_size == 0:
+                progreso(numero)
+            try:
+                resultado = proyecto.resultados
+            except ObjectDoesNotExist:
+                resultado = None
+            yield (
+                proyecto.pk,
+                proyecto.nombre,
+                proyecto.cliente.nombre,
+                proyecto.cliente.contacto,
+                proyecto.tipo.nombre,
+                proyecto.fecha_inicio,
+                ', '.join(sistema.tipo for sistema in proyecto.sistemas.all()),
+                proyecto.total_muros,
+                proyecto.superficie_total,
+                proyecto.calificacion_estimada,
+                proyecto.consumo_estimado,
+                resultado.calificacion if resultado else '',
+                resultado.consumo_energia_anual if resultado else '',
+                resultado.fecha_calificacion if resultado else '',
+            )
+    
+    def lineas_csv(self, queryset, progreso=None):
+        writer = csv.writer(_Eco())
+        # BOM para que Excel reconozca UTF-8 (tildes, ñ, m²)
+        yield '\ufeff' + writer.writerow(self.encabezados)
+        for fila in self.filas(queryset, progreso):
+            yield writer.writerow(fila)
+    
+    def escribir_csv(self, queryset, archivo, progreso=None):
+        archivo.writelines(self.lineas_csv(queryset, progreso))
+    
+    def escribir_xlsx(self, queryset, archivo, progreso=None):
+        from openpyxl import Workbook
+        
+        # write_only escribe fila a fila en disco sin mantener la hoja en memoria
+        libro = Workbook(write_only=True)
+        hoja = libro.create_sheet('Proyectos')
+        hoja.append(self.encabezados)
+        for fila in self.filas(queryset, progreso):
+            hoja.append(fila)
+        libro.save(archivo)
+    
+    def exportar_csv(self, queryset, nombre):
+        response = StreamingHttpResponse(self.lineas_csv(queryset), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+        return response
+    
+    def exportar_xlsx(self, queryset, nombre):
+        archivo = tempfile.TemporaryFile()
+        try:
+            self.escribir_xlsx(queryset, archivo)
+        except ImportError:
+            archivo.close()
+            return HttpResponse("Instala openpyxl: pip install openpyxl", status=500)
+        archivo.seek(0)
+        return FileResponse(
+            archivo,
+            as_attachment=True,
+            filename=f"{nombre}.xlsx",
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
 
 
 class ProyectoDetailView(DetailView):
@@ -96,18 +309,36 @@ class ProyectoDetailView(DetailView):
     model = Proyecto
     template_name = 'gestion/proyecto_detail.html'
     
+    def get_queryset(self):
+        return super().get_queryset().select_related('cliente', 'resultados')
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Calcular calificación energética estimada
+        # Calificación energética estimada (almacenada en el proyecto)
         proyecto = self.object
-        context['calificacion_estimada'] = proyecto.calcular_calificacion_energetica()
-        context['consumo_estimado'] = proyecto.calcular_consumo_estimado()
-        
-        # Información de muros
-        context['muros'] = proyecto.muros.select_related('material_aislante').all()
+        context['calificacion_estimada'] = proyecto.calificacion_estimada
+        context['consumo_estimado'] = proyecto.consumo_estimado
+        context.update(self.relaciones(proyecto))
         
         return context
+    
+    def relaciones(self, proyecto):
+        """
+        Tipo, sistemas y muros con sus materiales, resueltos con el caché de
+        datos de referencia. Muros y sistemas quedan sin evaluar: solo se
+        consultan si el fragmento del detalle no está en caché.
+        """
+        return {
+            'tipo': SimpleLazyObject(lambda: REFERENCIAS.obtener(TipoProyecto, proyecto.tipo_id)),
+            'sistemas': SimpleLazyObject(lambda: REFERENCIAS.relacionados(proyecto, 'sistemas')),
+            'muros': self.muros(proyecto.pk),
+        }
+    
+    def muros(self, pk):
+        return SimpleLazyObject(
+            lambda: REFERENCIAS.resolver(Muro.objects.filter(proyecto_id=pk), 'material_aislante')
+        )
 
 
 class ProyectoCreateView(CreateView):
@@ -136,58 +367,162 @@ class ProyectoDeleteView(DeleteView):
     success_url = reverse_lazy('proyecto-list')
 
 
+class ProyectoClonarView(FormView):
+    """Clonar un proyecto con sus muros y sistemas, una o varias veces (ver gestion/clonacion.py)."""
+    form_class = ClonarProyectoForm
+    template_name = 'gestion/proyecto_clone.html'
+    
+    def dispatch(self, request, *args, **kwargs):
+        self.proyecto = get_object_or_404(Proyecto.objects.select_related('cliente'), pk=kwargs['pk'])
+        return super().dispatch(request, *args, **kwargs)
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['proyecto'] = self.proyecto
+        context['total_muros'] = self.proyecto.muros.count()
+        return context
+    
+    def form_valid(self, form):
+        datos = form.cleaned_data
+        nuevos = clonar_proyecto(
+            self.proyecto, copias=datos['copias'], cliente=datos['cliente'], nombre=datos['nombre'] or None,
+        )
+        if len(nuevos) == 1:
+            messages.success(self.request, f"Proyecto clonado como «{nuevos[0].nombre}».")
+            return redirect('proyecto-detalle', pk=nuevos[0].pk)
+        messages.success(self.request, f"{len(nuevos)} copias de «{self.proyecto.nombre}» creadas.")
+        return redirect(f"{reverse('proyecto-list')}?cliente={nuevos[0].cliente_id}")
+
+
 # --- VISTA PARA GENERAR PDF ---
-class ProyectoReportePDFView(DetailView):
-    """Genera un reporte PDF del proyecto."""
+class ProyectoReportePDFView(LecturaEnReplicaMixin, DetailView):
+    """
+    Genera un reporte PDF del proyecto. Los PDF se guardan en una caché en
+    disco direccionada por el hash de sus datos (ETag), así una descarga
+    repetida no vuelve a renderizar y un GET condicional responde 304.
+    """
     model = Proyecto
     
+    def get_queryset(self):
+        return super().get_queryset().select_related('cliente', 'resultados')
+    
+    def get(self, request, *args, **kwargs):
+        if request.GET.get('segundo_plano'):
+            # Entrega el renderizado a run_workers y responde con la URL de estado
+            if not request.user.is_authenticated:
+                raise PermissionDenied
+            proyecto = self.get_object()
+            return respuesta_tarea(encolar('reporte_pdf', request.user, proyecto=proyecto.pk))
+        return super().get(request, *args, **kwargs)
+    
     def render_to_response(self, context, **response_kwargs):
         try:
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.pagesizes import letter
+            import reportlab  # noqa: F401
         except ImportError:
             return HttpResponse("Instala reportlab: pip install reportlab", status=500)
         
-        proyecto = self.get_object()
-        
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="reporte_{proyecto.nombre}.pdf"'
-        
-        # Crear PDF
-        p = canvas.Canvas(response, pagesize=letter)
-        
-        # Título
-        p.setFont("Helvetica-Bold", 20)
-        p.drawString(100, 750, f"Reporte CEV: {proyecto.nombre}")
+        proyecto = self.object
+        datos = datos_reporte(proyecto)
+        clave = clave_reporte(datos, muros_reporte(proyecto))
+        cache = CacheReportes.desde_settings()
         
-        # Información del proyecto
-        p.setFont("Helvetica", 12)
-        y = 700
-        p.drawString(100, y, f"Cliente: {proyecto.cliente.nombre}")
-        y -= 20
-        p.drawString(100, y, f"Tipo: {proyecto.tipo.nombre}")
-        y -= 20
-        p.drawString(100, y, f"Fecha de Inicio: {proyecto.fecha_inicio}")
-        y -= 30
+        # 304 sin renderizar si el cliente ya tiene esta versión
+        etag = f'"{clave}"'
+        no_modificado = get_conditional_response(
+            self.request, etag=etag, last_modified=cache.modificado(clave)
+        )
+        if no_modificado is not None:
+            return no_modificado
         
-        # Calificación
+        pdf = cache.obtener_o_renderizar(clave, datos)
+        response = HttpResponse(pdf, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="reporte_{proyecto.nombre}.pdf"'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(cache.modificado(clave))
+        # Siempre revalidar: el ETag cambia en cuanto cambian los datos
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+# --- TAREAS EN SEGUNDO PLANO ---
+
+def estado_tarea(tarea):
+    """Representación JSON del estado de una tarea."""
+    return {
+        'id': str(tarea.uuid),
+        'tipo': tarea.tipo,
+        'estado': tarea.estado,
+        'progreso': tarea.progreso,
+        'mensaje': tarea.mensaje,
+        'intentos': tarea.intentos,
+        'creada': tarea.creada,
+        'terminada': tarea.terminada,
+        'url': reverse('tarea-estado', args=[tarea.uuid]),
+        'url_resultado': (
+            reverse('tarea-resultado', args=[tarea.uuid])
+            if tarea.estado == Tarea.COMPLETADA and tarea.archivo else None
+        ),
+    }
+
+
+def respuesta_tarea(tarea):
+    """202 Accepted con el estado de la tarea recién encolada y su URL de consulta."""
+    respuesta = JsonResponse(estado_tarea(tarea), status=202)
+    respuesta['Location'] = reverse('tarea-estado', args=[tarea.uuid])
+    return respuesta
+
+
+class TareaCrearView(View):
+    """Encola una tarea (POST tipo + parametros en JSON). Solo staff."""
+    
+    # La importación no: lee un archivo del servidor y se encola desde el
+    # admin, que guarda antes el archivo subido (guardar_entrada).
+    tipos = ('reporte_pdf', 'reportes_pdf', 'certificar', 'recalcular_calificaciones', 'exportar')
+    
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            raise PermissionDenied
+        tipo = request.POST.get('tipo', '')
         try:
-            resultado = proyecto.resultados
-            p.setFont("Helvetica-Bold", 16)
-            p.drawString(100, y, f"Calificación: {resultado.calificacion}")
-            y -= 25
-            p.setFont("Helvetica", 12)
-            p.drawString(100, y, f"Consumo: {resultado.consumo_energia_anual} kWh/m²")
-        except:
-            calificacion_est = proyecto.calcular_calificacion_energetica()
-            p.setFont("Helvetica-Bold", 16)
-            p.drawString(100, y, f"Calificación Estimada: {calificacion_est}")
-            y -= 25
-            consumo_est = proyecto.calcular_consumo_estimado()
-            p.setFont("Helvetica", 12)
-            p.drawString(100, y, f"Consumo Estimado: {consumo_est} kWh/m²")
-        
-        p.showPage()
-        p.save()
-        
-        return response
\ No newline at end of file
+            if tipo not in self.tipos:
+                raise ValueError(f"Tipo de tarea no permitido: {tipo!r}")
+            parametros = json.loads(request.POST.get('parametros') or '{}')
+            if not isinstance(parametros, dict):
+                raise ValueError("parametros debe ser un objeto JSON")
+            tarea = encolar(tipo, request.user, **parametros)
+        except ValueError as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        return respuesta_tarea(tarea)
+
+
+class TareaDelUsuarioMixin(LoginRequiredMixin):
+    """
+    Solo quien encoló la tarea (o un superusuario) la consulta; las demás
+    responden 404. Tarea.objects ya filtra por la organización en curso.
+    """
+    # Lo consultan scripts y JavaScript: 403 en vez de redirigir al login.
+    raise_exception = True
+    
+    def get_tarea(self, uuid, **filtros):
+        tareas = Tarea.objects.filter(**filtros)
+        if not self.request.user.is_superuser:
+            tareas = tareas.filter(usuario=self.request.user)
+        return get_object_or_404(tareas, uuid=uuid)
+
+
+class TareaEstadoView(TareaDelUsuarioMixin, View):
+    """Estado y progreso de una tarea, para consultar periódicamente."""
+    
+    def get(self, request, uuid):
+        return JsonResponse(estado_tarea(self.get_tarea(uuid)))
+
+
+class TareaResultadoView(TareaDelUsuarioMixin, View):
+    """Descarga el archivo de resultado de una tarea completada."""
+    
+    def get(self, request, uuid):
+        tarea = self.get_tarea(uuid, estado=Tarea.COMPLETADA)
+        ruta = ruta_resultado(tarea)
+        if ruta is None or not ruta.exists():
+            raise Http404("La tarea no tiene archivo de resultado.")
+        return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=ruta.name)
@@ -0,0 +1,93 @@
+# gestion/views_async.py
+"""
+Versiones async (ASGI) del dashboard, el listado y el detalle de proyectos.
+
+Usan el ORM async de Django y lanzan con ``asyncio.gather`` las consultas que
+no dependen entre sí. Comparten filtros, paginación y plantillas con las
+vistas de views.py; las usa el perfil ASGI (ver CEVProject/urls_asgi.py).
+
+Con Django 5.2 el ORM async envuelve al driver sync en un hilo por petición:
+las consultas de una misma petición no corren en paralelo, pero el worker
+ASGI sigue atendiendo otras peticiones mientras espera la base de datos.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+
+from .dashboard import obtener_dashboard_async
+from .fragmentos import opciones_filtros
+from .paginacion import CursorInvalido, estimar_total
+from .referencias import REFERENCIAS
+from .views import HomeView, ProyectoDetailView, ProyectoListView
+
+
+class HomeAsyncView(HomeView):
+    """Dashboard con el ORM async."""
+
+    async def get(self, request, *args, **kwargs):
+        return self.render_to_response({'view': self, **kwargs, **await obtener_dashboard_async()})
+
+
+class ProyectoListAsyncView(ProyectoListView):
+    """Listado con la página, los conteos y los filtros consultados a la vez."""
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        if self.page_kwarg in request.GET:
+            # Enlaces antiguos con OFFSET: se atienden con la vista sync.
+            return await sync_to_async(super().get)(request, *args, **kwargs)
+
+        if request.GET.get('contar'):
+            total = queryset.acount()
+        else:
+            total = sync_to_async(estimar_total)(queryset)
+        try:
+            pagina, total, total_mes, filtros = await asyncio.gather(
+                self.paginador(queryset, self.get_paginate_by(queryset)).apagina(request.GET.get('cursor')),
+                total,
+                self.recientes_del_mes().acount(),
+                sync_to_async(opciones_filtros)(),
+            )
+        except CursorInvalido:
+            raise Http404("Página inválida.")
+
+        pagina.total = total
+        pagina.total_estimado = total is not None and not request.GET.get('contar')
+        paginator, page_obj, object_list, is_paginated = self.enlazar(pagina)
+        await sync_to_async(REFERENCIAS.resolver)(object_list, 'tipo')
+        self.object_list = object_list
+        return self.render_to_response({
+            'view': self,
+            'paginator': paginator,
+            'page_obj': page_obj,
+            'is_paginated': is_paginated,
+            'object_list': object_list,
+            self.context_object_name: object_list,
+            'total_recientes_mes': total_mes,
+            **filtros,
+            'calificaciones': self.CALIFICACIONES,
+        })
+
+
+class ProyectoDetailAsyncView(ProyectoDetailView):
+    """
+    Detalle: solo se lee el proyecto. Muros y sistemas quedan sin evaluar y
+    se consultan al renderizar, si el fragmento del detalle no está en caché.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        pk = kwargs[self.pk_url_kwarg]
+        try:
+            proyecto = await self.get_queryset().aget(pk=pk)
+        except self.model.DoesNotExist:
+            raise Http404("No se encontró el proyecto.")
+        self.object = proyecto
+        return self.render_to_response({
+            'view': self,
+            'object': proyecto,
+            'proyecto': proyecto,
+            'calificacion_estimada': proyecto.calificacion_estimada,
+            'consumo_estimado': proyecto.consumo_estimado,
+            **self.relaciones(proyecto),
+        })